@@ -0,0 +1,4 @@
+"""Performance benchmarks for the catchment package.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_read_variable``.
+"""
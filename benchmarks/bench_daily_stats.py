@@ -0,0 +1,55 @@
+"""Compare four separate daily aggregations with one fused daily_stats call.
+
+The separate path is the original implementation of daily_total, daily_mean,
+daily_max and daily_min, each of which grouped by an array of datetime.date
+objects built from the index.
+"""
+
+import argparse
+import time
+
+from catchment import models
+from benchmarks.synthetic import synthetic_measurements
+
+
+def best_time(func, repeats):
+    """Return the best wall time in seconds of calling func."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    """Time the visualize view's aggregations over a synthetic frame."""
+    data = synthetic_measurements(args.sites, args.times)
+    data = data.set_index(['Date', 'Site'])['Rainfall (mm)'].unstack('Site')
+
+    def separate():
+        return [data.groupby(data.index.date).sum(), data.groupby(data.index.date).mean(),
+                data.groupby(data.index.date).max(), data.groupby(data.index.date).min()]
+
+    def fused():
+        return models.daily_stats(data, ['sum', 'mean', 'max', 'min'])
+
+    separate_time = best_time(separate, args.repeats)
+    fused_time = best_time(fused, args.repeats)
+    print(f'{args.sites} sites x {args.times} readings')
+    print(f'separate daily_* calls: {separate_time:.3f} s')
+    print(f'fused daily_stats:      {fused_time:.3f} s ({separate_time / fused_time:.1f}x)')
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=200, help='Number of sites to generate')
+    parser.add_argument('--times', type=int, default=35040,
+                        help='Number of readings per site to generate')
+    parser.add_argument('--repeats', type=int, default=3, help='Best-of repeats for each timing')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_cli_arguments())
@@ -0,0 +1,65 @@
+"""Time appending readings to a MeasurementSeries in small batches.
+
+The original MeasurementSeries concatenated the whole series on every
+append, which is quadratic in the series length; the buffered version
+is amortised linear.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from catchment import models
+
+
+def append_batches(series, times, values, batch):
+    """Append readings to a MeasurementSeries as arrays, batch at a time."""
+    for start in range(0, len(times), batch):
+        series.append(times[start:start + batch], values[start:start + batch])
+
+
+def concat_batches(series, times, values, batch):
+    """Append readings the way the original MeasurementSeries did."""
+    for start in range(0, len(times), batch):
+        data = pd.Series(values[start:start + batch], index=times[start:start + batch])
+        series = pd.concat([series, data])
+    return series
+
+
+def main(args):
+    """Compare buffered appends with repeated concatenation."""
+    times = pd.date_range('2000-01-01', periods=args.readings, freq='15min').to_numpy()
+    values = np.random.default_rng(0).gamma(0.2, 1.0, args.readings)
+    empty = pd.Series([], index=pd.DatetimeIndex([]), dtype=float)
+
+    series = models.MeasurementSeries(empty, 'Rainfall', 'mm')
+    start = time.perf_counter()
+    append_batches(series, times, values, args.batch)
+    appended = time.perf_counter() - start
+    start = time.perf_counter()
+    series.series
+    materialised = time.perf_counter() - start
+    print(f'buffered: {args.readings} readings in batches of {args.batch}: '
+          f'{appended:.3f} s, materialising the Series: {materialised:.4f} s')
+
+    readings = min(args.readings, args.concat_readings)
+    start = time.perf_counter()
+    concat_batches(empty, times[:readings], values[:readings], args.batch)
+    print(f'concat:   {readings} readings in batches of {args.batch}: '
+          f'{time.perf_counter() - start:.3f} s')
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readings', type=int, default=1000000, help='Number of readings')
+    parser.add_argument('--batch', type=int, default=10, help='Readings per append')
+    parser.add_argument('--concat-readings', type=int, default=50000,
+                        help='Number of readings to time with repeated concatenation')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_cli_arguments())
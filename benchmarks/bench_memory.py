@@ -0,0 +1,60 @@
+"""Report the memory saved by compact dtypes on the bundled datasets.
+
+Each CSV is measured both as read (the long layout, one row per reading)
+and as the Date x Site frames returned by read_variables_from_csv, with
+the default dtypes and with compact=True.
+"""
+
+import argparse
+import glob
+import os
+
+import pandas as pd
+
+from catchment import models
+
+
+def frame_bytes(data):
+    """Memory used by a data frame, including the contents of string columns."""
+    return int(data.memory_usage(deep=True).sum())
+
+
+def measure(filename):
+    """Return a list of (layout, default bytes, compact bytes) for a CSV file."""
+    raw = pd.read_csv(filename)
+    measurements = [column for column in raw.columns
+                    if column not in ('Site', 'Site Name', 'Date')
+                    and pd.api.types.is_numeric_dtype(raw[column])]
+
+    long = raw.copy()
+    long['Date'] = models.parse_dates(long['Date'])
+    rows = [('long', frame_bytes(raw), frame_bytes(models.compact_dtypes(long)))]
+
+    default = models.read_variables_from_csv(filename, measurements)
+    compact = models.read_variables_from_csv(filename, measurements, compact=True)
+    for measurement in measurements:
+        rows.append((measurement, frame_bytes(default[measurement]),
+                     frame_bytes(compact[measurement])))
+    return rows
+
+
+def main(args):
+    """Print the default and compact memory use of each file."""
+    print(f'{"file":>24} {"layout":>36} {"default kB":>11} {"compact kB":>11} {"saved":>6}')
+    for filename in args.files:
+        for layout, default, compact in measure(filename):
+            print(f'{os.path.basename(filename):>24} {layout:>36} {default / 1024:11.1f} '
+                  f'{compact / 1024:11.1f} {1 - compact / default:6.0%}')
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*',
+                        default=sorted(glob.glob(os.path.join('data', '*_data*.csv'))),
+                        help='CSV files to measure (default: the bundled data files)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_cli_arguments())
@@ -0,0 +1,64 @@
+"""Measure the peak memory and time of normalising a year of 15-minute data.
+
+The original data_normalise allocated a comparison mask, a divided copy
+and a NaN mask, each the size of the whole matrix; the blocked version
+only allocates temporaries the size of one block of columns.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from catchment import models
+
+
+def original_normalise(data):
+    """The original whole-array normalisation, for comparison."""
+    if np.any(data < 0):
+        raise ValueError('Measurement values should be non-negative')
+    max = np.nanmax(data, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalised = data / max[np.newaxis, :]
+    normalised[np.isnan(normalised)] = 0
+    return normalised
+
+
+def measure(func, data):
+    """Return (seconds, peak bytes allocated) of calling func on data."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(data)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(args):
+    """Compare the original, blocked and in-place normalisations."""
+    rng = np.random.default_rng(0)
+    data = rng.gamma(0.2, 1.0, (args.times, args.sites))
+    matrix_mb = data.nbytes / 1024 ** 2
+    print(f'{args.times} x {args.sites} matrix: {matrix_mb:.1f} MB')
+
+    cases = [('original', lambda d: original_normalise(d)),
+             ('blocked copy', lambda d: models.data_normalise(d)),
+             ('in place', lambda d: models.data_normalise(d, out=d))]
+    for name, func in cases:
+        elapsed, peak = measure(func, data.copy() if name == 'in place' else data)
+        print(f'{name:>13}: {elapsed:.3f} s, peak {peak / 1024 ** 2:.1f} MB '
+              f'({peak / data.nbytes:.2f}x matrix)')
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=200, help='Number of sites')
+    parser.add_argument('--times', type=int, default=35040, help='Number of readings per site')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_cli_arguments())
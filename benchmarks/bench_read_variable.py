@@ -0,0 +1,62 @@
+"""Compare the scaling of the read_variable_from_csv engines.
+
+The legacy engine parses every date separately and filters the dataset
+once per site, so its run time grows with rows x sites. The pivot engine
+parses dates in one pass and reshapes with a single unstack.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+from catchment import models
+from benchmarks.synthetic import write_rain_csv
+
+
+def time_engine(filename, engine, repeats):
+    """Return the best wall time in seconds of reading a file with an engine."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            models.read_variable_from_csv(filename, 'Rainfall (mm)', engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    """Time both engines over a grid of site and reading counts."""
+    print(f"{'sites':>6} {'times':>7} {'rows':>9} {'legacy (s)':>11} {'pivot (s)':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_sites in args.sites:
+            for n_times in args.times:
+                filename = os.path.join(tmpdir, f'rain_{n_sites}_{n_times}.csv')
+                rows = write_rain_csv(filename, n_sites, n_times)
+                pivot = time_engine(filename, 'pivot', args.repeats)
+                if args.skip_legacy:
+                    legacy = float('nan')
+                else:
+                    legacy = time_engine(filename, 'legacy', args.repeats)
+                print(f'{n_sites:>6} {n_times:>7} {rows:>9} {legacy:>11.3f} {pivot:>10.3f} '
+                      f'{legacy / pivot:>7.1f}x')
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, nargs='+', default=[2, 10, 50],
+                        help='Numbers of sites to generate')
+    parser.add_argument('--times', type=int, nargs='+', default=[96, 960, 2976],
+                        help='Numbers of readings per site to generate')
+    parser.add_argument('--repeats', type=int, default=1,
+                        help='Best-of repeats for each timing')
+    parser.add_argument('--skip-legacy', action='store_true',
+                        help='Only time the pivot engine')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_cli_arguments())
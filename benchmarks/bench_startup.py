@@ -0,0 +1,122 @@
+"""Time how long catchment-analysis.py takes to start up and finish short runs.
+
+Each command is run as a fresh Python process several times after one
+warm-up run, and the best and median wall times are reported along with
+which of numpy, pandas and matplotlib were imported and how long their
+imports took (from python -X importtime). The results are written as JSON, and
+can be compared against an earlier results file: the exit status is 1 if
+any command got slower than the baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.suite import environment
+
+
+SCRIPT = 'catchment-analysis.py'
+
+COMMANDS = {
+    'help': ['--help'],
+    'record': ['data/river_data_2015-12.csv', '-m', 'pH continuous',
+               '--view', 'record', '--site', 'FP15'],
+}
+
+# Modules whose imports dominate startup
+HEAVY_MODULES = ['numpy', 'pandas', 'matplotlib']
+
+
+def run_once(arguments, importtime=False):
+    """Run the script once, returning (wall seconds, stderr)."""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [SCRIPT]
+    start = time.perf_counter()
+    completed = subprocess.run(command + arguments, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True, check=True)
+    return time.perf_counter() - start, completed.stderr
+
+
+def import_times(stderr):
+    """Cumulative import time in seconds of each heavy module that was imported."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() in HEAVY_MODULES:
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def measure(name, repeats):
+    """Time one of the COMMANDS.
+
+    :returns: Result dictionary with the best and median seconds and the
+              import times of the heavy modules
+    """
+    arguments = COMMANDS[name]
+    run_once(arguments)
+    timings = [run_once(arguments)[0] for _ in range(repeats)]
+    return {'command': name,
+            'seconds': min(timings),
+            'median_seconds': statistics.median(timings),
+            'imports': import_times(run_once(arguments, importtime=True)[1])}
+
+
+def compare(results, baseline, threshold):
+    """Find the commands that have got slower than in a baseline.
+
+    :returns: List of (result, baseline seconds) for each command more
+              than threshold slower than the baseline
+    """
+    previous = {result['command']: result for result in baseline}
+    return [(result, previous[result['command']]['seconds']) for result in results
+            if result['command'] in previous
+            and result['seconds'] > previous[result['command']]['seconds'] * (1 + threshold)]
+
+
+def main(args):
+    """Time the commands, save the results and compare them with a baseline."""
+    print(f"{'command':>8} {'best s':>8} {'median s':>9}  imported")
+    results = []
+    for name in args.commands:
+        result = measure(name, args.repeats)
+        results.append(result)
+        imported = ', '.join(f'{module} {seconds:.3f} s'
+                             for module, seconds in result['imports'].items()) or 'none'
+        print(f"{name:>8} {result['seconds']:8.3f} {result['median_seconds']:9.3f}  {imported}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'environment': environment(), 'results': results}, output_file,
+                      indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for result, old in regressions:
+            print(f"REGRESSION {result['command']}: {old:.3f} s -> {result['seconds']:.3f} s")
+        if regressions:
+            sys.exit(1)
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commands', nargs='+', default=list(COMMANDS),
+                        choices=list(COMMANDS), help='Commands to time')
+    parser.add_argument('--repeats', type=int, default=10, help='Runs of each command')
+    parser.add_argument('-o', '--output', default=None, help='JSON file to write results to')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON results file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fractional slowdown counted as a regression')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_cli_arguments())
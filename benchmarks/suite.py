@@ -0,0 +1,224 @@
+"""Time and memory-profile the loaders, aggregations and views over synthetic data.
+
+Synthetic rain and river CSVs are generated for every combination of the
+requested numbers of sites, record lengths and sampling intervals. Each
+benchmark is timed (best of several repeats) and then run once more under
+tracemalloc to find its peak allocation. The results are written as JSON,
+and can be compared against an earlier results file: the exit status is
+1 if any benchmark got slower or used more memory than the baseline by
+more than the threshold.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from catchment import models, views
+from benchmarks.synthetic import write_dataset
+
+
+MEASUREMENTS = {'rain': 'Rainfall (mm)', 'river': 'Water level continuous (mm)'}
+
+# Timings shorter than this are too noisy to count as regressions
+MIN_SECONDS = 0.005
+
+
+def loading(context):
+    """Read the measurement from the generated CSV."""
+    return models.read_variable_from_csv(context['filename'], context['measurement'])
+
+
+def daily_total(context):
+    """Daily totals of the loaded frame."""
+    return models.daily_total(context['data'])
+
+
+def daily_mean(context):
+    """Daily means of the loaded frame."""
+    return models.daily_mean(context['data'])
+
+
+def daily_max(context):
+    """Daily maxima of the loaded frame."""
+    return models.daily_max(context['data'])
+
+
+def daily_min(context):
+    """Daily minima of the loaded frame."""
+    return models.daily_min(context['data'])
+
+
+def daily_stats(context):
+    """All four daily statistics in one pass."""
+    return models.daily_stats(context['data'])
+
+
+def normalisation(context):
+    """Normalise the loaded frame by site."""
+    return models.data_normalise(context['data'])
+
+
+def rendering(context):
+    """Render the visualize view's four daily plots to a PNG."""
+    daily = context['daily']
+    context['renderer'].render({'daily sum': daily['sum'], 'daily average': daily['mean'],
+                                'daily max': daily['max'], 'daily min': daily['min']},
+                               context['image'])
+
+
+BENCHMARKS = {
+    'load': loading,
+    'daily_total': daily_total,
+    'daily_mean': daily_mean,
+    'daily_max': daily_max,
+    'daily_min': daily_min,
+    'daily_stats': daily_stats,
+    'normalise': normalisation,
+    'render': rendering,
+}
+
+
+def measure(func, context, repeats):
+    """Return (best wall time in seconds, peak bytes allocated) of calling func."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(context)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(context)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(kinds, sites, years, intervals, benchmarks, repeats, tmpdir):
+    """Run the benchmarks over every combination of scales.
+
+    :returns: List of result dictionaries, one per benchmark and scale
+    """
+    results = []
+    renderer = views.FigureRenderer(4)
+    for kind, n_sites, n_years, interval in itertools.product(kinds, sites, years, intervals):
+        filename = os.path.join(tmpdir, f'{kind}_{n_sites}_{n_years}_{interval}.csv')
+        rows = write_dataset(filename, kind, n_sites, n_years, interval)
+        context = {'filename': filename, 'measurement': MEASUREMENTS[kind],
+                   'renderer': renderer, 'image': os.path.join(tmpdir, 'render.png')}
+        context['data'] = loading(context)
+        context['daily'] = models.daily_stats(context['data'])
+
+        for name in benchmarks:
+            seconds, peak = measure(BENCHMARKS[name], context, repeats)
+            result = {'benchmark': name, 'kind': kind, 'sites': n_sites, 'years': n_years,
+                      'interval': interval, 'rows': rows,
+                      'seconds': seconds, 'peak_bytes': peak}
+            print(f"{name:>12} {kind:>5} {n_sites:>6} {n_years:>6} {interval:>7} {rows:>10} "
+                  f"{seconds:>9.4f} {peak / 1024 ** 2:>10.2f}")
+            results.append(result)
+        os.remove(filename)
+    return results
+
+
+def environment():
+    """Versions and machine details to store alongside the results."""
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform()}
+
+
+def result_key(result):
+    """The scale and benchmark a result is for, used to match it in a baseline."""
+    return (result['benchmark'], result['kind'], result['sites'], result['years'],
+            result['interval'])
+
+
+def compare(results, baseline, threshold):
+    """Find the results that have regressed against a baseline.
+
+    :param results: List of result dictionaries from run
+    :param baseline: List of result dictionaries from an earlier run
+    :param threshold: Allowed fractional increase, e.g. 0.2 for 20%
+    :returns: List of (result, metric, baseline value, new value) for each
+              time or peak memory more than threshold above the baseline
+    """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if metric == 'seconds' and result[metric] < MIN_SECONDS:
+                continue
+            if result[metric] > old[metric] * (1 + threshold):
+                regressions.append((result, metric, old[metric], result[metric]))
+    return regressions
+
+
+def main(args):
+    """Run the suite, save the results and compare them with a baseline."""
+    print(f"{'benchmark':>12} {'kind':>5} {'sites':>6} {'years':>6} {'interval':>7} "
+          f"{'rows':>10} {'time (s)':>9} {'peak (MB)':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = run(args.kinds, args.sites, args.years, args.intervals, args.benchmarks,
+                      args.repeats, tmpdir)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'environment': environment(), 'results': results}, output_file, indent=2)
+        print(f'Results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for result, metric, old, new in regressions:
+            print(f"REGRESSION {result['benchmark']} {result['kind']} {result['sites']} sites "
+                  f"{result['years']} years {result['interval']}: "
+                  f"{metric} {old:.4g} -> {new:.4g} (+{new / old - 1:.0%})")
+        if regressions:
+            return 1
+        print(f'No regressions over {args.threshold:.0%} against {args.baseline}')
+    return 0
+
+
+def parse_cli_arguments():
+    """Definitions for the benchmark's CLI arguments"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kinds', nargs='+', default=['rain', 'river'],
+                        choices=['rain', 'river'], help='Kinds of data file to generate')
+    parser.add_argument('--sites', type=int, nargs='+', default=[5, 50],
+                        help='Numbers of sites to generate')
+    parser.add_argument('--years', type=float, nargs='+', default=[0.25, 1],
+                        help='Lengths of record to generate, in years')
+    parser.add_argument('--intervals', nargs='+', default=['15min'],
+                        help='Sampling intervals to generate, e.g. 15min 1h')
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS),
+                        choices=list(BENCHMARKS), help='Benchmarks to run')
+    parser.add_argument('--repeats', type=int, default=3, help='Best-of repeats for each timing')
+    parser.add_argument('-o', '--output', default=None, help='JSON file to write results to')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON results file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fractional slowdown or memory increase counted as a regression')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_cli_arguments()))
@@ -0,0 +1,104 @@
+"""Generate synthetic measurement files in the LOCAR CSV layout."""
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_measurements(n_sites, n_times, freq='15min', start='2005-12-01', seed=0):
+    """Create a long-format frame of random rainfall readings.
+
+    :param n_sites: Number of measurement sites
+    :param n_times: Number of readings per site
+    :param freq: Sampling interval between readings
+    :param start: Timestamp of the first reading
+    :param seed: Seed for the random number generator
+    :returns: DataFrame with Site, Site Name, Date and Rainfall (mm) columns
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_times, freq=freq)
+    sites = [f'SY{i:04d}' for i in range(n_sites)]
+    return pd.DataFrame({
+        'Site': np.repeat(sites, n_times),
+        'Site Name': np.repeat([f'Synthetic site {i}' for i in range(n_sites)], n_times),
+        'Date': np.tile(dates, n_sites),
+        'Rainfall (mm)': rng.gamma(0.2, 1.0, n_sites * n_times).round(1),
+    })
+
+
+def write_rain_csv(filename, n_sites, n_times, **kwargs):
+    """Write synthetic readings to a CSV in the rain file date format.
+
+    :param filename: Path of the CSV to write
+    :returns: Number of data rows written
+    """
+    data = synthetic_measurements(n_sites, n_times, **kwargs)
+    data['Date'] = data['Date'].dt.strftime('%d/%m/%Y %H:%M')
+    data.to_csv(filename, index=False)
+    return len(data)
+
+
+RIVER_MEASUREMENTS = ['Battery (V)', 'Conductivity 25C continuous (uS/cm)',
+                      'Oxygen dissolved continuous (%satn)', 'pH continuous',
+                      'Temperature water continuous (C)', 'Water level continuous (mm)']
+
+
+def synthetic_river_measurements(n_sites, n_times, freq='15min', start='2005-12-01', seed=0):
+    """Create a long-format frame of random river readings.
+
+    Each site has a daily temperature cycle and a slowly varying water
+    level, with the same precision as the LOCAR river files.
+
+    :param n_sites: Number of measurement sites
+    :param n_times: Number of readings per site
+    :param freq: Sampling interval between readings
+    :param start: Timestamp of the first reading
+    :param seed: Seed for the random number generator
+    :returns: DataFrame with Site, Site Name, Date and the RIVER_MEASUREMENTS columns
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_times, freq=freq)
+    shape = (n_sites, n_times)
+    hours = (dates.hour + dates.minute / 60).to_numpy()
+    level = 500 + np.cumsum(rng.normal(0, 0.5, shape), axis=1)
+    return pd.DataFrame({
+        'Site': np.repeat([f'SR{i:04d}' for i in range(n_sites)], n_times),
+        'Site Name': np.repeat([f'Synthetic river {i}' for i in range(n_sites)], n_times),
+        'Date': np.tile(dates, n_sites),
+        'Battery (V)': rng.normal(12.0, 0.2, shape).round(1).ravel(),
+        'Conductivity 25C continuous (uS/cm)': rng.normal(370, 5, shape).round().ravel(),
+        'Oxygen dissolved continuous (%satn)': rng.normal(105, 4, shape).round(1).ravel(),
+        'pH continuous': rng.normal(7.9, 0.1, shape).round(2).ravel(),
+        'Temperature water continuous (C)':
+            (8 + 2 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 0.1, shape)).round(1).ravel(),
+        'Water level continuous (mm)': np.abs(level).round(1).ravel(),
+    })
+
+
+def write_river_csv(filename, n_sites, n_times, **kwargs):
+    """Write synthetic readings to a CSV in the river file date format.
+
+    :param filename: Path of the CSV to write
+    :returns: Number of data rows written
+    """
+    data = synthetic_river_measurements(n_sites, n_times, **kwargs)
+    data['Date'] = data['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    data.to_csv(filename, index=False)
+    return len(data)
+
+
+def readings_per_site(years, freq='15min'):
+    """Number of readings per site covering a number of years at a sampling interval."""
+    return int(pd.Timedelta(days=365.25 * years) / pd.Timedelta(freq))
+
+
+def write_dataset(filename, kind, n_sites, years, freq='15min', **kwargs):
+    """Write a synthetic rain or river CSV covering a number of years.
+
+    :param kind: 'rain' or 'river'
+    :param years: Length of the record in years, e.g. 0.25
+    :returns: Number of data rows written
+    """
+    writers = {'rain': write_rain_csv, 'river': write_river_csv}
+    if kind not in writers:
+        raise ValueError(f"kind should be 'rain' or 'river', not {kind!r}")
+    return writers[kind](filename, n_sites, readings_per_site(years, freq), freq=freq, **kwargs)
@@ -2,8 +2,83 @@
 """Software for managing and tracking environmental data from our field project."""
 
 import argparse
+import concurrent.futures
+import functools
+import os
+import re
+import sys
 
-from catchment import models, views
+from catchment.lazy import lazy_import
+
+# Imported on first use, so that --help and the record view do not wait
+# for pandas and matplotlib to load unless they need them
+pd = lazy_import('pandas')
+cache = lazy_import('catchment.cache')
+incremental = lazy_import('catchment.incremental')
+models = lazy_import('catchment.models')
+profiling = lazy_import('catchment.profiling')
+query = lazy_import('catchment.query')
+streaming = lazy_import('catchment.streaming')
+views = lazy_import('catchment.views')
+
+
+def load_file(filename, measurements, site=None, aggregate=False, chunksize=None,
+              use_cache=True, use_incremental=False, compact=False):
+    """Load, and optionally aggregate, the measurements in one input file.
+
+    This runs in a worker process when several jobs are used.
+
+    :returns: Dictionary of measurement name -> Date x Site frame, or if
+              aggregate is set, measurement name -> dictionary of daily
+              statistic -> Date x Site frame
+    """
+    if aggregate and chunksize:
+        return {measurement: {'sum': daily.total(), 'mean': daily.mean(),
+                              'max': daily.max(), 'min': daily.min()}
+                for measurement, daily in streaming.read_daily_from_csv(
+                    filename, measurements, chunksize).items()}
+
+    if site is not None and not aggregate and not use_incremental:
+        # Only the rows of the one site are read, found from the file's row index
+        file_data = query.scan_csv(
+            filename, query.DEFAULT_INDEX_DIR if use_cache else None).select(
+                *measurements).where(sites=site).collect()
+        if compact:
+            file_data = {measurement: models.compact_dtypes(data)
+                         for measurement, data in file_data.items()}
+        return file_data
+
+    if use_incremental:
+        reader = incremental.refresh_from_csv(
+            filename, measurements, os.path.join(cache.DEFAULT_CACHE_DIR, 'incremental'))
+        if aggregate:
+            return {measurement: reader.daily_stats(measurement) for measurement in measurements}
+        file_data = {measurement: reader.data(measurement) for measurement in measurements}
+    elif use_cache:
+        file_data = cache.read_variables_from_csv(filename, measurements, compact=compact)
+    else:
+        file_data = models.read_variables_from_csv(filename, measurements, compact=compact)
+
+    if site is not None:
+        # An empty frame for a file without the site, as from the query
+        file_data = {measurement: data[[site]] if site in data.columns
+                     else pd.DataFrame(index=pd.DatetimeIndex([]))
+                     for measurement, data in file_data.items()}
+    if aggregate:
+        file_data = {measurement: models.daily_stats(data, ['sum', 'mean', 'max', 'min'])
+                     for measurement, data in file_data.items()}
+    return file_data
+
+
+def first_date(file_data):
+    """The earliest date in the data loaded from a file, for ordering files."""
+    dates = []
+    for data in file_data.values():
+        if isinstance(data, dict):
+            data = data['sum']
+        if len(data):
+            dates.append(pd.Timestamp(data.index.min()))
+    return min(dates) if dates else pd.Timestamp.max
 
 
 def main(args):
@@ -16,24 +91,78 @@ def main(args):
     if not isinstance(infiles, list):
         infiles = [args.infiles]
 
-    for filename in infiles:
-        measurement_data = models.read_variable_from_csv(filename, args.measurements)
+    measurements = args.measurements
+    if not isinstance(measurements, list):
+        measurements = [args.measurements]
+
+    if args.clear_cache:
+        cache.FrameCache().clear()
 
+    # Files are aggregated where they are loaded unless they are to be
+    # combined, since days may be split between files
+    loader = functools.partial(load_file, measurements=measurements,
+                               site=args.site if args.view == 'record' else None,
+                               aggregate=args.view == 'visualize' and not args.combine,
+                               chunksize=args.chunksize, use_cache=not args.no_cache,
+                               use_incremental=args.incremental, compact=args.compact)
+    with profiling.stage('load', rows=len(infiles)):
+        if args.jobs > 1 and len(infiles) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                results = list(zip(infiles, executor.map(loader, infiles)))
+        else:
+            results = [(filename, loader(filename)) for filename in infiles]
 
+    if args.combine:
+        with profiling.stage('combine'):
+            results = [('combined',
+                        {measurement: models.combine_frames([file_data.get(measurement)
+                                                             for _, file_data in results])
+                         for measurement in measurements})]
+    else:
+        results.sort(key=lambda result: first_date(result[1]))
+
+    renderer = None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        renderer = views.FigureRenderer(4, max_points=args.max_points or 'auto')
+
+    for filename, file_data in results:
         if args.view == 'visualize':
-            view_data = {'daily sum': models.daily_total(measurement_data),
-                         'daily average': models.daily_mean(measurement_data),
-                         'daily max': models.daily_max(measurement_data),
-                         'daily min': models.daily_min(measurement_data)}
-        
-            views.visualize(view_data)
+            for measurement, measurement_data in file_data.items():
+                if isinstance(measurement_data, dict):
+                    daily = measurement_data
+                else:
+                    with profiling.stage('aggregate'):
+                        daily = models.daily_stats(measurement_data,
+                                                   ['sum', 'mean', 'max', 'min'])
+                view_data = {'daily sum': daily['sum'],
+                             'daily average': daily['mean'],
+                             'daily max': daily['max'],
+                             'daily min': daily['min']}
+
+                if renderer is None:
+                    with profiling.stage('plot'):
+                        views.visualize(view_data, max_points=args.max_points)
+                    continue
+
+                stem = os.path.join(args.output_dir, '_'.join(
+                    [os.path.splitext(os.path.basename(filename))[0],
+                     re.sub(r'\W+', '-', measurement).strip('-')]))
+                with profiling.stage('plot'):
+                    if args.per_site:
+                        renderer.render_sites(view_data, f'{stem}_{{site}}.{args.format}')
+                    else:
+                        renderer.render(view_data, f'{stem}.{args.format}')
 
         elif args.view == 'record':
-            measurement_data = measurement_data[args.site]
             site = models.Site(args.site)
-            site.add_measurement(args.measurements, measurement_data)
+            for measurement, measurement_data in file_data.items():
+                # Files without readings of the site give empty frames
+                if args.site in measurement_data.columns:
+                    site.add_measurement(measurement, measurement_data[args.site])
 
-            views.display_measurement_record(site)
+            with profiling.stage('display'):
+                views.display_measurement_record(site)
 
 
 def parse_cli_arguments():
@@ -51,7 +180,8 @@ def parse_cli_arguments():
 
     req_group.add_argument(
         '-m', '--measurements',
-        help = 'Name of measurement data series to load',
+        nargs = '+',
+        help = 'Name(s) of measurement data series to load',
         required = True)
 
     parser.add_argument(
@@ -65,11 +195,91 @@ def parse_cli_arguments():
         type = str,
         default = None,
         help = 'Which site should be displayed?')
+
+    parser.add_argument(
+        '--chunksize',
+        type = int,
+        default = None,
+        help = 'Stream input files in chunks of this many rows (visualize view only)')
+
+    parser.add_argument(
+        '--no-cache',
+        action = 'store_true',
+        help = 'Always parse input files instead of using the cache of parsed data')
+
+    parser.add_argument(
+        '--clear-cache',
+        action = 'store_true',
+        help = 'Empty the cache of parsed data before running')
+
+    parser.add_argument(
+        '--incremental',
+        action = 'store_true',
+        help = 'Only read rows appended to input files since the last incremental run')
+
+    parser.add_argument(
+        '--compact',
+        action = 'store_true',
+        help = 'Hold measurements as float32 where that loses no precision, to save memory')
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type = int,
+        default = 1,
+        help = 'Number of input files to load in parallel processes')
+
+    parser.add_argument(
+        '--combine',
+        action = 'store_true',
+        help = 'Combine all input files into a single time series')
+
+    parser.add_argument(
+        '--output-dir',
+        default = None,
+        help = 'Save visualize plots as image files in this directory instead of showing them')
+
+    parser.add_argument(
+        '--format',
+        default = 'png',
+        choices = ['png', 'svg', 'pdf'],
+        help = 'Image format for plots saved with --output-dir')
+
+    parser.add_argument(
+        '--per-site',
+        action = 'store_true',
+        help = 'Save a separate plot for each site (requires --output-dir)')
+
+    parser.add_argument(
+        '--max-points',
+        type = int,
+        default = None,
+        help = 'Downsample plotted series to about this many points, keeping extremes')
+
+    parser.add_argument(
+        '--profile',
+        nargs = '?',
+        const = '-',
+        default = None,
+        metavar = 'REPORT',
+        help = 'Time each stage of the run and print a table to stderr, '
+               'or write it to REPORT as JSON (stages run in --jobs workers are not included)')
+
+    parser.add_argument(
+        '--cprofile',
+        default = None,
+        metavar = 'FILE',
+        help = 'Also write cProfile statistics to FILE, for reading with pstats')
     
     args = parser.parse_args()
     
     if args.view == 'record' and args.site is None:
         parser.error("'record' --view requires that --site is set")
+    if args.per_site and not args.output_dir:
+        parser.error("--per-site requires that --output-dir is set")
+    if args.incremental and args.chunksize:
+        parser.error("--incremental cannot be used with --chunksize")
+    if args.combine and args.chunksize:
+        parser.error("--combine cannot be used with --chunksize")
 
     return args
 
@@ -78,4 +288,13 @@ if __name__ == "__main__":
 
     args = parse_cli_arguments()
 
-    main(args)
\ No newline at end of file
+    if args.profile or args.cprofile:
+        with profiling.Profiler(cprofile_filename=args.cprofile) as profiler:
+            with profiling.stage('main'):
+                main(args)
+        if args.profile in (None, '-'):
+            print(profiler.table(), file=sys.stderr)
+        else:
+            profiler.write_json(args.profile)
+    else:
+        main(args)
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""Module containing an on-disk cache of parsed measurement frames.
+
+Parsing and pivoting a CSV is far slower than reading back the result, so
+the Date x Site frames produced by models.read_variable_from_csv are
+stored in a binary columnar layout: one directory per entry holding the
+values as a column-major .npy array (each site contiguous on disk), the
+dates as an int64 .npy array and the site names in a small JSON file.
+Cached entries are memory-mapped copy-on-write when loaded, so only the
+pages that are actually used are read.
+
+Entries are keyed by the absolute path, modification time and size of the
+source file (optionally also a hash of its contents) and the measurement
+name, so editing a file invalidates its entries. The total size of the
+cache is bounded by evicting the least recently used entries.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from catchment import models, profiling
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'CATCHMENT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'catchment'))
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+class FrameCache:
+    """A size-bounded cache of Date x Site frames read from CSV files."""
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 hash_contents=False):
+        """
+        :param cache_dir: Directory to store cached frames in
+        :param max_bytes: Total size the cache is allowed to grow to
+        :param hash_contents: Also key entries by a SHA-256 hash of the source
+                              file, for files whose mtime is not reliable
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+
+    def key(self, filename, measurement, options=None):
+        """Return the cache key of a measurement read from a file.
+
+        :param options: Dictionary of the keyword arguments the file was
+                        read with, e.g. date_format, or None for defaults
+        """
+        stat = os.stat(filename)
+        parts = [os.path.abspath(filename), str(stat.st_mtime_ns), str(stat.st_size), measurement]
+        if options:
+            parts.append(repr(sorted(options.items())))
+        if self.hash_contents:
+            parts.append(_file_hash(filename))
+        return hashlib.sha1('\0'.join(parts).encode()).hexdigest()
+
+    def get(self, filename, measurement, options=None):
+        """Load a cached frame, or return None if it is not cached."""
+        entry = os.path.join(self.cache_dir, self.key(filename, measurement, options))
+        try:
+            with open(os.path.join(entry, 'meta.json')) as meta_file:
+                meta = json.load(meta_file)
+            index = np.load(os.path.join(entry, 'index.npy'))
+            values = np.load(os.path.join(entry, 'values.npy'), mmap_mode='c')
+        except (OSError, ValueError):
+            return None
+        os.utime(entry)
+
+        return pd.DataFrame(values, index=pd.DatetimeIndex(index.view('datetime64[ns]')),
+                            columns=meta['columns'])
+
+    def put(self, filename, measurement, data, options=None):
+        """Store a frame in the cache, replacing older versions of the same
+        file and measurement read with the same options, and evicting
+        entries if the cache is full.
+
+        Frames with mixed column types are not cached.
+        """
+        if data.dtypes.nunique() > 1:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.invalidate(filename, measurement, options)
+
+        entry = os.path.join(self.cache_dir, self.key(filename, measurement, options))
+        tmp_entry = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        np.save(os.path.join(tmp_entry, 'values.npy'), np.asfortranarray(data.to_numpy()))
+        np.save(os.path.join(tmp_entry, 'index.npy'),
+                data.index.to_numpy(dtype='datetime64[ns]').view('int64'))
+        with open(os.path.join(tmp_entry, 'meta.json'), 'w') as meta_file:
+            json.dump({'filename': os.path.abspath(filename),
+                       'measurement': measurement,
+                       'options': repr(sorted((options or {}).items())),
+                       'columns': list(data.columns)}, meta_file)
+        try:
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Another process cached the same frame first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self.evict()
+
+    def entries(self):
+        """Return a list of (path, metadata, size in bytes, last used time)
+        for every entry in the cache."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            try:
+                with open(os.path.join(entry, 'meta.json')) as meta_file:
+                    meta = json.load(meta_file)
+                size = sum(os.path.getsize(os.path.join(entry, part))
+                           for part in os.listdir(entry))
+                entries.append((entry, meta, size, os.path.getmtime(entry)))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def size(self):
+        """Total size of the cached entries in bytes."""
+        return sum(size for _, _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda entry: entry[3])
+        total = sum(size for _, _, size, _ in entries)
+        for entry, _, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def invalidate(self, filename, measurement=None, options=None):
+        """Remove all cached frames read from a file, or just those of one
+        measurement read with some options."""
+        filename = os.path.abspath(filename)
+        options = repr(sorted((options or {}).items()))
+        for entry, meta, _, _ in self.entries():
+            if meta['filename'] == filename and (
+                    measurement is None or (measurement == meta['measurement']
+                                            and options == meta.get('options', '[]'))):
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        for entry, _, _, _ in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _file_hash(filename):
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as source:
+        for block in iter(lambda: source.read(1024 ** 2), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_variable_from_csv(filename, measurement, cache=None, **kwargs):
+    """Cached version of models.read_variable_from_csv.
+
+    :param cache: FrameCache to use, or None for one in the default location
+    :returns: 2D array of given variable, as models.read_variable_from_csv
+    """
+    return read_variables_from_csv(filename, [measurement], cache, **kwargs)[measurement]
+
+
+def read_variables_from_csv(filename, measurements, cache=None, **kwargs):
+    """Cached version of models.read_variables_from_csv.
+
+    Measurements missing from the cache are read together in one pass and
+    then stored. Frames are always cached at full precision and one per
+    measurement, and converted or combined afterwards if compact dtypes or
+    combine are asked for. Other options, such as date_format, are part of
+    the cache key.
+
+    :param cache: FrameCache to use, or None for one in the default location
+    :returns: Dictionary of measurement name -> 2D array of that variable,
+              or a single frame if combine is True
+    """
+    if cache is None:
+        cache = FrameCache()
+    if kwargs.pop('compact', False):
+        variables = read_variables_from_csv(filename, measurements, cache, **kwargs)
+        if isinstance(variables, pd.DataFrame):
+            return models.compact_dtypes(variables)
+        return {measurement: models.compact_dtypes(data)
+                for measurement, data in variables.items()}
+    if kwargs.pop('combine', False):
+        variables = read_variables_from_csv(filename, measurements, cache, **kwargs)
+        return pd.concat(variables, axis=1, names=['Measurement', 'Site'])
+
+    options = {name: value for name, value in kwargs.items() if value is not None}
+    with profiling.stage('cache_get'):
+        variables = {measurement: cache.get(filename, measurement, options)
+                     for measurement in measurements}
+    missing = [measurement for measurement, data in variables.items() if data is None]
+    if missing:
+        for measurement, data in models.read_variables_from_csv(filename, missing,
+                                                                **kwargs).items():
+            cache.put(filename, measurement, data, options)
+            variables[measurement] = data
+    return variables
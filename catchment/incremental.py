@@ -0,0 +1,224 @@
+"""Module for keeping the data from a growing CSV file up to date.
+
+Field loggers append to the same CSV file throughout the month. Rather
+than re-reading the whole file, an IncrementalReader remembers the byte
+offset it has read up to and the last reading time of each site, parses
+only the rows appended since, and folds them into the frames and daily
+statistics it already holds. Only the days touched by new rows have
+their statistics recomputed.
+
+A reader can be saved so the next run continues where it left off. Only
+its small state is rewritten on each save; the frames it has read are
+appended to a separate parts file, so a save writes only the new rows.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+
+import pandas as pd
+
+from catchment import models
+from catchment.streaming import DailyAccumulator
+
+
+class IncrementalReader:
+    """Reads named variables from a CSV file which is being appended to.
+
+    Rows are expected to be appended in time order for each site; rows no
+    later than the last reading already seen for their site are ignored.
+    """
+    def __init__(self, filename, measurements, date_format=None):
+        """
+        :param filename: Filename of CSV to load
+        :param measurements: List of names of data columns to be read
+        :param date_format: strptime format of the Date column, detected if not given
+        """
+        self.filename = filename
+        self.measurements = list(measurements)
+        self.date_format = date_format
+        self.reset()
+
+    def reset(self):
+        """Forget everything read so far, so the next refresh reads the whole file."""
+        self.offset = 0
+        self.header = None
+        self.file_id = None
+        self.last_times = {}
+        self.daily = {measurement: DailyAccumulator() for measurement in self.measurements}
+        self._parts = {measurement: [] for measurement in self.measurements}
+        # Frames read since the last save, and the bytes of the parts file
+        # holding those saved before
+        self._unsaved = []
+        self._parts_filename = None
+        self._parts_bytes = 0
+        self._parts_loaded = True
+
+    def refresh(self):
+        """Read the complete rows appended to the file since the last refresh.
+
+        If the file has been replaced or truncated it is read again from
+        the start.
+
+        :returns: Number of new rows read
+        """
+        stat = os.stat(self.filename)
+        if (stat.st_dev, stat.st_ino) != self.file_id or stat.st_size < self.offset:
+            self.reset()
+            self.file_id = (stat.st_dev, stat.st_ino)
+
+        with open(self.filename, 'rb') as source:
+            if self.header is None:
+                self.header = source.readline()
+                self.offset = source.tell()
+            source.seek(self.offset)
+            tail = source.read()
+
+        # Leave a partly written last line for the next refresh
+        tail = tail[:tail.rfind(b'\n') + 1]
+        if not tail:
+            return 0
+        self.offset += len(tail)
+
+        dataset = pd.read_csv(io.BytesIO(self.header + tail),
+                              usecols=['Date', 'Site'] + self.measurements)
+        if self.date_format is None:
+            self.date_format = models.detect_date_format(dataset['Date'])
+        dataset['Date'] = models.parse_dates(dataset['Date'], self.date_format)
+
+        last_times = pd.to_datetime(dataset['Site'].map(self.last_times))
+        dataset = dataset[last_times.isna() | (dataset['Date'] > last_times)]
+        if dataset.empty:
+            return 0
+        self.last_times.update(dataset.groupby('Site')['Date'].max().to_dict())
+
+        new_data = models._pivot_sites(dataset, self.measurements)
+        record = {}
+        for measurement in self.measurements:
+            data = new_data[measurement].rename_axis(columns=None)
+            record[measurement] = [data]
+            self._parts[measurement].append(data)
+            self.daily[measurement].update(data)
+        self._unsaved.append(record)
+        return len(dataset)
+
+    def data(self, measurement):
+        """All the readings of a measurement read so far.
+
+        :returns: 2D array of given variable, as models.read_variable_from_csv
+        """
+        if not self._parts_loaded:
+            self._load_parts()
+        parts = self._parts[measurement]
+        if len(parts) > 1:
+            parts[:] = [models.combine_frames(parts)]
+        if not parts:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        return parts[0]
+
+    def daily_stats(self, measurement):
+        """Daily sum, mean, max and min of a measurement read so far.
+
+        :returns: Dictionary of statistic -> 2D Pandas data frame, as
+                  models.daily_stats
+        """
+        daily = self.daily[measurement]
+        return {'sum': daily.total(), 'mean': daily.mean(),
+                'max': daily.max(), 'min': daily.min()}
+
+    def save(self, filename):
+        """Save the reader's state so a later run can continue from it.
+
+        The offset, header, last reading times and daily statistics are
+        written to filename, replacing it. The frames read since the last
+        save are appended to filename + '.parts', which a later save
+        truncates back to the length recorded in the state in case that
+        save was interrupted.
+        """
+        parts_filename = f'{filename}.parts'
+        if parts_filename != self._parts_filename:
+            # Saving somewhere new, so all the frames go in the parts file
+            if not self._parts_loaded:
+                self._load_parts()
+            self._unsaved = [{measurement: list(parts)
+                              for measurement, parts in self._parts.items()}]
+            self._parts_filename = parts_filename
+            self._parts_bytes = 0
+        with open(parts_filename, 'ab') as parts_file:
+            parts_file.truncate(self._parts_bytes)
+            parts_file.seek(self._parts_bytes)
+            for record in self._unsaved:
+                pickle.dump(record, parts_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._parts_bytes = parts_file.tell()
+        self._unsaved = []
+
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'wb') as state_file:
+            pickle.dump(self, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+
+    @staticmethod
+    def load(filename):
+        """Load a reader saved with save.
+
+        The frames are only read from the parts file when data is first
+        asked for.
+        """
+        with open(filename, 'rb') as state_file:
+            reader = pickle.load(state_file)
+        if os.path.getsize(reader._parts_filename) < reader._parts_bytes:
+            raise EOFError(f'{reader._parts_filename} is shorter than when it was saved')
+        return reader
+
+    def _load_parts(self):
+        """Read the frames saved in the parts file, before any read since."""
+        saved = {measurement: [] for measurement in self.measurements}
+        with open(self._parts_filename, 'rb') as parts_file:
+            while parts_file.tell() < self._parts_bytes:
+                for measurement, parts in pickle.load(parts_file).items():
+                    saved[measurement].extend(parts)
+        for measurement in self.measurements:
+            self._parts[measurement][:0] = saved[measurement]
+        self._parts_loaded = True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The frames are kept in the parts file
+        del state['_parts'], state['_unsaved']
+        return state
+
+    def __setstate__(self, state):
+        if '_parts' in state:
+            raise pickle.UnpicklingError('Reader saved before frames were kept separately')
+        self.__dict__.update(state)
+        self._parts = {measurement: [] for measurement in self.measurements}
+        self._unsaved = []
+        self._parts_loaded = self._parts_bytes == 0
+
+
+def state_filename(state_dir, filename, measurements):
+    """Name of the file holding the saved reader for a CSV file and measurements."""
+    key = '\0'.join([os.path.abspath(filename)] + list(measurements))
+    return os.path.join(state_dir, hashlib.sha1(key.encode()).hexdigest() + '.pickle')
+
+
+def refresh_from_csv(filename, measurements, state_dir):
+    """Bring the saved reader for a CSV file up to date with the rows
+    appended since the last run, creating it if there is none.
+
+    :param filename: Filename of CSV to load
+    :param measurements: List of names of data columns to be read
+    :param state_dir: Directory holding saved readers
+    :returns: The refreshed IncrementalReader
+    """
+    state = state_filename(state_dir, filename, measurements)
+    try:
+        reader = IncrementalReader.load(state)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        reader = IncrementalReader(filename, measurements)
+
+    if reader.refresh():
+        os.makedirs(state_dir, exist_ok=True)
+        reader.save(state)
+    return reader
@@ -0,0 +1,311 @@
+"""Module for ingesting readings pushed continuously by many field loggers.
+
+An IngestService accepts readings from any number of concurrent asyncio
+sources through a bounded queue: when the queue is full, submit waits,
+which slows the sources down (backpressure) rather than letting readings
+pile up in memory. Readings are gathered per (site, measurement) and
+flushed into the sites of a Catchment as array appends to their
+MeasurementSeries, either every flush_interval seconds or as soon as
+max_batch readings are waiting.
+
+Two sources are provided: serve_tcp accepts lines of
+'site,measurement,date,value' from logger connections, and tail_csv
+follows a LOCAR CSV file as rows are appended to it.
+"""
+
+import asyncio
+import collections
+import datetime
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from catchment import models
+
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_BATCH = 5000
+
+# Number of recent end-to-end latencies kept for the percentiles
+LATENCY_SAMPLES = 10000
+
+
+class IngestService:
+    """Batches readings from concurrent sources into a Catchment."""
+    def __init__(self, catchment, queue_size=DEFAULT_QUEUE_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_batch=DEFAULT_MAX_BATCH,
+                 units=None):
+        """
+        :param catchment: Catchment whose sites receive the readings; sites
+                          not in it yet are created
+        :param queue_size: Most readings waiting to be batched before
+                           sources have to wait
+        :param flush_interval: Seconds between flushes into the catchment
+        :param max_batch: Flush early once this many readings are waiting
+        :param units: Dictionary of measurement name -> units for new series
+        """
+        self.catchment = catchment
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.units = units or {}
+
+        self._queue = None
+        self._tasks = []
+        self._pending = collections.defaultdict(lambda: ([], [], []))
+        self._num_pending = 0
+
+        self.received = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed = 0
+        self.last_error = None
+        self.backpressure_waits = 0
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._started = None
+
+    async def start(self):
+        """Start batching and flushing readings; call from a running event loop."""
+        self._queue = asyncio.Queue(self.queue_size)
+        self._started = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._consume()),
+                       asyncio.create_task(self._flush_periodically())]
+
+    async def stop(self):
+        """Wait for the queued readings, flush them and stop."""
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.flush()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def submit(self, site, measurement, date, value):
+        """Queue one reading, waiting if the queue is full.
+
+        :param site: Site code
+        :param measurement: Name of the measurement
+        :param date: Time of the reading: a Timestamp, a date string in one
+                     of the models.DATE_FORMATS or ISO 8601, or int64
+                     nanoseconds since the epoch
+        :param value: The reading
+        """
+        if not isinstance(date, (int, np.integer)):
+            date = _date_value(date)
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put((site, measurement, date, value, time.perf_counter()))
+        self.received += 1
+
+    async def _consume(self):
+        """Move readings from the queue into the per-series batches."""
+        queue = self._queue
+        while True:
+            reading = await queue.get()
+            self._add(reading)
+            queue.task_done()
+            # Take whatever else is already queued without yielding
+            while not queue.empty() and self._num_pending < self.max_batch:
+                self._add(queue.get_nowait())
+                queue.task_done()
+            if self._num_pending >= self.max_batch:
+                self.flush()
+                # Let the sources run before taking more
+                await asyncio.sleep(0)
+
+    def _add(self, reading):
+        site, measurement, date, value, received = reading
+        times, values, receipts = self._pending[site, measurement]
+        times.append(date)
+        values.append(value)
+        receipts.append(received)
+        self._num_pending += 1
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Append the waiting readings to the catchment's measurement series.
+
+        A batch that cannot be appended, e.g. because its values are not
+        numbers, is dropped and counted as failed rather than stopping the
+        service; the exception is kept as last_error.
+
+        :returns: Number of readings flushed
+        """
+        if not self._num_pending:
+            return 0
+        pending, self._pending = self._pending, collections.defaultdict(lambda: ([], [], []))
+        self._num_pending = 0
+
+        sites = self.catchment.sites
+        count = 0
+        flushed_receipts = []
+        for (site_name, measurement), (times, values, receipts) in pending.items():
+            try:
+                self._append(sites, site_name, measurement, times, values)
+            except Exception as error:
+                self.failed += len(times)
+                self.last_error = error
+                continue
+            count += len(times)
+            flushed_receipts.append(np.array(receipts))
+        if not count:
+            return 0
+
+        flushed_at = time.perf_counter()
+        receipts = np.concatenate(flushed_receipts)
+        latencies = flushed_at - receipts
+        self._latency_total += latencies.sum()
+        self._latency_max = max(self._latency_max, latencies.max())
+        self._latencies.extend(latencies[-LATENCY_SAMPLES:])
+        self.flushed += count
+        self.flushes += 1
+        return count
+
+    def _append(self, sites, site_name, measurement, times, values):
+        """Append one batch of readings to a site's measurement series."""
+        times = np.array(times, dtype='int64')
+        values = np.array(values, dtype=float)
+        site = sites.get(site_name)
+        if site is None:
+            site = sites[site_name] = models.Site(site_name)
+        series = site.measurements.get(measurement)
+        if series is None:
+            site.measurements[measurement] = models.MeasurementSeries.from_arrays(
+                times, values, measurement, self.units.get(measurement))
+        else:
+            series.append(times, values)
+
+    def metrics(self):
+        """Throughput and latency of the service so far.
+
+        :returns: Dictionary with the counts of readings received, flushed
+                  and failed (dropped by a flush, or lines serve_tcp could
+                  not read), the number of flushes, readings queued and
+                  waiting to be flushed, how many submits found the queue
+                  full, throughput in readings per second since start, and
+                  the mean, median, 95th percentile and maximum seconds
+                  from submit to flush
+        """
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        latencies = np.array(self._latencies)
+        return {
+            'received': self.received,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'pending': self._num_pending,
+            'backpressure_waits': self.backpressure_waits,
+            'throughput': self.flushed / elapsed if elapsed else 0.0,
+            'latency_mean': self._latency_total / self.flushed if self.flushed else None,
+            'latency_p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+            'latency_max': self._latency_max if self.flushed else None,
+        }
+
+
+def _date_value(date):
+    """Convert the time of a reading to int64 nanoseconds since the epoch."""
+    if isinstance(date, str):
+        for date_format in models.DATE_FORMATS:
+            try:
+                return pd.Timestamp(datetime.datetime.strptime(date, date_format)).value
+            except ValueError:
+                continue
+    return pd.Timestamp(date).value
+
+
+async def _handle_connection(service, reader, writer):
+    """Submit each 'site,measurement,date,value' line sent by a logger."""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                line = line.decode().strip()
+                if not line:
+                    continue
+                site, measurement, date, value = line.split(',')
+                date = _date_value(date)
+                value = float(value)
+            except ValueError:
+                # Including UnicodeDecodeError, replying with what was sent
+                service.failed += 1
+                text = line if isinstance(line, str) else line.decode(errors='replace').strip()
+                writer.write(f'ERROR {text}\n'.encode())
+                await writer.drain()
+                continue
+            await service.submit(site, measurement, date, value)
+    finally:
+        writer.close()
+
+
+async def serve_tcp(service, host='127.0.0.1', port=0):
+    """Accept readings from loggers over TCP, one per line as
+    'site,measurement,date,value'.
+
+    A connection is not read from while its reading waits for space in
+    the queue, so TCP flow control passes the backpressure on to loggers.
+
+    :returns: The asyncio Server; its sockets give the port if port was 0
+    """
+    return await asyncio.start_server(
+        lambda reader, writer: _handle_connection(service, reader, writer), host, port)
+
+
+async def tail_csv(service, filename, measurements, poll_interval=1.0, stop=None):
+    """Follow a CSV file in the LOCAR layout, submitting the readings of
+    rows as they are appended.
+
+    :param filename: Filename of CSV to follow
+    :param measurements: List of names of data columns to be read
+    :param poll_interval: Seconds between checks for new rows
+    :param stop: asyncio.Event which ends the tail once the file has been
+                 read to the end; otherwise it runs until cancelled
+    """
+    measurements = list(measurements)
+    offset = 0
+    header = None
+    date_format = None
+    while True:
+        if os.path.exists(filename) and os.path.getsize(filename) > offset:
+            with open(filename, 'rb') as source:
+                if header is None:
+                    header = source.readline()
+                    offset = source.tell()
+                source.seek(offset)
+                tail = source.read()
+            tail = tail[:tail.rfind(b'\n') + 1]
+            offset += len(tail)
+            if tail:
+                dataset = pd.read_csv(io.BytesIO(header + tail),
+                                      usecols=['Date', 'Site'] + measurements)
+                if date_format is None:
+                    date_format = models.detect_date_format(dataset['Date'])
+                dates = models.parse_dates(dataset['Date'], date_format).to_numpy().view('int64')
+                for measurement in measurements:
+                    for site, date, value in zip(dataset['Site'], dates,
+                                                 dataset[measurement].tolist()):
+                        await service.submit(site, measurement, date, value)
+                continue
+        if stop is not None and stop.is_set():
+            return
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,44 @@
+"""Module for deferring the import of slow-loading dependencies.
+
+pandas and matplotlib take far longer to import than the command line
+tool takes to print its help, so modules that need them hold stand-ins
+returned by lazy_import instead, and the real module is imported the
+first time one of its attributes is used.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module, which imports it on first attribute access.
+
+    Unlike importlib.util.LazyLoader this does not look the module up when
+    created, which for a submodule such as matplotlib.pyplot would import
+    its parent package straight away.
+
+    Once imported, the module's attributes are copied into the stand-in,
+    so later lookups cost the same as on the module itself.
+    """
+    def __getattr__(self, attribute):
+        # Only called for attributes not copied yet, including any the
+        # module has gained since
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+
+def lazy_import(name):
+    """Return a module, or a stand-in that imports it when first used if it
+    has not been imported yet.
+
+    :param name: Full name of the module, e.g. 'matplotlib.pyplot'
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -7,9 +7,21 @@ data for a single measurement site, and each row represents a single measurement
 time across all sites.
 """
 
-import pandas as pd
+import collections
+import collections.abc
+import datetime
+import hashlib
+import weakref
+import zlib
+
 import numpy as np
 
+from catchment import profiling
+from catchment.lazy import lazy_import
+
+# Only imported when data is first read or analysed
+pd = lazy_import('pandas')
+
 
 # If the class inherits from another class,
 #  we include the parent class name in brackets.
@@ -19,27 +31,307 @@ import numpy as np
 # in a new class that contains Pandas Series
 '''Composition'''
 class MeasurementSeries:
+    """A time series of readings of one measurement at a site.
+
+    Readings are held in preallocated NumPy buffers of timestamps and
+    values whose capacity doubles when full, so appending a batch costs
+    time proportional to the batch rather than to the whole series. The
+    pandas Series is only built when .series is read, and is rebuilt after
+    new readings are added.
+    """
+    __slots__ = ('name', 'units', '_times', '_values', '_length', '_tz', '_series',
+                 '_sorted', '_last', '_lookup', '_index', '_version', '_tables', '__weakref__')
+
+    INITIAL_CAPACITY = 16
+
     def __init__(self, series, name, units):
-        self.series = series
+        """
+        :param series: pandas Series of readings indexed by time, or None
+                       to start with no readings
+        :param name: Name of the measurement
+        :param units: Units of the readings, or None
+        """
         self.name = name
         self.units = units
-        self.series.name = self.name
-    
+        self._version = 0
+        self._tables = []
+        self.series = series
+
+    @classmethod
+    def from_arrays(cls, times, values, name, units, tz=None):
+        """Create a series from arrays of timestamps and values.
+
+        :param tz: Time zone of the series, in which case times are UTC
+        """
+        measurement_series = cls(None, name, units)
+        measurement_series._tz = tz
+        measurement_series.append(times, values)
+        return measurement_series
+
+    @classmethod
+    def mapped(cls, times, values, name, units, tz=None, index=None):
+        """Wrap arrays of readings in time order without copying them, e.g.
+        the numpy.memmap arrays of a store.SeriesFile.
+
+        The series is read-only: appending to it raises ValueError, since
+        that would copy the whole of the arrays into memory. Add readings
+        to the store instead and open it again.
+
+        :param times: int64 array of nanoseconds since the epoch (UTC for
+                      time zone aware series), in increasing order
+        :param values: Array of readings, the same length as times
+        :param tz: Time zone of the series
+        :param index: (sparse times, stride) giving the time of every
+                      stride-th reading, to look times up in a few pages
+                      rather than binary searching the whole array
+        """
+        if len(times) != len(values):
+            raise ValueError('times and values should be the same length')
+        measurement_series = cls(None, name, units)
+        times, values = times.view(), values.view()
+        times.flags.writeable = False
+        values.flags.writeable = False
+        measurement_series._times = times
+        measurement_series._values = values
+        measurement_series._length = len(times)
+        measurement_series._tz = tz
+        measurement_series._index = index
+        measurement_series._last = _last_valid(times, values)
+        return measurement_series
+
+    @property
+    def series(self):
+        """The readings as a read-only pandas Series indexed by time.
+
+        The Series shares the buffers of readings rather than copying them,
+        so it cannot be modified; use .copy() for a Series that can be.
+        """
+        if self._series is None:
+            self._series = self._make_series(self._times[:self._length],
+                                             self._values[:self._length])
+        return self._series
+
+    def _make_series(self, times, values):
+        # Writing to the Series would change the buffers behind the
+        # caches' backs, so its values are a read-only view
+        values = values.view()
+        values.flags.writeable = False
+        times = pd.DatetimeIndex(times.view('datetime64[ns]'))
+        if self._tz is not None:
+            times = times.tz_localize('UTC').tz_convert(self._tz)
+        return pd.Series(values, index=times, name=self.name)
+
+    @series.setter
+    def series(self, series):
+        self._times = np.empty(0, dtype='int64')
+        self._values = np.empty(0, dtype=float if series is None else series.dtype)
+        self._length = 0
+        self._tz = None
+        self._series = None
+        self._sorted = True
+        self._last = None
+        self._lookup = None
+        self._index = None
+        self._version += 1
+        _invalidate_cached(self)
+        self._publish()
+        if series is not None:
+            self.add_measurement(series)
+
+    def __len__(self):
+        return self._length
+
     def add_measurement(self, data):
-        self.series = pd.concat([self.series,data])
-        self.series.name = self.name
+        """Append a pandas Series of readings indexed by time."""
+        index = pd.DatetimeIndex(data.index)
+        if self._length == 0:
+            self._tz = index.tz
+        if index.tz is not None:
+            index = index.tz_convert('UTC')
+        self.append(index.asi8, data.to_numpy())
+
+    def append(self, times, values):
+        """Append readings given as arrays of timestamps and values.
+
+        :param times: Array of np.datetime64 timestamps, or int64 nanoseconds
+                      since the epoch (UTC for time zone aware series)
+        :param values: Array of readings, the same length as times
+        """
+        times = np.asarray(times)
+        if times.dtype.kind == 'M':
+            times = times.astype('datetime64[ns]').view('int64')
+        values = np.asarray(values)
+        if len(times) != len(values):
+            raise ValueError('times and values should be the same length')
+        if not self._times.flags.writeable:
+            raise ValueError(f'{self.name} is a read-only mapped series')
+
+        end = self._length + len(times)
+        dtype = np.result_type(self._values, values)
+        if end > len(self._times) or dtype != self._values.dtype:
+            capacity = max(end, 2 * len(self._times), self.INITIAL_CAPACITY)
+            self._times = _grow(self._times, capacity, self._length)
+            self._values = _grow(self._values, capacity, self._length, dtype)
+
+        if len(times):
+            self._sorted = (self._sorted and np.all(times[1:] >= times[:-1])
+                            and (self._length == 0 or times[0] >= self._times[self._length - 1]))
+            valid = np.flatnonzero(pd.notna(values))
+            if len(valid):
+                # The last of equal timestamps is the most recent reading
+                latest = valid[len(valid) - 1 - np.argmax(times[valid][::-1])]
+                if self._last is None or times[latest] >= self._last[0]:
+                    self._last = (times[latest], values[latest])
+                    self._publish()
+
+        self._times[self._length:end] = times
+        self._values[self._length:end] = values
+        self._length = end
+        self._series = None
+        self._lookup = None
+        self._index = None
+        self._version += 1
+        _invalidate_cached(self)
+
+    @property
+    def version(self):
+        """Counter increased whenever readings are added, so caches can tell
+        the series has changed."""
+        return self._version
+
+    def _publish(self):
+        """Copy the latest reading into the LatestReadings tables holding
+        this series."""
+        for table, row in self._tables:
+            table._update(row, self)
+
+    @property
+    def last_reading(self):
+        """The (time, value) of the latest non-missing reading, or None.
+
+        This is kept up to date as readings are appended, so costs O(1).
+        """
+        if self._last is None:
+            return None
+        return self._timestamp(self._last[0]), self._last[1]
+
+    def as_of(self, time):
+        """The (time, value) of the latest non-missing reading at or before
+        a given time, or None.
+
+        Readings appended in time order are binary searched where they are
+        held, stepping back over any missing readings. Otherwise they are
+        sorted once after each batch of appends and the sorted copy searched.
+        """
+        reading = self._reading_as_of(self._time_value(time))
+        if reading is None:
+            return None
+        return self._timestamp(reading[0]), reading[1]
+
+    def _reading_as_of(self, nanoseconds):
+        """as_of for a time given as int64 nanoseconds, returning the time
+        of the reading as held in the buffers."""
+        if self._sorted:
+            times = self._times[:self._length]
+            position = self._position(times, nanoseconds, 'right')
+            return _last_valid(times[:position], self._values[:position])
+
+        if self._lookup is None:
+            times = self._times[:self._length]
+            values = self._values[:self._length]
+            valid = pd.notna(values)
+            times, values = times[valid], values[valid]
+            order = np.argsort(times, kind='stable')
+            self._lookup = (times[order], values[order])
+
+        times, values = self._lookup
+        position = np.searchsorted(times, nanoseconds, side='right') - 1
+        if position < 0:
+            return None
+        return times[position], values[position]
+
+    def between(self, start=None, end=None):
+        """The readings between two times, inclusive, as a pandas Series in
+        time order.
+
+        Readings in time order are found by binary search, so only the
+        pages of a memory mapped series holding the readings are read.
+
+        :param start: Earliest time, or None from the first reading
+        :param end: Latest time, or None to the last reading
+        """
+        times = self._times[:self._length]
+        values = self._values[:self._length]
+        if not self._sorted:
+            order = np.argsort(times, kind='stable')
+            times, values = times[order], values[order]
+        first = 0 if start is None else self._position(times, self._time_value(start), 'left')
+        last = (self._length if end is None
+                else self._position(times, self._time_value(end), 'right'))
+        return self._make_series(times[first:last], values[first:last])
+
+    def _position(self, times, value, side):
+        """Binary search for an int64 time, using the sparse index if there
+        is one."""
+        if self._index is None:
+            return np.searchsorted(times, value, side=side)
+        sparse, stride = self._index
+        block = np.searchsorted(sparse, value, side=side)
+        first = max(block - 1, 0) * stride
+        # Readings after the last indexed one are searched in full
+        last = len(times) if block == len(sparse) else min(block * stride, len(times))
+        return first + np.searchsorted(times[first:last], value, side=side)
+
+    def _time_value(self, time):
+        """Convert a time to int64 nanoseconds as held in the buffers."""
+        time = pd.Timestamp(time)
+        if self._tz is not None and time.tz is None:
+            time = time.tz_localize(self._tz)
+        return time.value
+
+    def _timestamp(self, nanoseconds):
+        """Convert an int64 time from the buffers into a pandas Timestamp."""
+        if self._tz is not None:
+            return pd.Timestamp(nanoseconds, tz='UTC').tz_convert(self._tz)
+        return pd.Timestamp(nanoseconds)
     
     def __str__(self):
         if self.units:
             return f"{self.name} ({self.units})"
         else:
             return self.name
+
+
+def _last_valid(times, values, chunk=4096):
+    """The (time, value) of the last non-missing reading, searching back
+    from the end a chunk at a time, or None."""
+    end = len(values)
+    # Most often the last reading is not missing
+    if end and pd.notna(values[end - 1]):
+        return times[end - 1], values[end - 1]
+    while end > 0:
+        start = max(end - chunk, 0)
+        valid = np.flatnonzero(pd.notna(values[start:end]))
+        if len(valid):
+            return times[start + valid[-1]], values[start + valid[-1]]
+        end = start
+    return None
+
+
+def _grow(buffer, capacity, length, dtype=None):
+    """Copy the first length items of a buffer into a new, larger buffer."""
+    grown = np.empty(capacity, dtype=dtype or buffer.dtype)
+    grown[:length] = buffer[:length]
+    return grown
+
         
 # If the class inherits from another class, we include 
 # the parent class name in brackets.
 """Inheritance from from Site and MeasurementSeries """
 class Location:
     """A Location."""
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
     #convert the object to string
@@ -53,11 +345,36 @@ class Location:
 # or X is a subclass of Y.
 class Site(Location):
     """A measurement site in the study."""
+    __slots__ = ('_measurements', 'long_name', 'easting', 'northing', 'latitude', 'longitude',
+                 '_tables')
+
     #dunder method
-    def __init__(self,name):
+    def __init__(self, name, long_name=None, easting=None, northing=None,
+                 latitude=None, longitude=None):
         #inherits the behaviour from super class location
         super().__init__(name)
-        self.measurements = {}
+        self._tables = []
+        self._measurements = _Measurements(self)
+        self.long_name = long_name
+        self.easting = easting
+        self.northing = northing
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def measurements(self):
+        """Dictionary-like mapping of measurement name -> MeasurementSeries.
+
+        It can be changed in place but not replaced, since the catchments
+        holding the site follow it for their latest readings.
+        """
+        return self._measurements
+
+    @measurements.setter
+    def measurements(self, measurements):
+        # Augmented assignment such as |= sets the mapping back to itself
+        if measurements is not self._measurements:
+            raise AttributeError("can't replace measurements; change them in place")
 
     def add_measurement(self, measurement_id, data, units=None):    
         if measurement_id in self.measurements.keys():
@@ -70,27 +387,412 @@ class Site(Location):
     # each measurement series, combined into a single dataframe:
     @property
     def last_measurements(self):
-        return pd.concat(
-            [self.measurements[key].series[-1:] for key in self.measurements.keys()],
-            axis=1).sort_index()
+        last_readings = {key: self.measurements[key].last_reading for key in self.measurements}
+        return pd.DataFrame(
+            {key: pd.Series([reading[1]], index=[reading[0]])
+             for key, reading in last_readings.items() if reading is not None}).sort_index()
     
 class Catchment(Location):
     """A catchment area in the study."""
-    def __init__(self, name):
+    __slots__ = ('_sites', 'boundary', '_latest')
+
+    def __init__(self, name, boundary=None):
         super().__init__(name)
-        self.sites = {}
+        self._latest = LatestReadings()
+        self._sites = _Sites(self._latest)
+        self.boundary = boundary
+
+    @property
+    def sites(self):
+        """Dictionary-like mapping of site name -> Site.
+
+        It can be changed in place but not replaced, since it keeps the
+        table of latest readings up to date.
+        """
+        return self._sites
+
+    @sites.setter
+    def sites(self, sites):
+        # Augmented assignment such as |= sets the mapping back to itself
+        if sites is not self._sites:
+            raise AttributeError("can't replace sites; change them in place")
+
+    @classmethod
+    def from_frame(cls, name, measurement_id, data, units=None):
+        """Create a catchment with a site for each column of a 2D data array.
+
+        :param name: Name of the catchment
+        :param measurement_id: Name of the measurement held in data
+        :param data: A 2D Pandas data frame with measurement data.
+                     Index must be np.datetime64 compatible format. Columns are measurement sites.
+        :param units: Units of the measurement
+        """
+        catchment = cls(name)
+        catchment.add_measurements(measurement_id, data, units)
+        return catchment
 
     def add_site(self, new_site):
         # Basic check to see if the site has already been added 
         # to the catchment area 
-        for site in self.sites:
-            if site == new_site:
-                print(f'{new_site} has already been added to site list')
-                return
+        if new_site.name in self.sites:
+            print(f'{new_site} has already been added to site list')
+            return
+
+        self.sites[new_site.name] = new_site
+
+    def add_measurements(self, measurement_id, data, units=None):
+        """Add the readings of a 2D data array to the catchment's sites,
+        creating any sites the catchment does not have yet.
+
+        The index and values are converted to arrays once for the whole
+        frame rather than once per site.
+
+        :param measurement_id: Name of the measurement held in data
+        :param data: A 2D Pandas data frame with measurement data.
+                     Index must be np.datetime64 compatible format. Columns are measurement sites.
+        :param units: Units of the measurement
+        """
+        index = pd.DatetimeIndex(data.index)
+        tz = index.tz
+        times = (index.tz_convert('UTC') if tz is not None else index).asi8
+        values = data.to_numpy()
+
+        for column, site_name in enumerate(data.columns):
+            site = self.sites.get(site_name)
+            if site is None:
+                site = self.sites[site_name] = Site(site_name)
+            if measurement_id in site.measurements:
+                site.measurements[measurement_id].append(times, values[:, column])
+            else:
+                site.measurements[measurement_id] = MeasurementSeries.from_arrays(
+                    times, values[:, column], measurement_id, units, tz)
+
+
+    def latest_measurements(self, as_of=None):
+        """Table of the latest non-missing reading of every measurement at
+        every site in the catchment.
+
+        The catchment keeps a table of latest readings that each series
+        updates in place as data is added, so this copies its arrays rather
+        than visiting every series. With as_of, each series is binary
+        searched instead.
+
+        :param as_of: Only consider readings at or before this time
+        :returns: Pandas data frame indexed by (Site, Measurement) with the
+                  Date and Value of each reading
+        """
+        if as_of is None:
+            return self._latest.frame()
+        return self._latest.frame_as_of(as_of)
+
+
+class LatestReadings:
+    """Table of the latest non-missing reading of each (site, measurement)
+    of a catchment.
+
+    Times and values are held in preallocated NumPy arrays, one row per
+    (site, measurement), whose capacity doubles when full. Each series
+    holds its rows and overwrites them in place when a later reading is
+    appended, so the table is never rebuilt.
+    """
+    INITIAL_CAPACITY = 16
+
+    # Time of rows with no reading
+    NO_TIME = np.iinfo(np.int64).min
+
+    def __init__(self):
+        self._rows = {}
+        self._series = []
+        self._zones = []
+        self._tz_rows = collections.Counter()
+        self._times = np.full(self.INITIAL_CAPACITY, self.NO_TIME, dtype='int64')
+        self._values = np.full(self.INITIAL_CAPACITY, np.nan)
+        self._index = None
+
+    def add_site(self, key, site):
+        """Add the rows of a site's measurements, and any it gets later.
 
-        self.sites[new_site.name] = Site(new_site)
+        :param key: Name of the site in the catchment
+        :param site: Site
+        """
+        site._tables.append((self, key))
+        for measurement_id, series in site.measurements.items():
+            self.add(key, measurement_id, series)
 
-def read_variable_from_csv(filename, measurement):
+    def remove_site(self, key, site):
+        """Clear the rows of a site that has been removed from the catchment."""
+        site._tables.remove((self, key))
+        for measurement_id in site.measurements:
+            self.remove(key, measurement_id)
+
+    def add(self, key, measurement_id, series):
+        """Make a series the one whose latest reading fills a row."""
+        row = self._rows.get((key, measurement_id))
+        if row is None:
+            row = self._rows[(key, measurement_id)] = len(self._series)
+            if row == len(self._times):
+                self._times = np.concatenate(
+                    [self._times, np.full(row, self.NO_TIME, dtype='int64')])
+                self._values = np.concatenate([self._values, np.full(row, np.nan)])
+            self._series.append(None)
+            self._zones.append(None)
+            self._index = None
+        else:
+            self.remove(key, measurement_id)
+        self._series[row] = series
+        series._tables.append((self, row))
+        self._update(row, series)
+
+    def remove(self, key, measurement_id):
+        """Clear a row, which is kept for the measurement being added again."""
+        row = self._rows.get((key, measurement_id))
+        if row is None or self._series[row] is None:
+            return
+        self._series[row]._tables.remove((self, row))
+        self._series[row] = None
+        self._set(row, None, None)
+
+    def _update(self, row, series):
+        """Copy a series' latest reading into its row."""
+        self._set(row, series._last, series._tz)
+
+    def _set(self, row, reading, tz):
+        if reading is None:
+            self._times[row], self._values[row], tz = self.NO_TIME, np.nan, None
+        else:
+            self._times[row], self._values[row] = reading
+        # Rows are counted by time zone so the Date column can be converted
+        # to the time zone shared by all the readings
+        if self._times[row] == self.NO_TIME:
+            tz = None
+        if self._zones[row] is not None:
+            self._tz_rows[self._zones[row]] -= 1
+        if tz is not None:
+            self._tz_rows[tz] += 1
+        self._zones[row] = tz
+
+    def get(self, site, measurement_id):
+        """The (time, value) of the latest reading of a measurement at a
+        site, or None."""
+        row = self._rows.get((site, measurement_id))
+        if row is None or self._times[row] == self.NO_TIME:
+            return None
+        return self._series[row].last_reading
+
+    def frame(self):
+        """The table as a Pandas data frame indexed by (Site, Measurement)
+        with the Date and Value of each reading."""
+        length = len(self._series)
+        times = self._times[:length]
+        zones = [tz for tz, rows in self._tz_rows.items() if rows]
+        if len(zones) == 1 and self._tz_rows[zones[0]] < np.count_nonzero(times != self.NO_TIME):
+            zones.append(None)
+        return self._frame(times, self._values[:length], zones)
+
+    def frame_as_of(self, time):
+        """Like frame, but with the latest reading of each series at or
+        before a time."""
+        time = pd.Timestamp(time)
+        # The time in nanoseconds for each time zone, as naive times are
+        # taken to be in the time zone of the series
+        nanoseconds = {}
+        times = np.full(len(self._series), self.NO_TIME, dtype='int64')
+        values = np.full(len(self._series), np.nan)
+        for row, series in enumerate(self._series):
+            if series is None:
+                continue
+            if series._tz not in nanoseconds:
+                nanoseconds[series._tz] = series._time_value(time)
+            reading = series._reading_as_of(nanoseconds[series._tz])
+            if reading is not None:
+                times[row], values[row] = reading
+        zones = {self._series[row]._tz for row in np.flatnonzero(times != self.NO_TIME)}
+        return self._frame(times, values, [tz for tz in zones if tz is not None]
+                           + ([None] if None in zones and len(zones) > 1 else []))
+
+    def _frame(self, times, values, zones):
+        """Frame of the rows with a reading; the dates are converted to the
+        time zone of the readings if they share one, or else to UTC if any
+        has a time zone."""
+        if self._index is None:
+            self._index = pd.MultiIndex.from_tuples(list(self._rows),
+                                                    names=['Site', 'Measurement'])
+        found = times != self.NO_TIME
+        dates = pd.DatetimeIndex(times[found].view('datetime64[ns]'))
+        if zones:
+            dates = dates.tz_localize('UTC')
+            if len(zones) == 1:
+                dates = dates.tz_convert(zones[0])
+        return pd.DataFrame({'Date': dates, 'Value': values[found]}, index=self._index[found])
+
+
+class _Registry(collections.abc.MutableMapping):
+    """A mapping over a dictionary whose every change goes through
+    __setitem__ and __delitem__, which subclasses extend to keep a
+    LatestReadings table up to date."""
+    __slots__ = ('_items',)
+
+    def __init__(self):
+        self._items = {}
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        del self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+    def keys(self):
+        return self._items.keys()
+
+    def values(self):
+        return self._items.values()
+
+    def items(self):
+        return self._items.items()
+
+    def popitem(self):
+        # Last in, first out, as for a dict
+        if not self._items:
+            raise KeyError('popitem(): mapping is empty')
+        key = next(reversed(self._items))
+        value = self._items[key]
+        del self[key]
+        return key, value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __repr__(self):
+        return repr(self._items)
+
+
+class _Sites(_Registry):
+    """The sites of a catchment by name, adding each site's rows to the
+    catchment's LatestReadings."""
+    __slots__ = ('_latest',)
+
+    def __init__(self, latest):
+        super().__init__()
+        self._latest = latest
+
+    def __setitem__(self, key, site):
+        if key in self._items:
+            self._latest.remove_site(key, self._items[key])
+        super().__setitem__(key, site)
+        self._latest.add_site(key, site)
+
+    def __delitem__(self, key):
+        site = self._items[key]
+        super().__delitem__(key)
+        self._latest.remove_site(key, site)
+
+
+class _Measurements(_Registry):
+    """The measurements of a site by name, adding each new series to the
+    LatestReadings of the catchments holding the site."""
+    __slots__ = ('_site',)
+
+    def __init__(self, site):
+        super().__init__()
+        self._site = site
+
+    def __setitem__(self, measurement_id, series):
+        super().__setitem__(measurement_id, series)
+        for table, key in self._site._tables:
+            table.add(key, measurement_id, series)
+
+    def __delitem__(self, measurement_id):
+        super().__delitem__(measurement_id)
+        for table, key in self._site._tables:
+            table.remove(key, measurement_id)
+
+
+def read_sites_from_csv(filename):
+    """Reads site locations from a CSV file in the layout of
+    LOCAR_Site_Information.csv and groups the sites into catchments by
+    the letters at the start of their site codes.
+
+    :param filename: Filename of CSV to load
+    :returns: Dictionary of catchment name -> Catchment
+    """
+    dataset = pd.read_csv(filename)
+    # The file ends with notes on the instrument columns, which have no location
+    dataset = dataset.dropna(subset=['Site Code', 'Easting', 'Northing'])
+    dataset['Catchment'] = dataset['Site Code'].str.extract(r'^([A-Za-z]+)', expand=False)
+
+    catchments = {}
+    for catchment_name, code, long_name, easting, northing, latitude, longitude in zip(
+            dataset['Catchment'], dataset['Site Code'], dataset['Site Name'],
+            dataset['Easting'].tolist(), dataset['Northing'].tolist(),
+            dataset['Latitude'].tolist(), dataset['Longitude'].tolist()):
+        catchment = catchments.get(catchment_name)
+        if catchment is None:
+            catchment = catchments[catchment_name] = Catchment(catchment_name)
+        catchment.sites[code] = Site(code, long_name, easting, northing, latitude, longitude)
+    return catchments
+
+#Date formats found in the LOCAR exports, tried in order when no
+#format is supplied: the rain files use day-first dates and the river
+#files use ISO timestamps
+DATE_FORMATS = ['%d/%m/%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M']
+
+
+def detect_date_format(dates):
+    """Detect which of the known LOCAR date formats a column of dates uses.
+
+    :param dates: Pandas Series of date strings
+    :returns: The matching format string from DATE_FORMATS, or None if
+              no known format matches the first valid date
+    """
+    sample = dates.dropna()
+    if sample.empty:
+        return None
+    sample = str(sample.iloc[0])
+    for date_format in DATE_FORMATS:
+        try:
+            datetime.datetime.strptime(sample, date_format)
+        except ValueError:
+            continue
+        return date_format
+    return None
+
+
+@profiling.profiled(rows='input')
+def parse_dates(dates, date_format=None):
+    """Convert a column of date strings to datetimes in a single pass.
+
+    :param dates: Pandas Series of date strings
+    :param date_format: strptime format of the dates. Detected from the
+                        data if not given; falls back to day-first parsing
+                        if the format is not one of DATE_FORMATS
+    :returns: Pandas Series of datetime64 values
+    """
+    if date_format is None:
+        date_format = detect_date_format(dates)
+    if date_format is None:
+        return pd.to_datetime(dates, dayfirst=True)
+    return pd.to_datetime(dates, format=date_format)
+
+
+@profiling.profiled()
+def read_variable_from_csv(filename, measurement, date_format=None, engine='pivot',
+                           compact=False):
     """Reads a named variable from a CSV file, and returns a
     pandas dataframe containing that variable. The CSV file must contain
     a column of dates, a column of site ID's, and (one or more) columns
@@ -98,9 +800,165 @@ def read_variable_from_csv(filename, measurement):
 
     :param filename: Filename of CSV to load
     :param measurement: Name of data column to be read
+    :param date_format: strptime format of the Date column, detected if not given
+    :param engine: 'pivot' to parse and reshape the data in one vectorised pass,
+                   or 'legacy' for the original row-by-row reader
+    :param compact: Read site codes as categoricals and store the data as
+                    float32 where that keeps every value exactly; see compact_dtypes
     :return: 2D array of given variable. Index will be dates,
              Columns will be the individual sites
     """
+    if engine == 'legacy':
+        return _read_variable_from_csv_legacy(filename, measurement)
+    if engine != 'pivot':
+        raise ValueError(f"engine should be 'pivot' or 'legacy', not {engine!r}")
+
+    with profiling.stage('read_csv') as stage:
+        dataset = pd.read_csv(filename, usecols=['Date', 'Site', measurement],
+                              dtype={'Site': 'category'} if compact else None)
+        stage.rows = len(dataset)
+    dataset['Date'] = parse_dates(dataset['Date'], date_format)
+
+    newdataset = _pivot_sites(dataset, measurement)
+    return compact_dtypes(newdataset) if compact else newdataset
+
+
+@profiling.profiled()
+def read_variables_from_csv(filename, measurements, date_format=None, combine=False,
+                            compact=False):
+    """Reads several named variables from a CSV file in a single pass.
+
+    The file is read once, the dates are parsed once and all of the
+    measurement columns are reshaped together by a single unstack.
+
+    :param filename: Filename of CSV to load
+    :param measurements: List of names of data columns to be read
+    :param date_format: strptime format of the Date column, detected if not given
+    :param combine: If True return one frame with (Measurement, Site) columns
+    :param compact: Use compact dtypes, as for read_variable_from_csv
+    :return: Dictionary of measurement name -> 2D array of that variable,
+             in the same layout as read_variable_from_csv. If combine is
+             True, a single 2D array with MultiIndex columns instead.
+    """
+    measurements = list(measurements)
+    with profiling.stage('read_csv') as stage:
+        dataset = pd.read_csv(filename, usecols=['Date', 'Site'] + measurements,
+                              dtype={'Site': 'category'} if compact else None)
+        stage.rows = len(dataset)
+    dataset['Date'] = parse_dates(dataset['Date'], date_format)
+
+    newdataset = _pivot_sites(dataset, measurements)
+    if compact:
+        newdataset = compact_dtypes(newdataset)
+    if combine:
+        return newdataset
+
+    return {measurement: newdataset[measurement].rename_axis(columns=None)
+            for measurement in measurements}
+
+
+@profiling.profiled('pivot', rows='input')
+def _pivot_sites(dataset, measurement):
+    """Reshape long (Date, Site, measurement) rows into a Date x Site frame.
+
+    If measurement is a list, the columns are a (Measurement, Site)
+    MultiIndex. Sites keep the order in which they first appear in the
+    data, matching the original per-site reader.
+    """
+    sites = np.asarray(dataset['Site'].unique())
+    newdataset = dataset.set_index(['Date', 'Site'])[measurement].unstack('Site')
+    newdataset.index.name = None
+    if isinstance(measurement, list):
+        columns = pd.MultiIndex.from_product([measurement, sites],
+                                             names=['Measurement', 'Site'])
+        return newdataset.reindex(columns=columns)
+    newdataset = newdataset.reindex(columns=sites)
+    newdataset.columns.name = None
+    return newdataset
+
+
+# Significant digits of any decimal that float32 keeps exactly as written
+FLOAT32_DIGITS = 6
+FLOAT32_INFO = np.finfo(np.float32)
+
+
+def fits_float32(values, chunk=1 << 16):
+    """Check whether an array of floats can be stored as float32 without
+    changing any value as it would be written out, e.g. 7.96 stays 7.96.
+
+    Values outside the normal float32 range never fit. Those with at most
+    FLOAT32_DIGITS significant digits always do, and are found with
+    arithmetic. Only the rest are converted to float32 and back through
+    strings, a chunk at a time to bound the memory used.
+
+    :param values: ndarray of float64 values
+    :param chunk: Number of values checked at a time
+    """
+    for start in range(0, len(values), chunk):
+        part = values[start:start + chunk]
+        part = part[~np.isnan(part)]
+        with np.errstate(all='ignore'):
+            magnitude = np.abs(part)
+            scale = 10.0 ** (FLOAT32_DIGITS - 1 - np.floor(np.log10(magnitude)))
+            # Subnormal float32 values lose precision, and larger ones overflow
+            in_range = (magnitude >= FLOAT32_INFO.tiny) & (magnitude <= FLOAT32_INFO.max)
+            if not np.all(in_range | (part == 0)):
+                return False
+            short = (np.rint(part * scale) / scale == part) | (part == 0)
+            rest = part[~short]
+            narrowed = rest.astype(np.float32)
+        if not np.all(narrowed.astype(str).astype(np.float64) == rest):
+            return False
+    return True
+
+
+def compact_dtypes(data):
+    """Convert a data frame to compact column types.
+
+    Text columns such as site codes and names become categoricals, and
+    float64 columns become float32 when that keeps every value. Date
+    columns are left as datetime64, which is stored as int64 nanoseconds
+    since the epoch.
+
+    :param data: Pandas data frame in the long CSV layout or as a 2D
+                 Date x Site array
+    :returns: A copy of the data frame using the compact types
+    """
+    dtypes = {}
+    for column, dtype in data.dtypes.items():
+        if dtype == object:
+            dtypes[column] = 'category'
+        elif dtype == np.float64 and fits_float32(data[column].to_numpy()):
+            dtypes[column] = np.float32
+    return data.astype(dtypes) if dtypes else data
+
+
+@profiling.profiled()
+def combine_frames(frames):
+    """Combine 2D data arrays covering different periods or sites into one.
+
+    Rows are merged in date order. Sites missing from some of the frames
+    are left as NaN for those periods. Where frames overlap, the latest
+    frame's reading is used, unless it is missing.
+
+    :param frames: List of 2D Pandas data frames with measurement data;
+                   empty frames, e.g. from files without the sites wanted,
+                   are skipped
+    :returns: A 2D Pandas data frame covering all of the frames, which is
+              empty if they all are
+    """
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([]))
+    combined = pd.concat(frames)
+    if combined.index.has_duplicates:
+        combined = combined.groupby(level=0, sort=False).last()
+    return combined.sort_index()
+
+
+def _read_variable_from_csv_legacy(filename, measurement):
+    """Original reader: parses each date individually and filters the
+    dataset once per site. Kept for comparison in the benchmarks."""
     dataset = pd.read_csv(filename, usecols=['Date', 'Site', measurement])
 
     dataset = dataset.rename({'Date':'OldDate'}, axis='columns')
@@ -116,61 +974,902 @@ def read_variable_from_csv(filename, measurement):
 
     return newdataset
 
-def daily_total(data):
+
+#Quality control flags, one bit each in the flag matrix
+QC_MISSING = 1
+QC_GAP = 2
+QC_FLATLINE = 4
+QC_RANGE = 8
+QC_SPIKE = 16
+QC_BATTERY = 32
+QC_FLAGS = {'missing': QC_MISSING, 'gap': QC_GAP, 'flatline': QC_FLATLINE,
+            'range': QC_RANGE, 'spike': QC_SPIKE, 'battery': QC_BATTERY}
+
+#Flags of readings that should be left out of statistics
+QC_MASKED = ['flatline', 'range', 'spike', 'battery']
+
+#Loggers record every 15 minutes
+EXPECTED_INTERVAL = '15min'
+
+#Below this voltage the loggers' readings are unreliable
+MIN_BATTERY_VOLTS = 11.5
+
+
+def _previous_readings(values):
+    """The row of each site's previous reading before each row, or -1 if none."""
+    rows = np.arange(len(values))
+    latest = np.where(np.isnan(values), -1, rows[:, np.newaxis])
+    latest = np.maximum.accumulate(latest, axis=0)
+    previous = np.empty_like(latest)
+    previous[:1] = -1
+    previous[1:] = latest[:-1]
+    return previous
+
+
+@profiling.profiled(rows='input')
+def quality_flags(data, interval=EXPECTED_INTERVAL, valid_range=None, max_step=None,
+                  flatline=None, battery=None, min_battery=MIN_BATTERY_VOLTS):
+    """Check every reading of a 2D data array for common sensor faults.
+
+    Each check is done for all sites at once, comparing each reading with
+    the site's previous reading, so missing rows and readings are skipped
+    over rather than breaking the comparisons. The result holds one byte
+    per reading, with a bit set for each check it fails (see QC_FLAGS):
+
+    - missing: there is no reading
+    - gap: the previous reading is more than interval earlier
+    - flatline: the reading is part of a run of at least flatline
+      identical readings
+    - range: the reading is outside valid_range
+    - spike: the reading changed by more than max_step per interval
+      since the previous reading
+    - battery: the logger's battery was below min_battery volts
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param interval: Expected time between readings
+    :param valid_range: (low, high) limits of plausible readings, either
+                        of which may be None, or None to not check
+    :param max_step: Largest plausible change per interval, or None to not check
+    :param flatline: Number of identical readings in a row that suggest a
+                     stuck sensor, or None to not check
+    :param battery: 2D Pandas data frame of the 'Battery (V)' measurement
+                    for the same sites, or None to not check
+    :param min_battery: Lowest battery voltage of a working logger
+    :returns: A 2D Pandas data frame of uint8 flags, with the same index
+              and columns as data
+    """
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    times = pd.DatetimeIndex(data.index).asi8
+    values = data.to_numpy()
+    step = pd.Timedelta(interval).value
+
+    present = ~np.isnan(values)
+    flags = np.where(present, 0, QC_MISSING).astype(np.uint8)
+
+    previous = _previous_readings(values)
+    follows = present & (previous >= 0)
+    previous = np.maximum(previous, 0)
+    elapsed = times[:, np.newaxis] - times[previous]
+    flags[follows & (elapsed > step)] |= QC_GAP
+
+    if max_step is not None or flatline is not None:
+        change = values - np.take_along_axis(values, previous, axis=0)
+
+    if max_step is not None:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.abs(change) / (elapsed / step)
+        flags[follows & (rate > max_step)] |= QC_SPIKE
+
+    if flatline is not None:
+        # Number each run of identical readings, separately for each site
+        repeat = follows & (change == 0)
+        runs = np.cumsum(present & ~repeat, axis=0)
+        runs += np.arange(values.shape[1]) * (len(values) + 1)
+        lengths = np.bincount(runs[present], minlength=values.shape[1] * (len(values) + 1))
+        flags[present & (lengths[runs] >= flatline)] |= QC_FLATLINE
+
+    if valid_range is not None:
+        low, high = valid_range
+        with np.errstate(invalid='ignore'):
+            if low is not None:
+                flags[values < low] |= QC_RANGE
+            if high is not None:
+                flags[values > high] |= QC_RANGE
+
+    if battery is not None:
+        volts = battery.reindex(index=data.index, columns=data.columns).to_numpy()
+        with np.errstate(invalid='ignore'):
+            flags[present & (volts < min_battery)] |= QC_BATTERY
+
+    return pd.DataFrame(flags, index=data.index, columns=data.columns)
+
+
+def quality_mask(flags, checks=QC_MASKED):
+    """Find the readings that failed any of some quality checks.
+
+    :param flags: Flags returned by quality_flags
+    :param checks: Names of the checks in QC_FLAGS
+    :returns: A 2D boolean data frame, True where a reading failed
+    """
+    bits = np.uint8(sum(QC_FLAGS[check] for check in checks))
+    return (flags & bits) != 0
+
+
+def quality_summary(flags, checks=QC_MASKED):
+    """Count the readings of each site that failed each quality check.
+
+    :param flags: Flags returned by quality_flags
+    :param checks: Checks counted as making a reading bad
+    :returns: Pandas data frame indexed by site, with the number of
+              readings, a count for each check in QC_FLAGS, the number
+              of bad readings and the fraction of readings that are good
+    """
+    values = flags.to_numpy()
+    summary = pd.DataFrame(index=flags.columns)
+    summary['readings'] = np.count_nonzero((values & QC_MISSING) == 0, axis=0)
+    for check, bit in QC_FLAGS.items():
+        summary[check] = np.count_nonzero(values & bit, axis=0)
+    bits = np.uint8(sum(QC_FLAGS[check] for check in checks))
+    summary['bad'] = np.count_nonzero(values & bits, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary['good_fraction'] = 1 - summary['bad'] / summary['readings']
+    return summary
+
+
+def find_gaps(data, interval=EXPECTED_INTERVAL):
+    """List the gaps in each site's readings.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param interval: Expected time between readings
+    :returns: Pandas data frame with a row for each gap, giving the Site,
+              the Start and End times of the readings either side, the
+              Duration between them and the number of Missing readings
+    """
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    times = pd.DatetimeIndex(data.index).asi8
+    values = data.to_numpy()
+    step = pd.Timedelta(interval).value
+
+    previous = _previous_readings(values)
+    found = ~np.isnan(values) & (previous >= 0)
+    found &= times[:, np.newaxis] - times[np.maximum(previous, 0)] > step
+    # Gaps in site order, then time order
+    columns, rows = np.nonzero(found.T)
+    starts = times[previous[rows, columns]]
+    ends = times[rows]
+    return pd.DataFrame({
+        'Site': np.asarray(data.columns)[columns],
+        'Start': pd.DatetimeIndex(starts.view('datetime64[ns]')),
+        'End': pd.DatetimeIndex(ends.view('datetime64[ns]')),
+        'Duration': pd.to_timedelta(ends - starts),
+        'Missing': (ends - starts) // step - 1,
+    })
+
+
+DAILY_STATISTICS = ['sum', 'mean', 'max', 'min']
+
+
+@profiling.profiled(rows='input')
+def daily_stats(data, statistics=DAILY_STATISTICS, mask=None, chunk_columns=64):
+    """Calculate several daily statistics of a 2D data array together.
+
+    The rows are grouped by day once, using the datetime64 index floored
+    to midnight, and every statistic is computed from that one grouping.
+    The mean is derived from the sum and count rather than recomputed.
+
+    Masked readings are left out a block of columns at a time, so only
+    one block is ever copied rather than the whole frame.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param statistics: Names of the statistics to calculate, any of 'sum', 'mean',
+                       'max', 'min', 'count' and 'std', or floats between 0 and 1
+                       for quantiles
+    :param mask: Boolean array or data frame of the same shape as data,
+                 True for readings to leave out, or the flags returned by
+                 quality_flags to leave out readings failing the QC_MASKED checks
+    :param chunk_columns: Number of columns masked at a time
+    :returns: Dictionary of statistic -> 2D Pandas data frame with that statistic
+              of the measurements for each day.
+    """
+    days = pd.DatetimeIndex(data.index).normalize()
+    if mask is None:
+        results = _aggregate(data.groupby(days), statistics)
+    else:
+        if isinstance(mask, pd.DataFrame):
+            if not (mask.index.equals(data.index) and mask.columns.equals(data.columns)):
+                mask = mask.reindex(index=data.index, columns=data.columns,
+                                    fill_value=False if mask.dtypes.iloc[0] == bool else 0)
+            mask = mask.to_numpy()
+        if mask.shape != data.shape:
+            raise ValueError('mask should have the same shape as data')
+        bits = None
+        if mask.dtype != bool:
+            bits = np.uint8(sum(QC_FLAGS[check] for check in QC_MASKED))
+
+        parts = []
+        for start in range(0, data.shape[1], chunk_columns):
+            block = slice(start, start + chunk_columns)
+            masked = mask[:, block] if bits is None else (mask[:, block] & bits) != 0
+            parts.append(_aggregate(data.iloc[:, block].mask(masked).groupby(days),
+                                    statistics))
+        results = {statistic: pd.concat([part[statistic] for part in parts], axis=1)
+                   for statistic in statistics}
+
+    days = None
+    for statistic in results:
+        if days is None:
+            days = results[statistic].index.date
+        results[statistic].index = days
+    return results
+
+
+def _aggregate(grouped, statistics):
+    """Calculate named statistics from a single pandas groupby.
+
+    :returns: Dictionary of statistic -> aggregated data frame, in the
+              order the statistics were requested
+    """
+    results = {}
+    for statistic in statistics:
+        if statistic in ('sum', 'mean') and 'sum' not in results:
+            results['sum'] = grouped.sum()
+        if statistic in ('count', 'mean') and 'count' not in results:
+            results['count'] = grouped.count()
+
+        if statistic == 'mean':
+            results['mean'] = results['sum'] / results['count']
+            # Keep float32 data in float32 rather than upcasting
+            dtype = np.result_type(*results['sum'].dtypes, np.float16)
+            if dtype != np.float64:
+                results['mean'] = results['mean'].astype(dtype)
+        elif statistic in ('max', 'min', 'std'):
+            results[statistic] = grouped.agg(statistic)
+        elif not isinstance(statistic, str) and 0 <= statistic <= 1:
+            results[statistic] = grouped.quantile(statistic)
+        elif statistic not in ('sum', 'count'):
+            raise ValueError(f'Unknown statistic {statistic!r}')
+
+    return {statistic: results[statistic] for statistic in statistics}
+
+
+#Default size of an AggregationCache
+DEFAULT_AGGREGATION_CACHE_BYTES = 64 * 1024 ** 2
+
+#Every AggregationCache, so data changed in place can be invalidated in all of them
+_AGGREGATION_CACHES = weakref.WeakSet()
+
+
+class AggregationCache:
+    """A memo of daily statistics bounded by the bytes of the results held.
+
+    Results are keyed by a fingerprint of the input, the statistic and its
+    parameters. By default the fingerprint is the identity of the input
+    object plus a version: for a MeasurementSeries its version counter, so
+    a lookup costs nothing however large the data, and for a frame or
+    Pandas series a CRC32 checksum of its values, which reads them once
+    per lookup but far faster than they are aggregated. Results for an
+    object are dropped when it is garbage collected or its version
+    changes, e.g. when a frame is changed in place. With hash_contents the
+    fingerprint is a hash of the data instead, so equal frames share results
+    whatever object holds them, at the cost of hashing every value.
+
+    The least recently used results are evicted once the total exceeds
+    max_bytes.
+    """
+    def __init__(self, max_bytes=DEFAULT_AGGREGATION_CACHE_BYTES, hash_contents=False):
+        """
+        :param max_bytes: Total size of the results the cache may hold
+        :param hash_contents: Fingerprint inputs by hashing their contents
+        """
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+        self._entries = collections.OrderedDict()
+        self._sources = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _AGGREGATION_CACHES.add(self)
+
+    def fingerprint(self, data):
+        """A key for the current contents of data.
+
+        :param data: Pandas data frame or series, or MeasurementSeries
+        """
+        if self.hash_contents and not isinstance(data, MeasurementSeries):
+            digest = hashlib.sha1(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+            labels = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+            digest.update(repr(list(labels)).encode())
+            return ('hash', digest.hexdigest())
+
+        version = data.version if isinstance(data, MeasurementSeries) else _checksum(data)
+        source = self._sources.get(id(data))
+        if source is not None and (source[0]() is not data or source[1] != version):
+            self._forget(id(data))
+            source = None
+        if source is None:
+            reference = weakref.ref(data, lambda reference, key=id(data):
+                                    self._forget(key, reference))
+            self._sources[id(data)] = (reference, version, set())
+        return ('id', id(data), version)
+
+    def get(self, data, key, compute):
+        """Look up a result, computing and caching it if it is not held.
+
+        :param data: The input the result is computed from
+        :param key: Tuple of the operation and its parameters
+        :param compute: Function of no arguments returning the result
+        :returns: A copy of the result, which the caller may modify
+        """
+        fingerprint = self.fingerprint(data)
+        full_key = (fingerprint,) + tuple(key)
+        entry = self._entries.get(full_key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(full_key)
+            return entry[0].copy()
+
+        self.misses += 1
+        result = compute()
+        nbytes = int(result.memory_usage(deep=True).sum()) if isinstance(
+            result, pd.DataFrame) else int(result.memory_usage(deep=True))
+        if nbytes <= self.max_bytes:
+            self._entries[full_key] = (result, nbytes)
+            self.bytes += nbytes
+            if fingerprint[0] == 'id':
+                self._sources[fingerprint[1]][2].add(full_key)
+            while self.bytes > self.max_bytes:
+                evicted, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.bytes -= evicted_bytes
+                self.evictions += 1
+                if evicted[0][0] == 'id':
+                    self._sources[evicted[0][1]][2].discard(evicted)
+        return result.copy()
+
+    def _forget(self, key, reference=None):
+        """Drop the results computed from one input object."""
+        source = self._sources.get(key)
+        if source is None or (reference is not None and source[0] is not reference):
+            return
+        del self._sources[key]
+        for full_key in source[2]:
+            self.bytes -= self._entries.pop(full_key)[1]
+            self.invalidations += 1
+
+    def invalidate(self, data):
+        """Drop the results computed from data, e.g. after changing it in place."""
+        self._forget(id(data))
+
+    def clear(self):
+        """Drop every result."""
+        for key in list(self._sources):
+            self._forget(key)
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """Dictionary of the hits, misses, evictions and invalidations so far,
+        and the number of entries and bytes held."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'invalidations': self.invalidations, 'entries': len(self._entries),
+                'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+
+def _checksum(data):
+    """A cheap check of the contents of a frame or Pandas series, which
+    changes when its values are changed in place or its labels replaced."""
+    checksum = (id(data.index), id(data.columns) if isinstance(data, pd.DataFrame) else data.name)
+    crc = 0
+    for array in data._mgr.arrays:
+        # Datetime and categorical arrays wrap an ndarray
+        array = getattr(array, '_ndarray', array)
+        if not isinstance(array, np.ndarray) or array.dtype.hasobject:
+            digest = hashlib.sha1(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+            return checksum + (digest.hexdigest(),)
+        crc = zlib.crc32(np.ascontiguousarray(array), crc)
+    return checksum + (crc,)
+
+
+def invalidate_cached(data):
+    """Drop the results computed from data in every AggregationCache."""
+    for cache in list(_AGGREGATION_CACHES):
+        cache.invalidate(data)
+
+
+def _invalidate_cached(data):
+    if _AGGREGATION_CACHES:
+        invalidate_cached(data)
+
+
+def _daily(data, statistic, mask, sites, cache):
+    """Calculate one daily statistic, optionally of some sites and through a cache."""
+    def compute():
+        frame = data.series.to_frame() if isinstance(data, MeasurementSeries) else data
+        if sites is not None:
+            frame = frame[list(sites)]
+        return daily_stats(frame, [statistic], mask=mask)[statistic]
+
+    if cache is None or mask is not None:
+        return compute()
+    return cache.get(data, ('daily', statistic, None if sites is None else tuple(sites)),
+                     compute)
+
+
+@profiling.profiled(rows='input')
+def daily_total(data, mask=None, sites=None, cache=None):
     """Calculate the daily total of a 2D data array.
     
     :param data: A 2D Pandas data frame with measurement data.
                  Index must be np.datetime64 compatible format. Columns are measurement sites.
+                 A MeasurementSeries is taken as a frame with one column.
+    :param mask: Readings to leave out, as for daily_stats
+    :param sites: Only calculate for these sites
+    :param cache: AggregationCache to reuse results from, or None; results
+                  with a mask are not cached. Each lookup of a frame reads
+                  its values for a checksum, and changes that leave the
+                  CRC32 checksum the same are not detected
     :returns: A 2D Pandas data frame with total values of the measurements for each day.
     """
-    return data.groupby(data.index.date).sum()
+    return _daily(data, 'sum', mask, sites, cache)
 
-def daily_mean(data):
+@profiling.profiled(rows='input')
+def daily_mean(data, mask=None, sites=None, cache=None):
     """Calculate the daily mean of a 2D data array.
     
     :param data: A 2D Pandas data frame with measurement data.
                  Index must be np.datetime64 compatible format. Columns are measurement sites.
+                 A MeasurementSeries is taken as a frame with one column.
+    :param mask: Readings to leave out, as for daily_stats
+    :param sites: Only calculate for these sites
+    :param cache: AggregationCache to reuse results from, or None; results
+                  with a mask are not cached. Each lookup of a frame reads
+                  its values for a checksum, and changes that leave the
+                  CRC32 checksum the same are not detected
     :returns: A 2D Pandas data frame with mean values of the measurements for each day.
     """
-    return data.groupby(data.index.date).mean()
+    return _daily(data, 'mean', mask, sites, cache)
 
 
-def daily_max(data):
+@profiling.profiled(rows='input')
+def daily_max(data, mask=None, sites=None, cache=None):
     """Calculate the daily maximum of a 2D data array.
 
     :param data: A 2D Pandas data frame with measurement data. 
                  Index must be np.datetime64 compatible format. Columns are measurement sites.
+                 A MeasurementSeries is taken as a frame with one column.
+    :param mask: Readings to leave out, as for daily_stats
+    :param sites: Only calculate for these sites
+    :param cache: AggregationCache to reuse results from, or None; results
+                  with a mask are not cached. Each lookup of a frame reads
+                  its values for a checksum, and changes that leave the
+                  CRC32 checksum the same are not detected
     :returns: A 2D Pandas data frame with mean values of the measurements for each day.
     """
-    return data.groupby(data.index.date).max()
+    return _daily(data, 'max', mask, sites, cache)
 
 
-def daily_min(data):
+@profiling.profiled(rows='input')
+def daily_min(data, mask=None, sites=None, cache=None):
     """Calculate the daily min of a 2D data array.
     :param data: A 2D Pandas data frame with measurement data. 
                  Index must be np.datetime64 compatible format. Columns are measurement sites.
+                 A MeasurementSeries is taken as a frame with one column.
+    :param mask: Readings to leave out, as for daily_stats
+    :param sites: Only calculate for these sites
+    :param cache: AggregationCache to reuse results from, or None; results
+                  with a mask are not cached. Each lookup of a frame reads
+                  its values for a checksum, and changes that leave the
+                  CRC32 checksum the same are not detected
     :returns: A 2D Pandas data frame with mean values of the measurements for each day.
     """
-    return data.groupby(data.index.date).min()
+    return _daily(data, 'min', mask, sites, cache)
+
+#Alias for the UK hydrological (water) year, which runs from 1 October
+HYDROLOGICAL_YEAR = 'HY'
+
+#Bins of recently resampled indexes, keyed by the id of the index
+_BIN_CACHE = collections.OrderedDict()
+_BIN_CACHE_SIZE = 32
+
+
+class ResampleBins:
+    """The assignment of each row of a datetime index to a resampling period.
+
+    :ivar codes: Integer array giving the period of each row
+    :ivar labels: DatetimeIndex of the start of each period, in order
+    """
+    def __init__(self, codes, labels):
+        self.codes = codes
+        self.labels = labels
 
-def data_normalise(data):
+
+def _calendar_period(offset):
+    """The pandas period frequency of a calendar offset, ignoring its multiple.
+
+    Offsets anchored at the start of a month, quarter or year, and business
+    month, quarter and year ends, give the same calendar periods as the
+    plain month, quarter or year ends.
+    """
+    offsets = pd.offsets
+    if isinstance(offset, (offsets.MonthBegin, offsets.BusinessMonthBegin,
+                           offsets.BusinessMonthEnd)):
+        return offsets.MonthEnd()
+    if isinstance(offset, (offsets.QuarterBegin, offsets.BQuarterBegin)):
+        return offsets.QuarterEnd(startingMonth=(offset.startingMonth - 2) % 12 + 1)
+    if isinstance(offset, offsets.BQuarterEnd):
+        return offsets.QuarterEnd(startingMonth=offset.startingMonth)
+    if isinstance(offset, (offsets.YearBegin, offsets.BYearBegin)):
+        return offsets.YearEnd(month=(offset.month - 2) % 12 + 1)
+    if isinstance(offset, offsets.BYearEnd):
+        return offsets.YearEnd(month=offset.month)
+    if isinstance(offset, offsets.Week) and offset.weekday is None:
+        return offsets.Week(weekday=6)
+    base = offset.base
+    try:
+        pd.PeriodDtype(base)
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(f'Cannot resample to {offset.freqstr} periods') from None
+    return base
+
+
+def resample_bins(index, period, tz=None, ambiguous='raise', nonexistent='raise'):
+    """Assign the times in a datetime index to resampling periods.
+
+    Results are cached for the most recently used indexes, so resampling
+    the same frame with different statistics reuses the same bucketing.
+
+    :param index: Index of np.datetime64 compatible times
+    :param period: Pandas offset alias such as 'H', '6H', 'D', 'W', 'M', '2M'
+                   or 'QS', or HYDROLOGICAL_YEAR for years starting on
+                   1 October. Periods are labelled by their start; multiples
+                   of calendar periods are counted from the one holding 1970-01-01
+    :param tz: Time zone whose local calendar defines the periods. Naive
+               times are taken to be in this zone, aware times are converted
+               to it. Daily and longer periods start at local midnight;
+               sub-daily periods are fixed lengths of absolute time, so DST
+               transition days have 23 or 25 hourly bins
+    :param ambiguous: Pandas policy for local times repeated when clocks go back
+    :param nonexistent: Pandas policy for local times skipped when clocks go forward
+    :returns: ResampleBins for the index; rows with no time have code -1
+    """
+    key = (period, tz, ambiguous, nonexistent)
+    cached = _BIN_CACHE.get(id(index))
+    if cached is not None and cached[0]() is index and key in cached[1]:
+        _BIN_CACHE.move_to_end(id(index))
+        return cached[1][key]
+
+    times = pd.DatetimeIndex(index)
+    if tz is not None:
+        if times.tz is None:
+            times = times.tz_localize(tz, ambiguous=ambiguous, nonexistent=nonexistent)
+        else:
+            times = times.tz_convert(tz)
+
+    if period == HYDROLOGICAL_YEAR:
+        offset = None
+    else:
+        offset = pd.tseries.frequencies.to_offset(period)
+
+    # Rows with no time belong to no period
+    missing = np.asarray(times.isna())
+    if missing.any():
+        times = times[~missing]
+
+    if isinstance(offset, pd.offsets.Tick) and offset < pd.Timedelta('1D'):
+        # Fixed-length bins are laid out on the absolute timeline
+        labels = times.tz_convert('UTC').floor(offset) if times.tz is not None else times.floor(offset)
+        if times.tz is not None:
+            labels = labels.tz_convert(times.tz)
+    else:
+        # Calendar bins follow the local wall clock
+        local = times.tz_localize(None) if times.tz is not None else times
+        if offset is None:
+            years = np.asarray(local.year - (local.month < 10) - 1970, dtype='datetime64[Y]')
+            labels = pd.DatetimeIndex((years + np.timedelta64(9, 'M')).astype('datetime64[ns]'))
+        elif isinstance(offset, pd.offsets.Tick):
+            labels = local.floor(offset)
+        else:
+            periods = local.to_period(_calendar_period(offset))
+            if offset.n > 1:
+                # Multiples of a period are counted from the one holding 1970-01-01
+                periods = periods - periods.asi8 % offset.n
+            labels = periods.start_time
+        if times.tz is not None:
+            labels = labels.tz_localize(times.tz, ambiguous=ambiguous, nonexistent=nonexistent)
+
+    codes, uniques = pd.factorize(labels, sort=True)
+    if missing.any():
+        all_codes = np.full(len(missing), -1, dtype=codes.dtype)
+        all_codes[~missing] = codes
+        codes = all_codes
+    bins = ResampleBins(codes, pd.DatetimeIndex(uniques))
+
+    if cached is None or cached[0]() is not index:
+        cached = (weakref.ref(index), {})
+        _BIN_CACHE[id(index)] = cached
+    cached[1][key] = bins
+    _BIN_CACHE.move_to_end(id(index))
+    while len(_BIN_CACHE) > _BIN_CACHE_SIZE:
+        _BIN_CACHE.popitem(last=False)
+    return bins
+
+
+@profiling.profiled(rows='input')
+def resample(data, period, statistics=DAILY_STATISTICS, tz=None, ambiguous='raise',
+             nonexistent='raise'):
+    """Calculate statistics of a 2D data array over regular time periods.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param period: Period to aggregate over, see resample_bins
+    :param statistics: Statistics to calculate, as for daily_stats
+    :param tz: Time zone whose local calendar defines the periods, see resample_bins
+    :param ambiguous: Pandas policy for local times repeated when clocks go back
+    :param nonexistent: Pandas policy for local times skipped when clocks go forward
+    :returns: Dictionary of statistic -> 2D Pandas data frame with that statistic
+              of the measurements for each period, indexed by period start.
+    """
+    bins = resample_bins(data.index, period, tz, ambiguous, nonexistent)
+    codes = bins.codes
+    if codes.size and codes.min() < 0:
+        # Leave out rows with no time
+        data, codes = data[codes >= 0], codes[codes >= 0]
+    results = _aggregate(data.groupby(codes), statistics)
+    for result in results.values():
+        result.index = bins.labels[result.index]
+    return results
+
+
+@profiling.profiled(rows='input')
+def data_normalise(data, scale='site', out=None, chunk_columns=64):
     """
     Normalise any given 2D data array
     
     NaN values are replaced with a value of 0
-    
-    :param data: 2D array of inflammation data
-    :type data: ndarray
 
+    The data are processed a block of columns at a time: one pass checks
+    the values and finds the maxima, and a second pass writes the
+    normalised values. Frames are converted to arrays one block at a time,
+    so temporaries are at most the size of one block whatever the column
+    types, and passing out=data normalises an array in place without
+    copying it.
+    
+    :param data: 2D array of measurement data. Columns are measurement sites.
+    :type data: ndarray or DataFrame
+    :param scale: 'site' to divide each column by its own maximum, or
+                  'global' to divide everything by the overall maximum
+    :param out: Floating point ndarray or DataFrame of the same shape to
+                write the result to, which may be data itself
+    :param chunk_columns: Number of columns processed at a time
+    :returns: The normalised array, of the same type as data, or out if given.
+              float32 data gives a float32 result, anything else float64.
     """
-    if not isinstance(data, np.ndarray) or not isinstance(data, pd.DataFrame):
+    if not isinstance(data, (np.ndarray, pd.DataFrame)):
         raise TypeError('data input should be DataFrame or ndarray')
     if len(data.shape) != 2:
         raise ValueError('data array should be 2-dimensional')
-    if np.any(data < 0):
-        raise ValueError('Measurement values should be non-negative')
-    max = np.nanmax(data, axis=0)
-    with np.errstate(invalid='ignore', divide='ignore'):
-        normalised = data / max[np.newaxis, :]
-    normalised[np.isnan(normalised)] = 0
-    return normalised
\ No newline at end of file
+    if scale not in ('site', 'global'):
+        raise ValueError("scale should be 'site' or 'global'")
+
+    if isinstance(data, pd.DataFrame):
+        # A frame is converted to an array a block of columns at a time, as
+        # to_numpy would copy the whole of a frame with several dtypes
+        def columns(block):
+            return data.iloc[:, block].to_numpy()
+        dtype = np.result_type(*data.dtypes.tolist(), np.float16)
+    else:
+        def columns(block):
+            return data[:, block]
+        dtype = np.result_type(data.dtype, np.float16)
+    shape = data.shape
+    blocks = [slice(start, start + chunk_columns)
+              for start in range(0, shape[1], chunk_columns)]
+
+    maxima = np.empty(shape[1], dtype=dtype)
+    for block in blocks:
+        values = columns(block)
+        if np.any(values < 0):
+            raise ValueError('Measurement values should be non-negative')
+        if len(values):
+            maxima[block] = np.fmax.reduce(values, axis=0)
+        else:
+            maxima[block] = np.nan
+    if scale == 'global':
+        maxima[:] = np.fmax.reduce(maxima) if len(maxima) else np.nan
+
+    if out is None:
+        result = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError('out should have the same shape as data')
+    elif isinstance(out, pd.DataFrame):
+        result = None
+    else:
+        result = out
+    scratch = None
+
+    for block in blocks:
+        values = columns(block)
+        if result is not None:
+            target = result[:, block]
+        else:
+            if scratch is None:
+                scratch = np.empty((shape[0], min(chunk_columns, shape[1])), dtype=dtype)
+            target = scratch[:, :values.shape[1]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            np.divide(values, maxima[block], out=target)
+        target[np.isnan(target)] = 0
+        if result is None:
+            out.iloc[:, block] = target
+
+    if out is not None:
+        invalidate_cached(out)
+        return out
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(result, index=data.index, columns=data.columns)
+    return result
+
+
+#Levels of the columns of frames combining several catchments
+HIERARCHY_LEVELS = ['Catchment', 'Site', 'Measurement']
+
+
+def hierarchy_frame(catchments, measurements=None):
+    """Combine the readings of several catchments into one frame.
+
+    :param catchments: List of Catchments
+    :param measurements: Names of the measurements to include, or None for all
+    :returns: A 2D Pandas data frame with a column for each measurement
+              at each site, labelled by a (Catchment, Site, Measurement)
+              MultiIndex
+    """
+    columns = {}
+    for catchment in catchments:
+        for site_name, site in catchment.sites.items():
+            for measurement_id, series in site.measurements.items():
+                if measurements is None or measurement_id in measurements:
+                    columns[catchment.name, site_name, measurement_id] = series.series
+    if not columns:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=pd.MultiIndex.from_tuples(
+            [], names=HIERARCHY_LEVELS))
+    data = pd.concat(columns, axis=1, names=HIERARCHY_LEVELS)
+    return data.sort_index()
+
+
+def _area_sums(site_data, weights=None):
+    """Sum the site statistics of each (Catchment, Measurement) in one
+    matrix product, along with the number (or total weight) of sites
+    with a value on each day."""
+    columns = site_data.columns
+    groups = pd.MultiIndex.from_arrays([columns.get_level_values('Catchment'),
+                                        columns.get_level_values('Measurement')])
+    codes, labels = pd.factorize(groups)
+    indicator = np.zeros((len(columns), len(labels)))
+    if weights is None:
+        indicator[np.arange(len(columns)), codes] = 1
+    else:
+        site_weights = pd.Series(weights).reindex(columns.get_level_values('Site'))
+        indicator[np.arange(len(columns)), codes] = site_weights.fillna(0).to_numpy()
+
+    values = site_data.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    labels = pd.MultiIndex.from_tuples(labels, names=['Catchment', 'Measurement'])
+    sums = pd.DataFrame(np.where(present, values, 0) @ indicator,
+                        index=site_data.index, columns=labels)
+    counts = pd.DataFrame(present @ indicator, index=site_data.index, columns=labels)
+    return sums, counts
+
+
+class Rollup:
+    """Daily statistics of each site, with their means over each catchment
+    and over the whole network, kept up to date as sites are added.
+
+    The site statistics and the per-catchment sums behind the means are
+    cached, so adding or replacing a site only recomputes its own catchment.
+    """
+    def __init__(self, statistic='mean', weights=None):
+        """
+        :param statistic: Daily statistic of each site, as for daily_stats,
+                          e.g. 'sum' for area-mean daily rainfall
+        :param weights: Series or dictionary of site -> weight for the means,
+                        e.g. the area each site represents, or None to
+                        weight sites equally
+        """
+        self.statistic = statistic
+        self.weights = weights
+        self._sites = {}
+        self._sums = {}
+        self._network = None
+
+    def add(self, data):
+        """Add sites, or replace the readings of sites already added.
+
+        :param data: A 2D Pandas data frame with measurement data, with
+                     (Catchment, Site, Measurement) columns as returned by
+                     hierarchy_frame
+        :returns: The Rollup itself
+        """
+        # A stage rather than profiled, whose rows='input' would count self
+        with profiling.stage('rollup', rows=len(data)):
+            daily = daily_stats(data, list(dict.fromkeys([self.statistic, 'count'])))
+            # A day without readings has no statistic, rather than a sum of
+            # 0, so the site is left out of that day's means
+            site_data = daily[self.statistic].where(daily['count'] > 0)
+            catchments = site_data.columns.get_level_values('Catchment')
+            for name in catchments.unique():
+                new = site_data.loc[:, catchments == name]
+                old = self._sites.get(name)
+                if old is not None:
+                    kept = old.loc[:, ~old.columns.isin(new.columns)]
+                    new = pd.concat([kept, new], axis=1, sort=True)
+                self._sites[name] = new
+                self._sums[name] = _area_sums(new, self.weights)
+            self._network = None
+        return self
+
+    def add_catchment(self, catchment, measurements=None):
+        """Add the sites of a Catchment, as for add."""
+        return self.add(hierarchy_frame([catchment], measurements))
+
+    def site(self):
+        """Daily statistic of every site, with (Catchment, Site, Measurement) columns."""
+        if not self._sites:
+            return pd.DataFrame(index=pd.Index([]), columns=pd.MultiIndex.from_tuples(
+                [], names=HIERARCHY_LEVELS))
+        return pd.concat(self._sites.values(), axis=1, sort=True)
+
+    def catchment(self):
+        """Mean daily statistic of the sites of each catchment, with
+        (Catchment, Measurement) columns."""
+        if not self._sums:
+            return pd.DataFrame(index=pd.Index([]), columns=pd.MultiIndex.from_tuples(
+                [], names=['Catchment', 'Measurement']))
+        sums = pd.concat([sums for sums, counts in self._sums.values()], axis=1, sort=True)
+        counts = pd.concat([counts for sums, counts in self._sums.values()], axis=1, sort=True)
+        return sums / counts.where(counts > 0)
+
+    def network(self):
+        """Mean daily statistic of all of the sites, with a column for each measurement."""
+        if self._network is None:
+            sums = counts = None
+            for catchment_sums, catchment_counts in self._sums.values():
+                catchment_sums = catchment_sums.T.groupby(level='Measurement').sum().T
+                catchment_counts = catchment_counts.T.groupby(level='Measurement').sum().T
+                if sums is None:
+                    sums, counts = catchment_sums, catchment_counts
+                else:
+                    sums = sums.add(catchment_sums, fill_value=0)
+                    counts = counts.add(catchment_counts, fill_value=0)
+            if sums is None:
+                self._network = pd.DataFrame(index=pd.Index([]),
+                                             columns=pd.Index([], name='Measurement'))
+            else:
+                self._network = sums / counts.where(counts > 0)
+        return self._network
+
+    def results(self):
+        """Dictionary of 'site', 'catchment' and 'network' -> roll-up frame."""
+        return {'site': self.site(), 'catchment': self.catchment(), 'network': self.network()}
+
+
+def rollup(data, statistic='mean', weights=None):
+    """Calculate a daily statistic of every site and its mean over each
+    catchment and over the whole network.
+
+    The rows are grouped by day once for every site together, and the
+    catchment and network means are sums over the site columns.
+
+    :param data: A 2D Pandas data frame with measurement data, with
+                 (Catchment, Site, Measurement) columns as returned by
+                 hierarchy_frame
+    :param statistic: Daily statistic of each site, as for daily_stats
+    :param weights: Site weights for the means, as for Rollup
+    :returns: Dictionary of 'site', 'catchment' and 'network' -> 2D Pandas
+              data frame of daily values
+    """
+    return Rollup(statistic, weights).add(data).results()
@@ -0,0 +1,207 @@
+"""Module for timing the stages of a run.
+
+Code marks the work it does as named stages, either with the stage context
+manager or by decorating a function with profiled. While a Profiler is
+running, each stage records its wall time, CPU time, number of rows
+processed and peak memory allocated. Stages started inside another stage
+are recorded as its children, so the report shows, for example, how much
+of loading a file went on parsing the CSV, converting dates and pivoting.
+
+When no Profiler is running a stage costs a single global lookup.
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+
+
+_active = None
+
+# tracemalloc.reset_peak, needed for the peak of each stage, is new in Python 3.9
+PER_STAGE_PEAKS = hasattr(tracemalloc, 'reset_peak')
+
+
+class Stage:
+    """Measurements of one run of a stage; rows may be set while it runs."""
+    __slots__ = ('path', 'rows', 'wall', 'cpu', 'peak_bytes')
+
+    def __init__(self, path, rows=None):
+        self.path = path
+        self.rows = rows
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_bytes = None
+
+
+class Profiler:
+    """Collects the stages run between start and stop."""
+    def __init__(self, memory=True, cprofile_filename=None):
+        """
+        :param memory: Record the peak memory of each stage with tracemalloc,
+                       which slows down the code being profiled. Ignored
+                       before Python 3.9, where peaks are not recorded
+        :param cprofile_filename: If set, also run cProfile and write its
+                                  statistics to this file for pstats
+        """
+        self.memory = memory and PER_STAGE_PEAKS
+        self.cprofile_filename = cprofile_filename
+        self.stages = []
+        self._stack = []
+        self._peaks = []
+        self._first = {}
+        self._cprofile = None
+
+    def start(self):
+        """Make this the running profiler."""
+        global _active
+        if _active is not None:
+            raise RuntimeError('A profiler is already running')
+        if self.memory:
+            tracemalloc.start()
+        if self.cprofile_filename:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        _active = self
+        return self
+
+    def stop(self):
+        """Stop profiling, writing the cProfile statistics if asked for."""
+        global _active
+        _active = None
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_filename)
+            self._cprofile = None
+        if self.memory:
+            tracemalloc.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Record a stage; the Stage is yielded so rows can be set inside it."""
+        record = Stage('/'.join(self._stack + [name]), rows)
+        self._first.setdefault(record.path, len(self._first))
+        self._stack.append(name)
+        if self.memory:
+            # Peaks are tracked as absolute traced sizes: the parent's peak so
+            # far is saved before resetting the tracemalloc peak for this stage
+            current, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(current)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - wall
+            record.cpu = time.process_time() - cpu
+            self._stack.pop()
+            if self.memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record.peak_bytes = peak - current
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                tracemalloc.reset_peak()
+            self.stages.append(record)
+
+    def report(self):
+        """Summarise the stages, combining repeated runs of the same stage.
+
+        :returns: List of dictionaries with the path, number of calls, total
+                  wall and CPU seconds, total rows and largest peak memory of
+                  each stage, in the order the stages were first started
+        """
+        summary = {}
+        for record in self.stages:
+            entry = summary.setdefault(record.path, {'stage': record.path, 'calls': 0,
+                                                     'wall': 0.0, 'cpu': 0.0,
+                                                     'rows': None, 'peak_bytes': None})
+            entry['calls'] += 1
+            entry['wall'] += record.wall
+            entry['cpu'] += record.cpu
+            if record.rows is not None:
+                entry['rows'] = (entry['rows'] or 0) + record.rows
+            if record.peak_bytes is not None:
+                entry['peak_bytes'] = max(entry['peak_bytes'] or 0, record.peak_bytes)
+        # Stages finish after their children, so put each stage back before
+        # them, with siblings in the order they were first started
+        def tree_order(entry):
+            parts = entry['stage'].split('/')
+            return [self._first['/'.join(parts[:depth])] for depth in range(1, len(parts) + 1)]
+        return sorted(summary.values(), key=tree_order)
+
+    def write_json(self, filename):
+        """Write the report to a JSON file."""
+        with open(filename, 'w') as report_file:
+            json.dump({'stages': self.report()}, report_file, indent=2)
+
+    def table(self):
+        """The report as a text table, with child stages indented."""
+        lines = [f"{'stage':<40} {'calls':>6} {'wall (s)':>9} {'cpu (s)':>9} "
+                 f"{'rows':>10} {'peak (MB)':>10}"]
+        for entry in self.report():
+            depth = entry['stage'].count('/')
+            name = '  ' * depth + entry['stage'].rsplit('/', 1)[-1]
+            rows = '' if entry['rows'] is None else entry['rows']
+            peak = '' if entry['peak_bytes'] is None else f"{entry['peak_bytes'] / 1024 ** 2:.2f}"
+            lines.append(f"{name:<40} {entry['calls']:>6} {entry['wall']:>9.3f} "
+                         f"{entry['cpu']:>9.3f} {rows:>10} {peak:>10}")
+        return '\n'.join(lines)
+
+
+_NOT_PROFILING = contextlib.nullcontext(Stage(None))
+
+
+def stage(name, rows=None):
+    """Context manager recording a stage in the running profiler, if any.
+
+    :param name: Name of the stage
+    :param rows: Number of rows processed, if known up front; otherwise it
+                 can be set on the yielded Stage
+    """
+    if _active is None:
+        return _NOT_PROFILING
+    return _active.stage(name, rows)
+
+
+def count_rows(result):
+    """Number of rows in a function's result: the length of a frame or
+    array, or of the first frame in a dictionary of them."""
+    if isinstance(result, dict):
+        result = next(iter(result.values()), ())
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def profiled(name=None, rows='result'):
+    """Decorator recording each call of a function as a stage.
+
+    :param name: Name of the stage, by default the function's name
+    :param rows: 'result' to count the rows of the result as processed,
+                 'input' to count the rows of the first argument, or None
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    record.rows = count_rows(args[0] if rows == 'input' else result)
+            return result
+        return wrapper
+    return decorator
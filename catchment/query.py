@@ -0,0 +1,298 @@
+"""Module for reading selected sites and dates from a measurement file.
+
+A RowIndex records, for each run of consecutive rows from the same site,
+the byte range those rows occupy in the CSV file, plus the date and byte
+offset of every STRIDE-th row within the run. It is built by one pass over
+the file and saved, keyed by the file's path, size and modification time,
+so later reads of a few sites or a short period seek straight to the
+bytes they need and parse only those rows.
+
+Queries are built up lazily and run by collect, e.g.::
+
+    scan_csv('data/river_data_2015-12.csv').select('pH continuous') \\
+        .where(sites=['FP15'], start='2005-12-10').collect()
+"""
+
+import hashlib
+import io
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from catchment import cache, models, profiling
+
+
+DEFAULT_INDEX_DIR = os.path.join(cache.DEFAULT_CACHE_DIR, 'index')
+
+# Rows between the sampled dates and offsets kept for each run of a site
+STRIDE = 256
+
+
+class RowIndex:
+    """Byte offsets of the rows of each site in a CSV measurement file."""
+    def __init__(self, filename, stride=STRIDE):
+        """Index a file by reading its Site and Date columns once.
+
+        :param filename: Filename of CSV to index
+        :param stride: Keep the date and offset of every stride-th row of a run
+        """
+        self.filename = os.path.abspath(filename)
+        self.file_id = _file_id(filename)
+
+        with open(filename, 'rb') as source:
+            content = source.read()
+        self.header = content[:content.index(b'\n') + 1]
+        self.columns = pd.read_csv(io.BytesIO(self.header)).columns.tolist()
+
+        # Byte range of every non-blank line after the header
+        data = np.frombuffer(content, dtype=np.uint8)
+        newlines = np.flatnonzero(data == ord('\n'))
+        starts = newlines + 1
+        ends = np.append(newlines[1:], len(content))
+        lengths = ends - starts
+        first_bytes = data[np.minimum(starts, len(data) - 1)]
+        blank = (lengths == 0) | ((lengths == 1) & (first_bytes == ord('\r')))
+        starts, ends = starts[~blank], ends[~blank]
+
+        dataset = pd.read_csv(io.BytesIO(content), usecols=['Site', 'Date'])
+        if len(dataset) != len(starts):
+            raise ValueError(f'Cannot index {filename}: rows span several lines')
+        self.date_format = models.detect_date_format(dataset['Date'])
+        dates = models.parse_dates(dataset['Date'], self.date_format).to_numpy('datetime64[ns]')
+        sites = dataset['Site'].to_numpy()
+
+        # Runs of consecutive rows from the same site
+        changes = np.flatnonzero(sites[1:] != sites[:-1]) + 1
+        run_starts = np.concatenate([[0], changes])
+        run_ends = np.concatenate([changes, [len(sites)]])
+        self.run_sites = sites[run_starts]
+        self.run_offsets = np.stack([starts[run_starts], ends[run_ends - 1] + 1], axis=1)
+        self.run_dates = np.stack([dates[run_starts], dates[run_ends - 1]], axis=1)
+        self.run_sorted = np.array([np.all(dates[start + 1:end] >= dates[start:end - 1])
+                                    for start, end in zip(run_starts, run_ends)], dtype=bool)
+        self.run_rows = run_ends - run_starts
+
+        # Sampled rows within each run, for seeking to a date
+        self.stride = stride
+        sampled = np.concatenate([np.arange(start, end, stride)
+                                  for start, end in zip(run_starts, run_ends)])
+        self.sample_runs = np.repeat(np.arange(len(run_starts)),
+                                     -(-(run_ends - run_starts) // stride))
+        self.sample_offsets = starts[sampled]
+        self.sample_dates = dates[sampled]
+
+    @property
+    def sites(self):
+        """Sites in the file, in order of first appearance."""
+        return list(dict.fromkeys(self.run_sites))
+
+    def is_current(self):
+        """Whether the file is unchanged since it was indexed."""
+        try:
+            return _file_id(self.filename) == self.file_id
+        except OSError:
+            return False
+
+    def ranges(self, sites=None, start=None, end=None):
+        """Byte ranges of the file holding the rows of some sites and dates.
+
+        Ranges may include a few rows just outside the dates, but never
+        miss a matching row.
+
+        :param sites: List of site codes, or None for every site
+        :param start: Earliest date wanted, or None
+        :param end: Latest date wanted, or None
+        :returns: List of (start offset, end offset) pairs in file order
+        """
+        start = None if start is None else np.datetime64(pd.Timestamp(start), 'ns')
+        end = None if end is None else np.datetime64(pd.Timestamp(end), 'ns')
+
+        runs = np.ones(len(self.run_sites), dtype=bool)
+        if sites is not None:
+            runs &= np.isin(self.run_sites, list(sites))
+        if start is not None:
+            runs &= ~self.run_sorted | (self.run_dates[:, 1] >= start)
+        if end is not None:
+            runs &= ~self.run_sorted | (self.run_dates[:, 0] <= end)
+
+        ranges = []
+        for run in np.flatnonzero(runs):
+            first, last = self.run_offsets[run]
+            if self.run_sorted[run] and (start is not None or end is not None):
+                samples = slice(*np.searchsorted(self.sample_runs, [run, run + 1]))
+                dates = self.sample_dates[samples]
+                offsets = self.sample_offsets[samples]
+                if start is not None:
+                    # Seek to the last sample before the start
+                    position = np.searchsorted(dates, start, side='left') - 1
+                    if position > 0:
+                        first = offsets[position]
+                if end is not None:
+                    # Stop at the first sample after the end
+                    position = np.searchsorted(dates, end, side='right')
+                    if position < len(offsets):
+                        last = offsets[position]
+            if ranges and ranges[-1][1] == first:
+                ranges[-1] = (ranges[-1][0], last)
+            else:
+                ranges.append((first, last))
+        return ranges
+
+    def save(self, filename):
+        """Save the index so later runs can reuse it."""
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'wb') as index_file:
+            pickle.dump(self, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+
+    @staticmethod
+    def load(filename):
+        """Load an index saved with save."""
+        with open(filename, 'rb') as index_file:
+            return pickle.load(index_file)
+
+
+def _file_id(filename):
+    """Size and modification time of a file, which change when it is edited."""
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def index_filename(index_dir, filename):
+    """Name of the file holding the saved RowIndex of a CSV file."""
+    key = os.path.abspath(filename)
+    return os.path.join(index_dir, hashlib.sha1(key.encode()).hexdigest() + '.pickle')
+
+
+@profiling.profiled(rows=None)
+def get_index(filename, index_dir=DEFAULT_INDEX_DIR):
+    """Load the saved RowIndex of a file, building and saving it if there
+    is none or the file has changed since.
+
+    :param filename: Filename of CSV to index
+    :param index_dir: Directory holding saved indexes, or None to not save them
+    :returns: The RowIndex
+    """
+    if index_dir is None:
+        return RowIndex(filename)
+    saved = index_filename(index_dir, filename)
+    try:
+        index = RowIndex.load(saved)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        index = None
+    if index is None or not index.is_current():
+        index = RowIndex(filename)
+        os.makedirs(index_dir, exist_ok=True)
+        index.save(saved)
+    return index
+
+
+class Query:
+    """A lazy selection of measurements, sites and dates from a CSV file.
+
+    select and where return new queries; nothing is read until collect.
+    """
+    def __init__(self, filename, measurements=None, sites=None, start=None, end=None,
+                 index_dir=DEFAULT_INDEX_DIR):
+        self.filename = filename
+        self.measurements = measurements
+        self.sites = sites
+        self.start = start
+        self.end = end
+        self.index_dir = index_dir
+
+    def _replace(self, **changes):
+        query = Query(self.filename, self.measurements, self.sites, self.start, self.end,
+                      self.index_dir)
+        query.__dict__.update(changes)
+        return query
+
+    def select(self, *measurements):
+        """Only read the named measurement columns."""
+        return self._replace(measurements=list(measurements))
+
+    def where(self, sites=None, start=None, end=None):
+        """Only read some sites and/or readings between start and end, inclusive.
+
+        :param sites: Site code or list of site codes
+        :param start: Earliest date, e.g. '2005-12-10'
+        :param end: Latest date
+        """
+        if isinstance(sites, str):
+            sites = [sites]
+        changes = {}
+        if sites is not None:
+            changes['sites'] = sites if self.sites is None else [
+                site for site in self.sites if site in sites]
+        if start is not None:
+            changes['start'] = start if self.start is None else max(
+                pd.Timestamp(start), pd.Timestamp(self.start))
+        if end is not None:
+            changes['end'] = end if self.end is None else min(
+                pd.Timestamp(end), pd.Timestamp(self.end))
+        return self._replace(**changes)
+
+    @profiling.profiled('query', rows='result')
+    def collect(self, combine=False):
+        """Read the selected rows.
+
+        :param combine: If True return one frame with (Measurement, Site) columns
+        :returns: Dictionary of measurement name -> 2D array of that variable,
+                  as models.read_variables_from_csv, holding only the
+                  selected sites (in file order) and dates; the arrays
+                  are empty if no rows are selected
+        """
+        index = get_index(self.filename, self.index_dir)
+        measurements = self.measurements
+        if measurements is None:
+            measurements = [column for column in index.columns
+                            if column not in ('Site', 'Site Name', 'Date')]
+
+        with profiling.stage('read_ranges') as stage:
+            with open(self.filename, 'rb') as source:
+                parts = [index.header]
+                for first, last in index.ranges(self.sites, self.start, self.end):
+                    source.seek(first)
+                    parts.append(source.read(last - first))
+            stage.rows = sum(len(part) for part in parts)
+
+        dataset = pd.read_csv(io.BytesIO(b''.join(parts)),
+                              usecols=['Date', 'Site'] + measurements)
+        dataset['Date'] = models.parse_dates(dataset['Date'], index.date_format)
+        keep = np.ones(len(dataset), dtype=bool)
+        if self.sites is not None:
+            keep &= dataset['Site'].isin(self.sites).to_numpy()
+        if self.start is not None:
+            keep &= (dataset['Date'] >= pd.Timestamp(self.start)).to_numpy()
+        if self.end is not None:
+            keep &= (dataset['Date'] <= pd.Timestamp(self.end)).to_numpy()
+        if not keep.all():
+            dataset = dataset[keep]
+
+        if dataset.empty:
+            # e.g. the sites selected are not in the file
+            if combine:
+                return pd.DataFrame(index=pd.DatetimeIndex([]), columns=pd.MultiIndex.from_tuples(
+                    [], names=['Measurement', 'Site']))
+            return {measurement: pd.DataFrame(index=pd.DatetimeIndex([]))
+                    for measurement in measurements}
+
+        newdataset = models._pivot_sites(dataset, measurements)
+        if combine:
+            return newdataset
+        return {measurement: newdataset[measurement].rename_axis(columns=None)
+                for measurement in measurements}
+
+
+def scan_csv(filename, index_dir=DEFAULT_INDEX_DIR):
+    """Start a lazy query of a CSV file in the layout read by
+    models.read_variables_from_csv.
+
+    :param filename: Filename of CSV to query
+    :param index_dir: Directory holding saved row indexes, or None to
+                      index the file afresh for each query
+    :returns: A Query selecting every measurement, site and date
+    """
+    return Query(filename, index_dir=index_dir)
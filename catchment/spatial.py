@@ -0,0 +1,400 @@
+"""Module for locating measurement sites within catchments and near each other.
+
+Catchment boundaries are read from ESRI shapefiles (the .shp geometry and
+.dbf attribute files) with a small reader for the polygon records used by
+the DEFRA catchment files, so no GIS library is needed. The boundaries are
+in WGS84 longitude/latitude, so sites are placed in catchments by their
+Longitude and Latitude; distances between sites use their Easting and
+Northing on the British National Grid, in metres.
+
+Both lookups use a spatial index so that they stay fast for many sites:
+
+- Polygon splits its edges into horizontal bands, so a point-in-polygon
+  test only looks at the edges in the point's band, after a bounding box
+  check.
+- SiteIndex sorts the sites into a regular grid of square cells, so
+  nearest-site and within-radius queries only measure the distance to
+  sites in the cells around each query point.
+"""
+
+import glob
+import math
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from catchment import models
+
+
+SHAPE_TYPES = {5: 'Polygon', 15: 'PolygonZ', 25: 'PolygonM'}
+
+# Largest number of grid cells or sites searched at once by SiteIndex.nearest
+MAX_CANDIDATES = 2 ** 20
+
+
+class Polygon:
+    """A polygon made up of one or more rings, e.g. one shapefile record.
+
+    Rings may be outer boundaries or holes; points are inside the polygon
+    if they are inside an odd number of its rings.
+    """
+    def __init__(self, rings, attributes=None):
+        """
+        :param rings: List of (N, 2) arrays of x, y vertices. Each ring is
+                      closed, i.e. its last vertex repeats its first.
+        :param attributes: Dictionary of the record's attribute values
+        """
+        self.rings = [np.asarray(ring, dtype=float) for ring in rings]
+        self.attributes = attributes or {}
+
+        vertices = np.concatenate(self.rings)
+        self.bbox = (*vertices.min(axis=0), *vertices.max(axis=0))
+
+        starts = np.concatenate([ring[:-1] for ring in self.rings])
+        ends = np.concatenate([ring[1:] for ring in self.rings])
+        # Horizontal edges are never crossed by a horizontal ray
+        sloped = starts[:, 1] != ends[:, 1]
+        self._x0, self._y0 = starts[sloped].T
+        self._x1, self._y1 = ends[sloped].T
+
+        # Index each edge under every horizontal band its y range overlaps
+        self._num_bands = max(1, int(math.sqrt(len(self._x0))))
+        ymin, ymax = self.bbox[1], self.bbox[3]
+        self._band_height = (ymax - ymin) / self._num_bands or 1.0
+        low = self._band(np.minimum(self._y0, self._y1))
+        high = self._band(np.maximum(self._y0, self._y1))
+        spans = high - low + 1
+        edges = np.repeat(np.arange(len(low)), spans)
+        bands = np.repeat(low, spans) + (np.arange(len(edges)) -
+                                         np.repeat(np.cumsum(spans) - spans, spans))
+        order = np.argsort(bands, kind='stable')
+        self._band_edges = edges[order]
+        self._band_starts = np.searchsorted(bands[order], np.arange(self._num_bands + 1))
+
+    def _band(self, y):
+        """Index of the horizontal band containing each y value."""
+        band = ((y - self.bbox[1]) // self._band_height).astype(int)
+        return np.clip(band, 0, self._num_bands - 1)
+
+    def contains(self, x, y):
+        """Test whether points are inside the polygon.
+
+        :param x: Array of x coordinates (longitudes)
+        :param y: Array of y coordinates (latitudes)
+        :returns: Boolean array, True for points inside the polygon
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        xmin, ymin, xmax, ymax = self.bbox
+        inside = np.zeros(x.shape, dtype=bool)
+        candidates = np.flatnonzero((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))
+        if not len(candidates):
+            return inside
+
+        bands = self._band(y.ravel()[candidates])
+        for band in np.unique(bands):
+            points = candidates[bands == band]
+            edges = self._band_edges[self._band_starts[band]:self._band_starts[band + 1]]
+            px = x.ravel()[points][:, np.newaxis]
+            py = y.ravel()[points][:, np.newaxis]
+            x0, y0, x1, y1 = self._x0[edges], self._y0[edges], self._x1[edges], self._y1[edges]
+            # Count the edges crossed by a ray from each point towards +x
+            crosses = (y0 > py) != (y1 > py)
+            crosses &= px < x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+            inside.ravel()[points] = crosses.sum(axis=1) % 2 == 1
+        return inside
+
+
+class Boundary:
+    """The area covered by a set of polygons, e.g. all records of a shapefile."""
+    def __init__(self, polygons):
+        """
+        :param polygons: List of Polygon
+        """
+        self.polygons = list(polygons)
+        boxes = np.array([polygon.bbox for polygon in self.polygons])
+        self.bbox = (*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0))
+
+    def contains(self, x, y):
+        """Test whether points are inside any of the polygons, as Polygon.contains."""
+        inside = np.zeros(np.shape(x), dtype=bool)
+        for polygon in self.polygons:
+            inside |= polygon.contains(x, y)
+        return inside
+
+
+def read_shapefile(filename):
+    """Read the polygons and their attributes from a shapefile.
+
+    :param filename: Path of the .shp file; the .dbf file with the same
+                     name is read for the attributes if it exists
+    :returns: List of Polygon, one per record
+    """
+    with open(filename, 'rb') as shp_file:
+        content = shp_file.read()
+    file_code, = struct.unpack('>i', content[:4])
+    if file_code != 9994:
+        raise ValueError(f'{filename} is not a shapefile')
+
+    records = []
+    position = 100
+    while position < len(content):
+        _, length = struct.unpack('>ii', content[position:position + 8])
+        record = content[position + 8:position + 8 + 2 * length]
+        position += 8 + 2 * length
+
+        shape_type, = struct.unpack('<i', record[:4])
+        if shape_type == 0:
+            records.append(None)
+            continue
+        if shape_type not in SHAPE_TYPES:
+            raise ValueError(f'Shape type {shape_type} in {filename} is not a polygon')
+        num_parts, num_points = struct.unpack('<ii', record[36:44])
+        parts = np.frombuffer(record, '<i4', num_parts, 44)
+        points = np.frombuffer(record, '<f8', 2 * num_points, 44 + 4 * num_parts)
+        points = points.reshape(num_points, 2)
+        records.append(np.split(points, parts[1:]))
+
+    dbf_filename = os.path.splitext(filename)[0] + '.dbf'
+    if os.path.exists(dbf_filename):
+        attributes = read_dbf(dbf_filename)
+    else:
+        attributes = [{} for _ in records]
+    return [Polygon(rings, record_attributes)
+            for rings, record_attributes in zip(records, attributes) if rings is not None]
+
+
+def read_dbf(filename):
+    """Read the records of a dBASE table, as found alongside a shapefile.
+
+    :param filename: Path of the .dbf file
+    :returns: List of dictionaries of field name -> value. Numeric fields
+              are converted to float; other fields are left as text.
+    """
+    with open(filename, 'rb') as dbf_file:
+        content = dbf_file.read()
+    num_records, header_length, record_length = struct.unpack('<IHH', content[4:12])
+
+    fields = []
+    position = 32
+    while content[position] != 0x0D:
+        descriptor = content[position:position + 32]
+        name = descriptor[:11].split(b'\0')[0].decode('ascii')
+        fields.append((name, chr(descriptor[11]), descriptor[16]))
+        position += 32
+
+    encoding = 'utf-8'
+    cpg_filename = os.path.splitext(filename)[0] + '.cpg'
+    if os.path.exists(cpg_filename):
+        with open(cpg_filename) as cpg_file:
+            encoding = cpg_file.read().strip() or encoding
+
+    records = []
+    for number in range(num_records):
+        start = header_length + number * record_length
+        record = content[start:start + record_length]
+        if record[:1] == b'*':
+            continue  # Deleted record
+        values = {}
+        offset = 1
+        for name, field_type, length in fields:
+            value = record[offset:offset + length].decode(encoding, 'replace').strip()
+            offset += length
+            if field_type in 'NF':
+                value = float(value) if value else None
+            values[name] = value
+        records.append(values)
+    return records
+
+
+def _all_sites(sites):
+    """List the Site objects in a list of sites or a dictionary of Catchments."""
+    if isinstance(sites, dict):
+        return [site for catchment in sites.values() for site in catchment.sites.values()]
+    return list(sites)
+
+
+def read_catchments_from_shapefiles(filenames, sites=()):
+    """Create a Catchment for each shapefile of catchment boundaries, and
+    add the sites which lie within it.
+
+    :param filenames: List of .shp files, or a glob pattern such as
+                      'data/river_catchments/*.shp'
+    :param sites: Sites to place in the catchments, as a list of Site or a
+                  dictionary of Catchments from models.read_sites_from_csv.
+                  Sites are located by their longitude and latitude.
+    :returns: Dictionary of catchment name -> Catchment, named after the
+              shapefile, e.g. 'frome_piddle' for frome_piddle_catchment.shp
+    """
+    if isinstance(filenames, str):
+        filenames = sorted(glob.glob(filenames))
+    sites = [site for site in _all_sites(sites)
+             if site.longitude is not None and site.latitude is not None]
+    longitudes = np.array([site.longitude for site in sites], dtype=float)
+    latitudes = np.array([site.latitude for site in sites], dtype=float)
+
+    catchments = {}
+    for filename in filenames:
+        name = os.path.splitext(os.path.basename(filename))[0]
+        if name.endswith('_catchment'):
+            name = name[:-len('_catchment')]
+        boundary = Boundary(read_shapefile(filename))
+        catchment = catchments[name] = models.Catchment(name, boundary)
+        for index in np.flatnonzero(boundary.contains(longitudes, latitudes)):
+            catchment.add_site(sites[index])
+    return catchments
+
+
+class SiteIndex:
+    """A grid index of site locations for nearest-site and radius queries.
+
+    The grid suits sites spread across an area, like a gauge network. If
+    the sites are packed into a few small clusters far apart, pass a
+    cell_size close to the spacing of sites within a cluster.
+    """
+    def __init__(self, sites, cell_size=None):
+        """
+        :param sites: Sites to index, as a list of Site or a dictionary of
+                      Catchments from models.read_sites_from_csv. Sites
+                      without an easting and northing are left out.
+        :param cell_size: Width of the square grid cells in metres. By
+                          default cells hold about two sites on average.
+        """
+        sites = [site for site in _all_sites(sites)
+                 if site.easting is not None and site.northing is not None]
+        self._build([site.name for site in sites],
+                    np.array([site.easting for site in sites], dtype=float),
+                    np.array([site.northing for site in sites], dtype=float), cell_size)
+
+    @classmethod
+    def from_arrays(cls, names, eastings, northings, cell_size=None):
+        """Create an index from arrays of site names and coordinates."""
+        index = cls.__new__(cls)
+        index._build(list(names), np.asarray(eastings, dtype=float),
+                     np.asarray(northings, dtype=float), cell_size)
+        return index
+
+    def _build(self, names, eastings, northings, cell_size):
+        """Sort the sites into grid cells."""
+        if not len(names):
+            raise ValueError('SiteIndex needs at least one site with a location')
+        self.names = np.array(names, dtype=object)
+        self.eastings = eastings
+        self.northings = northings
+
+        self._origin = (eastings.min(), northings.min())
+        width = eastings.max() - self._origin[0]
+        height = northings.max() - self._origin[1]
+        if cell_size is None:
+            cell_size = math.sqrt(2 * max(width, 1.0) * max(height, 1.0) / len(names))
+        self.cell_size = cell_size
+        self._shape = (int(width // cell_size) + 1, int(height // cell_size) + 1)
+
+        cells = self._cell_id(*self._cell(eastings, northings))
+        self._order = np.argsort(cells, kind='stable')
+        self._starts = np.searchsorted(cells[self._order],
+                                       np.arange(self._shape[0] * self._shape[1] + 1))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _cell(self, eastings, northings):
+        """Grid column and row of each point; may be outside the grid."""
+        return ((np.asarray(eastings) - self._origin[0]) // self.cell_size).astype(int), \
+               ((np.asarray(northings) - self._origin[1]) // self.cell_size).astype(int)
+
+    def _cell_id(self, column, row):
+        return column * self._shape[1] + row
+
+    def _candidates(self, column, row, reach):
+        """Sites in the block of cells within reach cells of each query cell.
+
+        :returns: Tuple of arrays (query number, site number), one entry per
+                  candidate site of each query
+        """
+        offsets = np.arange(-reach, reach + 1)
+        columns = (column[:, np.newaxis] + np.repeat(offsets, len(offsets))).ravel()
+        rows = (row[:, np.newaxis] + np.tile(offsets, len(offsets))).ravel()
+        valid = (columns >= 0) & (columns < self._shape[0]) & (rows >= 0) & (rows < self._shape[1])
+        cells = np.where(valid, self._cell_id(columns, rows), 0)
+        starts = self._starts[cells]
+        counts = np.where(valid, self._starts[cells + 1] - starts, 0)
+
+        total = counts.sum()
+        queries = np.repeat(np.arange(len(column)), (2 * reach + 1) ** 2)
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        return np.repeat(queries, counts), self._order[positions]
+
+    def nearest(self, eastings, northings):
+        """Find the nearest site to each of a set of points.
+
+        :param eastings: Array of eastings of the query points
+        :param northings: Array of northings of the query points
+        :returns: Tuple of arrays (site names, distances in metres)
+        """
+        eastings = np.atleast_1d(np.asarray(eastings, dtype=float))
+        northings = np.atleast_1d(np.asarray(northings, dtype=float))
+        best = np.full(len(eastings), -1)
+        distances = np.full(len(eastings), np.inf)
+        # Points outside the grid are searched from the closest point on its
+        # edge; every site is at least as far from the point as from there
+        edge_eastings = np.clip(eastings, self._origin[0], self.eastings.max())
+        edge_northings = np.clip(northings, self._origin[1], self.northings.max())
+        outside = np.hypot(eastings - edge_eastings, northings - edge_northings)
+        column, row = self._cell(edge_eastings, edge_northings)
+
+        remaining = np.arange(len(eastings))
+        reach = 1
+        while len(remaining):
+            # Once the block has more cells than there are sites, measure to all of them
+            everything = (2 * reach + 1) ** 2 >= len(self)
+            batch_size = max(1, MAX_CANDIDATES // min((2 * reach + 1) ** 2, len(self)))
+            found = np.zeros(len(remaining), dtype=bool)
+            for start in range(0, len(remaining), batch_size):
+                batch = remaining[start:start + batch_size]
+                if everything:
+                    queries = np.repeat(np.arange(len(batch)), len(self))
+                    candidates = np.tile(np.arange(len(self)), len(batch))
+                else:
+                    queries, candidates = self._candidates(column[batch], row[batch], reach)
+
+                distance = np.hypot(self.eastings[candidates] - eastings[batch][queries],
+                                    self.northings[candidates] - northings[batch][queries])
+                order = np.lexsort((distance, queries))
+                queries, first = np.unique(queries[order], return_index=True)
+                closest = batch[queries]
+                best[closest] = candidates[order][first]
+                distances[closest] = distance[order][first]
+
+                # Sites outside the block are at least reach cells from its centre cell
+                found[start + queries] = everything or (
+                    distances[closest] <= np.hypot(outside[closest], reach * self.cell_size))
+            remaining = remaining[~found]
+            reach *= 2
+
+        return self.names[best], distances
+
+    def within_radius(self, easting, northing, radius):
+        """Find the sites within a distance of a point.
+
+        :param easting: Easting of the point
+        :param northing: Northing of the point
+        :param radius: Distance in metres
+        :returns: Pandas Series of distance in metres indexed by site name,
+                  nearest first
+        """
+        reach = int(math.ceil(radius / self.cell_size))
+        if (2 * reach + 1) ** 2 > len(self):
+            candidates = np.arange(len(self))
+        else:
+            column, row = self._cell([easting], [northing])
+            _, candidates = self._candidates(column, row, reach)
+
+        distance = np.hypot(self.eastings[candidates] - easting,
+                            self.northings[candidates] - northing)
+        close = distance <= radius
+        order = np.argsort(distance[close], kind='stable')
+        return pd.Series(distance[close][order], index=self.names[candidates[close]][order],
+                         name='Distance')
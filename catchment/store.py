@@ -0,0 +1,239 @@
+"""Module containing an append-only on-disk store of measurement history.
+
+Each measurement of each site is kept in its own directory of fixed-width
+binary files, so new readings are appended without rewriting what is
+already stored:
+
+- times.bin: int64 nanoseconds since the epoch (UTC), in increasing order
+- values.bin: float64 readings, one for each time
+- index.bin: the time of every STRIDE-th reading, a sparse index small
+  enough to keep in memory
+- meta.json: the name, units and time zone of the measurement
+
+Series are opened as MeasurementSeries over read-only numpy.memmap arrays,
+so a range query only reads the pages holding the readings it needs, and
+any number of reader processes share the same pages of the OS cache.
+"""
+
+import json
+import os
+import urllib.parse
+
+import numpy as np
+
+from catchment import models
+
+
+TIME_DTYPE = np.dtype('<i8')
+VALUE_DTYPE = np.dtype('<f8')
+
+# Readings between the entries of the sparse time index
+STRIDE = 1024
+
+
+class SeriesFile:
+    """The stored history of one measurement at one site."""
+    def __init__(self, path, name=None, units=None, tz=None, stride=STRIDE):
+        """Open a stored series, creating it if it does not exist.
+
+        :param path: Directory holding the series
+        :param name: Name of the measurement, for a new series
+        :param units: Units of the readings, for a new series
+        :param tz: Time zone of the readings, for a new series
+        :param stride: Readings between sparse index entries, for a new series
+        """
+        self.path = path
+        meta_filename = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_filename):
+            with open(meta_filename) as meta_file:
+                meta = json.load(meta_file)
+        else:
+            meta = {'name': name, 'units': units, 'tz': tz, 'stride': stride}
+            os.makedirs(path, exist_ok=True)
+            tmp_filename = f'{meta_filename}.tmp'
+            with open(tmp_filename, 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(tmp_filename, meta_filename)
+        self.name = meta['name']
+        self.units = meta['units']
+        self.tz = meta['tz']
+        self.stride = meta['stride']
+
+    def _filename(self, part):
+        return os.path.join(self.path, f'{part}.bin')
+
+    def __len__(self):
+        """Number of complete readings stored.
+
+        Values are written before their times, so a reading being appended
+        by another process is not counted until both are on disk.
+        """
+        lengths = []
+        for part, dtype in (('times', TIME_DTYPE), ('values', VALUE_DTYPE)):
+            try:
+                lengths.append(os.path.getsize(self._filename(part)) // dtype.itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(lengths)
+
+    def _map(self, part, dtype, length):
+        """Map the first length items of one of the files read-only."""
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._filename(part), dtype=dtype, mode='r', shape=(length,))
+
+    def times(self):
+        """Memory mapped int64 times of the stored readings."""
+        return self._map('times', TIME_DTYPE, len(self))
+
+    def values(self):
+        """Memory mapped values of the stored readings."""
+        return self._map('values', VALUE_DTYPE, len(self))
+
+    def _indexed(self, length):
+        """Number of index entries written for the first length readings,
+        which is fewer than needed if an append was interrupted."""
+        try:
+            entries = os.path.getsize(self._filename('index')) // TIME_DTYPE.itemsize
+        except FileNotFoundError:
+            entries = 0
+        return min(entries, -(-length // self.stride))
+
+    def sparse_index(self):
+        """The time of every stride-th stored reading, up to the last one
+        indexed."""
+        entries = self._indexed(len(self))
+        if entries == 0:
+            return np.empty(0, dtype=TIME_DTYPE)
+        return np.fromfile(self._filename('index'), dtype=TIME_DTYPE, count=entries)
+
+    def append(self, times, values):
+        """Add readings, which must be in time order and no earlier than
+        those already stored.
+
+        :param times: Array of np.datetime64 timestamps, or int64 nanoseconds
+                      since the epoch (UTC for time zone aware series)
+        :param values: Array of readings, the same length as times
+        """
+        times = np.asarray(times)
+        if times.dtype.kind == 'M':
+            times = times.astype('datetime64[ns]').view('int64')
+        times = times.astype(TIME_DTYPE, copy=False)
+        values = np.asarray(values, dtype=VALUE_DTYPE)
+        if len(times) != len(values):
+            raise ValueError('times and values should be the same length')
+        if not len(times):
+            return
+
+        length = len(self)
+        if np.any(times[1:] < times[:-1]):
+            raise ValueError('Readings should be in time order')
+        if length and times[0] < self.times()[length - 1]:
+            raise ValueError('Readings should be no earlier than those already stored')
+
+        # Cut off any part-written reading left by an interrupted append
+        for part, dtype, array in (('values', VALUE_DTYPE, values),
+                                   ('times', TIME_DTYPE, times)):
+            with open(self._filename(part), 'ab') as data_file:
+                data_file.truncate(length * dtype.itemsize)
+                data_file.write(array.tobytes())
+
+        # Index entries for the stride-th readings not indexed yet, including
+        # any missed by an interrupted append
+        indexed = self._indexed(length)
+        positions = np.arange(indexed * self.stride, length + len(times), self.stride)
+        stored = positions[positions < length]
+        entries = np.concatenate([self._map('times', TIME_DTYPE, length)[stored],
+                                  times[positions[len(stored):] - length]])
+        with open(self._filename('index'), 'ab') as index_file:
+            index_file.truncate(indexed * TIME_DTYPE.itemsize)
+            index_file.write(entries.astype(TIME_DTYPE).tobytes())
+
+    def open(self):
+        """Open the stored readings as a MeasurementSeries backed by
+        numpy.memmap, without reading them into memory.
+
+        The series holds the readings stored when it was opened.
+        """
+        length = len(self)
+        return models.MeasurementSeries.mapped(
+            self._map('times', TIME_DTYPE, length), self._map('values', VALUE_DTYPE, length),
+            self.name, self.units, self.tz, index=(self.sparse_index(), self.stride))
+
+
+class Store:
+    """A directory of stored measurement histories, one per site and measurement."""
+    def __init__(self, root, stride=STRIDE):
+        """
+        :param root: Directory holding the store
+        :param stride: Readings between sparse index entries of new series
+        """
+        self.root = root
+        self.stride = stride
+
+    def path(self, site, measurement):
+        """Directory holding the history of a measurement at a site."""
+        return os.path.join(self.root, _quote(site), _quote(measurement))
+
+    def series_file(self, site, measurement, units=None, tz=None):
+        """Open the history of a measurement at a site, creating it if needed."""
+        return SeriesFile(self.path(site, measurement), measurement, units, tz, self.stride)
+
+    def sites(self):
+        """Names of the sites in the store."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(urllib.parse.unquote(entry) for entry in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, entry)))
+
+    def measurements(self, site):
+        """Names of the measurements stored for a site."""
+        site_path = os.path.join(self.root, _quote(site))
+        if not os.path.isdir(site_path):
+            return []
+        return sorted(urllib.parse.unquote(entry) for entry in os.listdir(site_path)
+                      if os.path.exists(os.path.join(site_path, entry, 'meta.json')))
+
+    def write_site(self, site):
+        """Append the readings of each of a site's measurements that are
+        later than those already stored.
+
+        :param site: models.Site
+        :returns: Number of readings appended
+        """
+        appended = 0
+        for measurement, measurement_series in site.measurements.items():
+            series = measurement_series.series
+            times = series.index
+            tz = None if times.tz is None else str(times.tz)
+            if times.tz is not None:
+                times = times.tz_convert('UTC')
+            times = times.asi8
+            values = series.to_numpy()
+            if not series.index.is_monotonic_increasing:
+                order = np.argsort(times, kind='stable')
+                times, values = times[order], values[order]
+
+            series_file = self.series_file(site.name, measurement, measurement_series.units, tz)
+            length = len(series_file)
+            if length:
+                newer = np.searchsorted(times, series_file.times()[length - 1], side='right')
+                times, values = times[newer:], values[newer:]
+            series_file.append(times, values)
+            appended += len(times)
+        return appended
+
+    def read_site(self, name):
+        """Open the stored measurements of a site without reading them.
+
+        :returns: models.Site whose measurements are memory mapped
+        """
+        site = models.Site(name)
+        for measurement in self.measurements(name):
+            site.measurements[measurement] = self.series_file(name, measurement).open()
+        return site
+
+
+def _quote(name):
+    """Make a site or measurement name safe to use as a file name."""
+    return urllib.parse.quote(name, safe=' ()')
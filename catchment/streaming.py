@@ -0,0 +1,117 @@
+"""Module for reading measurement files too large to hold in memory.
+
+The CSV is read in bounded-size chunks. Each chunk is pivoted into a
+Date x Site frame and folded into running per-day accumulators, so peak
+memory depends on the chunk size and the number of days rather than on
+the number of rows in the file.
+"""
+
+import pandas as pd
+
+from catchment import models
+
+
+DEFAULT_CHUNKSIZE = 100000
+
+
+def iter_variables_from_csv(filename, measurements, chunksize=DEFAULT_CHUNKSIZE,
+                            date_format=None):
+    """Read named variables from a CSV file one chunk of rows at a time.
+
+    :param filename: Filename of CSV to load
+    :param measurements: List of names of data columns to be read
+    :param chunksize: Number of CSV rows to read per chunk
+    :param date_format: strptime format of the Date column, detected if not given
+    :returns: Iterator over dictionaries of measurement name -> Date x Site
+              frame holding the rows of one chunk
+    """
+    measurements = list(measurements)
+    reader = pd.read_csv(filename, usecols=['Date', 'Site'] + measurements,
+                         chunksize=chunksize)
+    for chunk in reader:
+        if date_format is None:
+            date_format = models.detect_date_format(chunk['Date'])
+        chunk['Date'] = models.parse_dates(chunk['Date'], date_format)
+        data = models._pivot_sites(chunk, measurements)
+        yield {measurement: data[measurement].rename_axis(columns=None)
+               for measurement in measurements}
+
+
+class DailyAccumulator:
+    """Running per-day totals, counts and extremes of a Date x Site frame.
+
+    Frames passed to update may cover any days in any order; a day split
+    across several updates is combined exactly as if it had been seen in
+    a single frame. Sites are kept in the order they first appear, as
+    models.read_variable_from_csv orders them for the whole file.
+    """
+    def __init__(self):
+        self._sites = pd.Index([])
+        self._sum = None
+        self._count = None
+        self._max = None
+        self._min = None
+
+    def update(self, data):
+        """Fold the readings of a Date x Site frame into the accumulators."""
+        self._sites = self._sites.append(data.columns.difference(self._sites, sort=False))
+        daily = models.daily_stats(data, ['sum', 'count', 'max', 'min'])
+        self._sum = _combine(self._sum, daily['sum'], 'sum')
+        self._count = _combine(self._count, daily['count'], 'sum')
+        self._max = _combine(self._max, daily['max'], 'max')
+        self._min = _combine(self._min, daily['min'], 'min')
+
+    def total(self):
+        """Daily total of the accumulated data, as models.daily_total."""
+        return self._ordered(self._sum.fillna(0))
+
+    def mean(self):
+        """Daily mean of the accumulated data, as models.daily_mean."""
+        count = self._count.fillna(0)
+        return self._ordered(self._sum.fillna(0) / count.where(count > 0))
+
+    def max(self):
+        """Daily maximum of the accumulated data, as models.daily_max."""
+        return self._ordered(self._max)
+
+    def min(self):
+        """Daily minimum of the accumulated data, as models.daily_min."""
+        return self._ordered(self._min)
+
+    def _ordered(self, daily):
+        """Sort a table by day, with sites in the order they first appeared."""
+        return daily.sort_index()[self._sites]
+
+
+def _combine(running, new, how):
+    """Merge per-day partial results into a running table.
+
+    Days not seen before are appended; days already in the table are
+    reduced together with the new partial results using `how`.
+    """
+    if running is None:
+        return new
+    overlap = new.index.isin(running.index)
+    merged = pd.concat([running, new[~overlap]])
+    if overlap.any():
+        days = new.index[overlap]
+        reduced = pd.concat([merged.loc[days], new[overlap]]).groupby(level=0).agg(how)
+        merged.loc[days, reduced.columns] = reduced
+    return merged
+
+
+def read_daily_from_csv(filename, measurements, chunksize=DEFAULT_CHUNKSIZE, date_format=None):
+    """Accumulate the daily statistics of named variables in a CSV file
+    without loading the whole file into memory.
+
+    :param filename: Filename of CSV to load
+    :param measurements: List of names of data columns to be read
+    :param chunksize: Number of CSV rows to read per chunk
+    :param date_format: strptime format of the Date column, detected if not given
+    :returns: Dictionary of measurement name -> DailyAccumulator
+    """
+    accumulators = {measurement: DailyAccumulator() for measurement in measurements}
+    for chunk in iter_variables_from_csv(filename, measurements, chunksize, date_format):
+        for measurement, data in chunk.items():
+            accumulators[measurement].update(data)
+    return accumulators
@@ -1,13 +1,23 @@
 """Module containing code for plotting inflammation data."""
 
-from matplotlib import pyplot as plt
-#import numpy as np
-#import pandas as pd
+import numpy as np
 
-def visualize(data_dict):
+from catchment import profiling
+from catchment.lazy import lazy_import
+
+# Only imported when a plot is drawn
+pd = lazy_import('pandas')
+mdates = lazy_import('matplotlib.dates')
+plt = lazy_import('matplotlib.pyplot')
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+mfigure = lazy_import('matplotlib.figure')
+
+def visualize(data_dict, max_points=None):
     """Display plots of basic statistical properties of the given data.
 
     :param data_dict: Dictionary of name -> data to plot
+    :param max_points: If set, downsample each series to about this many
+                       points before plotting, keeping the extremes
     """
 
     num_plots = len(data_dict)
@@ -17,13 +27,116 @@ def visualize(data_dict):
         axes = fig.add_subplot(1, num_plots, i + 1)
 
         axes.set_ylabel(name)
-        axes.plot(data)
+        if max_points:
+            axes.plot(*downsample(data, max_points))
+        else:
+            axes.plot(data)
         axes.legend(data.columns)
 
     fig.tight_layout()
 
     plt.show()
 
+
+def downsample(data, max_points):
+    """Reduce each column of a 2D data array to about max_points points,
+    keeping the minimum and maximum of every run of consecutive readings
+    so that peaks and troughs survive.
+
+    :param data: A 2D Pandas data frame indexed by time. Columns are measurement sites.
+    :param max_points: Approximate number of points to keep per column
+    :returns: Tuple of 2D arrays (times, values), one column per site,
+              which can be passed straight to Axes.plot
+    """
+    times = pd.DatetimeIndex(data.index).to_numpy()
+    values = data.to_numpy(dtype=float)
+    if len(values) <= max_points:
+        return np.broadcast_to(times[:, np.newaxis], values.shape), values
+
+    # Each bucket of readings contributes its minimum and its maximum
+    bucket = -(-len(values) // max(max_points // 2, 1))
+    num_buckets = -(-len(values) // bucket)
+    padding = num_buckets * bucket - len(values)
+    values = np.concatenate([values, np.full((padding, values.shape[1]), np.nan)])
+    times = np.concatenate([times, np.repeat(times[-1:], padding)])
+
+    buckets = values.reshape(num_buckets, bucket, values.shape[1])
+    missing = np.isnan(buckets)
+    lowest = np.where(missing, np.inf, buckets).argmin(axis=1)
+    highest = np.where(missing, -np.inf, buckets).argmax(axis=1)
+
+    # Keep the two points of each bucket in time order
+    starts = np.arange(num_buckets)[:, np.newaxis] * bucket
+    positions = np.stack([np.minimum(lowest, highest), np.maximum(lowest, highest)], axis=1)
+    positions = (positions + starts[:, np.newaxis]).reshape(2 * num_buckets, values.shape[1])
+
+    return times[positions], np.take_along_axis(values, positions, axis=0)
+
+
+class FigureRenderer:
+    """Renders the plots made by visualize to image files without a display.
+
+    One figure and set of axes is created and reused for every render, and
+    drawn by the Agg backend rather than an interactive one.
+    """
+    def __init__(self, num_plots, max_points='auto', max_legend=10, dpi=100):
+        """
+        :param num_plots: Number of plots in each figure
+        :param max_points: Downsample each series to about this many points,
+                           'auto' for two points per pixel of plot width,
+                           or None to plot every reading
+        :param max_legend: Only draw a legend for up to this many sites
+        :param dpi: Resolution of raster images
+        """
+        self.figure = mfigure.Figure(figsize=((3 * num_plots) + 1, 3.0), dpi=dpi)
+        backend_agg.FigureCanvasAgg(self.figure)
+        self.axes = [self.figure.add_subplot(1, num_plots, i + 1) for i in range(num_plots)]
+        self.max_points = max_points
+        self.max_legend = max_legend
+
+    @profiling.profiled(rows=None)
+    def render(self, data_dict, filename):
+        """Plot the given data and save the figure.
+
+        :param data_dict: Dictionary of name -> data to plot
+        :param filename: Image file to write; the format is taken from the
+                         extension, e.g. .png or .svg
+        """
+        if len(data_dict) != len(self.axes):
+            raise ValueError(f'Renderer has {len(self.axes)} plots, not {len(data_dict)}')
+
+        for axes, (name, data) in zip(self.axes, data_dict.items()):
+            axes.clear()
+            axes.set_ylabel(name)
+            if self.max_points == 'auto':
+                axes.plot(*downsample(data, 2 * int(axes.bbox.width)))
+            elif self.max_points:
+                axes.plot(*downsample(data, self.max_points))
+            else:
+                axes.plot(data)
+            axes.xaxis.set_major_formatter(
+                mdates.ConciseDateFormatter(axes.xaxis.get_major_locator()))
+            if len(data.columns) <= self.max_legend:
+                axes.legend(data.columns)
+
+        self.figure.tight_layout()
+        self.figure.savefig(filename)
+
+    def render_sites(self, data_dict, filename_pattern):
+        """Save a separate figure for each site in the data.
+
+        :param data_dict: Dictionary of name -> data to plot
+        :param filename_pattern: Image filename containing '{site}'
+        :returns: List of the files written
+        """
+        sites = next(iter(data_dict.values())).columns
+        filenames = []
+        for site in sites:
+            filename = filename_pattern.format(site=site)
+            self.render({name: data[[site]] for name, data in data_dict.items()}, filename)
+            filenames.append(filename)
+        return filenames
+
 def display_measurement_record(site):
     """Display each dataset for a single site."""
     print(site.name)
@@ -0,0 +1,192 @@
+"""Module containing rolling-window and cumulative statistics of measurement data.
+
+All of the functions take the Date x Site frames returned by
+models.read_variable_from_csv and work on every site at once. Windows are
+lengths of time such as '1h' or '72h' rather than numbers of rows, so
+readings that are missing or irregularly spaced are handled: a window
+ending at time t covers the readings in (t - window, t].
+
+IncrementalWindows keeps the same statistics up to date as new readings
+arrive, holding only the readings still inside the longest window.
+"""
+
+import numpy as np
+import pandas as pd
+
+from catchment import profiling
+
+
+#Rainfall accumulation periods used for flood alerting
+ROLLING_WINDOWS = ['1h', '24h', '72h']
+
+ROLLING_STATISTICS = ['sum', 'mean', 'max', 'min', 'count']
+
+
+@profiling.profiled(rows='input')
+def rolling(data, window, statistic='sum', min_periods=1):
+    """Calculate a statistic over a moving window of time.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param window: Length of the window, e.g. '24h'
+    :param statistic: One of 'sum', 'mean', 'max', 'min' or 'count'
+    :param min_periods: Fewest readings a window needs for a result; with
+                        fewer the result is NaN
+    :returns: A 2D Pandas data frame with the statistic of the window
+              ending at each reading
+    """
+    if statistic not in ROLLING_STATISTICS:
+        raise ValueError(f'Unknown statistic {statistic!r}')
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    return data.rolling(pd.Timedelta(window), min_periods=min_periods).agg(statistic)
+
+
+def rolling_totals(data, windows=ROLLING_WINDOWS):
+    """Calculate moving totals over several windows, e.g. rainfall
+    accumulations over the last 1, 24 and 72 hours.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param windows: Lengths of the windows
+    :returns: Dictionary of window -> 2D Pandas data frame of totals
+    """
+    return {window: rolling(data, window, 'sum') for window in windows}
+
+
+def moving_average(data, window):
+    """Calculate the mean of the readings in a moving window of time.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param window: Length of the window, e.g. '24h'
+    :returns: A 2D Pandas data frame of moving averages
+    """
+    return rolling(data, window, 'mean')
+
+
+@profiling.profiled(rows='input')
+def cumulative_total(data):
+    """Calculate the running total of each site's readings, e.g. cumulative rainfall.
+
+    Missing readings add nothing to the total, but are left missing.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :returns: A 2D Pandas data frame of running totals
+    """
+    return data.cumsum()
+
+
+@profiling.profiled(rows='input')
+def rate_of_rise(data, window='1h', max_gap=None):
+    """Calculate how fast each site's readings are rising, e.g. water level
+    in mm per hour.
+
+    Each reading is compared with the site's latest reading at least a
+    window earlier, and the change is divided by the time between them,
+    so gaps in the data give the average rate over the gap.
+
+    :param data: A 2D Pandas data frame with measurement data.
+                 Index must be np.datetime64 compatible format. Columns are measurement sites.
+    :param window: Shortest time to measure the change over, e.g. '1h'
+    :param max_gap: If set, no rate is given where the earlier reading is
+                    more than this long before, e.g. '6h'
+    :returns: A 2D Pandas data frame of the rate of change per hour;
+              negative where readings are falling
+    """
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    times = pd.DatetimeIndex(data.index).asi8
+    values = data.to_numpy(dtype=float)
+    rows = np.arange(len(values))
+
+    # The row of the latest reading at or before each row, for each site
+    latest = np.where(np.isnan(values), -1, rows[:, np.newaxis])
+    latest = np.maximum.accumulate(latest, axis=0)
+
+    # The row of the latest reading a window or more before each row
+    window_rows = np.searchsorted(times, times - pd.Timedelta(window).value, side='right') - 1
+    earlier = np.where(window_rows[:, np.newaxis] >= 0,
+                       latest[np.maximum(window_rows, 0)], -1)
+
+    found = earlier >= 0
+    earlier = np.maximum(earlier, 0)
+    elapsed = times[:, np.newaxis] - times[earlier]
+    if max_gap is not None:
+        found &= elapsed <= pd.Timedelta(max_gap).value
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = (values - np.take_along_axis(values, earlier, axis=0)) / elapsed
+    rate = np.where(found, rate * pd.Timedelta('1h').value, np.nan)
+    return pd.DataFrame(rate, index=data.index, columns=data.columns)
+
+
+class IncrementalWindows:
+    """Rolling and cumulative statistics extended as new readings arrive.
+
+    Each update computes the statistics for the new rows only, using the
+    readings kept from the end of the longest window, so earlier results
+    never need recomputing.
+    """
+    def __init__(self, windows=ROLLING_WINDOWS, statistic='sum', min_periods=1):
+        """
+        :param windows: Lengths of the rolling windows
+        :param statistic: Rolling statistic, as for rolling
+        :param min_periods: Fewest readings a window needs, as for rolling
+        """
+        self.windows = list(windows)
+        self.statistic = statistic
+        self.min_periods = min_periods
+        self._longest = max(pd.Timedelta(window) for window in self.windows)
+        self._tail = None
+        self._totals = None
+        self._parts = {window: [] for window in self.windows + ['cumulative']}
+
+    def update(self, data):
+        """Add new readings, which must all be later than those already added.
+
+        :param data: A 2D Pandas data frame with the new readings; it may
+                     include sites not seen before
+        :returns: Dictionary of window -> 2D Pandas data frame of the
+                  statistic for the new rows, plus 'cumulative' -> the
+                  running totals at the new rows
+        """
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
+        if self._tail is not None and len(self._tail) and len(data):
+            if data.index[0] <= self._tail.index[-1]:
+                raise ValueError('New readings must be later than those already added')
+            combined = pd.concat([self._tail, data])
+        else:
+            combined = data
+
+        start = len(combined) - len(data)
+        results = {window: rolling(combined, window, self.statistic,
+                                   self.min_periods).iloc[start:]
+                   for window in self.windows}
+
+        cumulative = data.cumsum()
+        if self._totals is not None:
+            cumulative += self._totals.reindex(data.columns, fill_value=0)
+            self._totals = self._totals.add(data.sum(), fill_value=0)
+        else:
+            self._totals = data.sum()
+        results['cumulative'] = cumulative
+
+        if len(combined):
+            self._tail = combined[combined.index > combined.index[-1] - self._longest]
+        for window, result in results.items():
+            self._parts[window].append(result)
+        return results
+
+    def results(self, window):
+        """All the results of a window so far, or 'cumulative' for the running totals.
+
+        :returns: A 2D Pandas data frame covering every row added
+        """
+        parts = self._parts[window]
+        if len(parts) > 1:
+            parts[:] = [pd.concat(parts)]
+        if not parts:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        return parts[0]
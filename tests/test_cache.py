@@ -0,0 +1,79 @@
+"""Tests for the on-disk cache of parsed measurement frames."""
+
+import os
+
+import pandas.testing as pdt
+import pytest
+
+
+@pytest.fixture
+def river_file(tmp_path):
+    """A copy of the bundled river data which tests may modify."""
+    filename = tmp_path / 'river.csv'
+    with open('data/river_data_2015-12.csv') as source:
+        filename.write_text(source.read())
+    return filename
+
+
+def test_cached_frame_matches_csv(tmp_path, river_file):
+    """Test a frame read back from the cache matches the parsed CSV."""
+    from catchment import models
+    from catchment.cache import FrameCache, read_variable_from_csv
+    cache = FrameCache(tmp_path / 'cache')
+    measurement = 'Water level continuous (mm)'
+    expected = models.read_variable_from_csv(river_file, measurement)
+
+    assert cache.get(river_file, measurement) is None
+    pdt.assert_frame_equal(read_variable_from_csv(river_file, measurement, cache), expected)
+    pdt.assert_frame_equal(cache.get(river_file, measurement), expected)
+    assert len(cache.entries()) == 1
+
+
+def test_modified_file_invalidates_cache(tmp_path, river_file):
+    """Test changing the source file replaces its cached frame."""
+    from catchment.cache import FrameCache, read_variable_from_csv
+    cache = FrameCache(tmp_path / 'cache')
+    measurement = 'pH continuous'
+    read_variable_from_csv(river_file, measurement, cache)
+
+    lines = river_file.read_text().splitlines(keepends=True)
+    river_file.write_text(''.join(lines[:-1]))
+    stat = os.stat(river_file)
+    os.utime(river_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert cache.get(river_file, measurement) is None
+    data = read_variable_from_csv(river_file, measurement, cache)
+    assert data.notna().sum().sum() == len(lines) - 2
+    assert len(cache.entries()) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path, river_file):
+    """Test the cache stays within its size bound."""
+    from catchment.cache import FrameCache, read_variables_from_csv
+    measurements = ['Battery (V)', 'pH continuous', 'Temperature water continuous (C)']
+    cache = FrameCache(tmp_path / 'cache', max_bytes=2 * 2976 * 3 * 8 + 100000)
+    read_variables_from_csv(river_file, measurements, cache)
+
+    assert len(cache.entries()) == 2
+    assert cache.size() <= cache.max_bytes
+    assert cache.get(river_file, measurements[0]) is None
+
+    cache.clear()
+    assert cache.entries() == []
+
+
+def test_read_options_in_key(tmp_path, river_file):
+    """Test frames read with different options are cached separately."""
+    from catchment import models
+    from catchment.cache import FrameCache, read_variables_from_csv
+    cache = FrameCache(tmp_path / 'cache')
+    measurements = ['pH continuous', 'Battery (V)']
+    read_variables_from_csv(river_file, measurements, cache)
+    assert cache.get(river_file, 'pH continuous', {'date_format': '%Y-%m-%d %H:%M:%S'}) is None
+    read_variables_from_csv(river_file, measurements, cache, date_format='%Y-%m-%d %H:%M:%S')
+    assert len(cache.entries()) == 4
+
+    combined = read_variables_from_csv(river_file, measurements, cache, combine=True)
+    pdt.assert_frame_equal(combined, models.read_variables_from_csv(river_file, measurements,
+                                                                    combine=True))
+    assert len(cache.entries()) == 4
@@ -0,0 +1,28 @@
+"""Tests for the catchment-analysis.py command line tool"""
+
+import subprocess
+import sys
+
+import pytest
+
+
+def run_cli(*arguments):
+    """Run catchment-analysis.py, returning its standard output."""
+    return subprocess.run([sys.executable, 'catchment-analysis.py'] + list(arguments),
+                          stdout=subprocess.PIPE, text=True, check=True).stdout
+
+
+@pytest.mark.parametrize("extra", [[], ['--incremental']])
+def test_combine_site_in_some_files(tmp_path, monkeypatch, extra):
+    """Test combining files when the site is only in one of them."""
+    monkeypatch.setenv('CATCHMENT_CACHE_DIR', str(tmp_path / 'cache'))
+    lines = open('data/rain_data_small.csv').read().splitlines(keepends=True)
+    with_site = tmp_path / 'with_site.csv'
+    with_site.write_text(''.join(lines))
+    without_site = tmp_path / 'without_site.csv'
+    without_site.write_text(''.join(line for line in lines if not line.startswith('PL16')))
+
+    output = run_cli(str(without_site), str(with_site), '-m', 'Rainfall (mm)',
+                     '--view', 'record', '--site', 'PL16', '--combine', '--no-cache', *extra)
+    assert output.splitlines()[0] == 'PL16'
+    assert len([line for line in output.splitlines() if line.startswith('2005-12-')]) == 8
@@ -0,0 +1,83 @@
+"""Tests for reading rows appended to a growing CSV file."""
+
+import pandas.testing as pdt
+
+
+def test_incremental_reader_matches_full_read(tmp_path):
+    """Test appending a file in pieces gives the same data as reading it whole."""
+    from catchment import models
+    from catchment.incremental import IncrementalReader
+    measurements = ['pH continuous', 'Water level continuous (mm)']
+    with open('data/river_data_2015-12.csv', 'rb') as source:
+        lines = source.readlines()
+    filename = tmp_path / 'river.csv'
+
+    reader = IncrementalReader(filename, measurements)
+    # Split mid-day and mid-line, with a repeated row at one boundary
+    pieces = [b''.join(lines[:1000]) + lines[1000][:10],
+              lines[1000][10:] + b''.join(lines[1001:4000]),
+              b''.join(lines[3999:])]
+    filename.write_bytes(b'')
+    for piece in pieces:
+        with open(filename, 'ab') as target:
+            target.write(piece)
+        reader.refresh()
+    assert reader.refresh() == 0
+
+    for measurement in measurements:
+        expected = models.read_variable_from_csv('data/river_data_2015-12.csv', measurement)
+        pdt.assert_frame_equal(reader.data(measurement), expected)
+        daily = models.daily_stats(expected)
+        for statistic, result in reader.daily_stats(measurement).items():
+            pdt.assert_frame_equal(result, daily[statistic])
+
+
+def test_refresh_from_csv_saves_state(tmp_path):
+    """Test a saved reader only reads rows added since the last run."""
+    from catchment.incremental import refresh_from_csv
+    lines = open('data/rain_data_small.csv').read().splitlines(keepends=True)
+    filename = tmp_path / 'rain.csv'
+    filename.write_text(''.join(lines[:10]))
+    reader = refresh_from_csv(filename, ['Rainfall (mm)'], tmp_path / 'state')
+    assert len(reader.data('Rainfall (mm)').stack()) == 9
+
+    with open(filename, 'a') as target:
+        target.write(''.join(lines[10:]))
+    reader = refresh_from_csv(filename, ['Rainfall (mm)'], tmp_path / 'state')
+    assert reader.offset == filename.stat().st_size
+    assert len(reader.data('Rainfall (mm)').stack()) == len(lines) - 1
+
+
+def test_save_appends_parts(tmp_path):
+    """Test each save only appends the new frames, and an interrupted save is cut off."""
+    from catchment.incremental import IncrementalReader
+    lines = open('data/rain_data_small.csv').read().splitlines(keepends=True)
+    filename = tmp_path / 'rain.csv'
+    state = tmp_path / 'reader.pickle'
+    filename.write_text(''.join(lines[:10]))
+    reader = IncrementalReader(filename, ['Rainfall (mm)'])
+    reader.refresh()
+    reader.save(state)
+    with open(f'{state}.parts', 'rb') as parts_file:
+        first_parts = parts_file.read()
+
+    with open(filename, 'a') as target:
+        target.write(''.join(lines[10:20]))
+    reader = IncrementalReader.load(state)
+    reader.refresh()
+    # An interrupted save leaves frames the state does not count
+    with open(f'{state}.parts', 'ab') as parts_file:
+        parts_file.write(b'partial')
+    reader.save(state)
+    with open(f'{state}.parts', 'rb') as parts_file:
+        parts = parts_file.read()
+    assert parts.startswith(first_parts)
+    assert b'partial' not in parts
+
+    with open(filename, 'a') as target:
+        target.write(''.join(lines[20:]))
+    reader = IncrementalReader.load(state)
+    reader.refresh()
+    expected = IncrementalReader(filename, ['Rainfall (mm)'])
+    expected.refresh()
+    pdt.assert_frame_equal(reader.data('Rainfall (mm)'), expected.data('Rainfall (mm)'))
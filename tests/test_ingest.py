@@ -0,0 +1,112 @@
+"""Tests for the asyncio ingest service"""
+
+import asyncio
+
+import numpy.testing as npt
+import pandas as pd
+import pandas.testing as pdt
+
+from catchment import ingest, models
+
+
+def test_concurrent_sources():
+    """Test readings from many concurrent sources all reach their series in order."""
+    catchment = models.Catchment('Test')
+    start = pd.Timestamp('2005-12-01')
+
+    async def run():
+        async with ingest.IngestService(catchment, queue_size=50, flush_interval=0.01,
+                                        max_batch=200) as service:
+            async def logger(site, count):
+                for reading in range(count):
+                    await service.submit(site, 'Rainfall (mm)',
+                                         start + pd.Timedelta(minutes=15 * reading),
+                                         float(reading))
+            await asyncio.gather(*[logger(f'S{site}', 100) for site in range(20)])
+        return service.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics['received'] == metrics['flushed'] == 2000
+    assert metrics['queued'] == metrics['pending'] == 0
+    assert metrics['backpressure_waits'] > 0
+    assert metrics['flushes'] >= 10
+    assert 0 <= metrics['latency_p50'] <= metrics['latency_max']
+    assert metrics['throughput'] > 0
+
+    assert len(catchment.sites) == 20
+    series = catchment.sites['S7'].measurements['Rainfall (mm)'].series
+    npt.assert_array_equal(series, range(100))
+    assert series.index[-1] == start + pd.Timedelta(minutes=15 * 99)
+
+
+def test_serve_tcp():
+    """Test readings sent over TCP are ingested and bad lines reported."""
+    catchment = models.Catchment('Test')
+
+    async def run():
+        async with ingest.IngestService(catchment, flush_interval=0.01) as service:
+            server = await ingest.serve_tcp(service)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'FP35,Rainfall (mm),01/12/2005 00:00,0.2\n'
+                         b'FP35,Rainfall (mm),2005-12-01 00:15:00,0.4\n'
+                         b'not a reading\n'
+                         b'FP35,Rainfall (mm),not a date,0.6\n'
+                         b'FP35,Rainfall (mm),\xff,0.8\n')
+            writer.write_eof()
+            reply = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+        return reply, service.metrics()['failed']
+
+    assert asyncio.run(run()) == (b'ERROR not a reading\n'
+                                  b'ERROR FP35,Rainfall (mm),not a date,0.6\n'
+                                  b'ERROR FP35,Rainfall (mm),\xef\xbf\xbd,0.8\n', 3)
+    pdt.assert_series_equal(
+        catchment.sites['FP35'].measurements['Rainfall (mm)'].series,
+        pd.Series([0.2, 0.4], index=pd.to_datetime(['2005-12-01 00:00', '2005-12-01 00:15']),
+                  name='Rainfall (mm)'))
+
+
+def test_tail_csv(tmp_path):
+    """Test a followed CSV file is ingested as rows are appended."""
+    filename = tmp_path / 'rain.csv'
+    with open('data/rain_data_small.csv') as source:
+        lines = source.readlines()
+    filename.write_text(''.join(lines[:6]))
+    catchment = models.Catchment('Test')
+
+    async def run():
+        async with ingest.IngestService(catchment, flush_interval=0.01) as service:
+            stop = asyncio.Event()
+            tail = asyncio.create_task(ingest.tail_csv(service, filename, ['Rainfall (mm)'],
+                                                       poll_interval=0.01, stop=stop))
+            await asyncio.sleep(0.05)
+            with open(filename, 'a') as target:
+                target.write(''.join(lines[6:]))
+            await asyncio.sleep(0.05)
+            stop.set()
+            await tail
+
+    asyncio.run(run())
+    expected = models.read_variable_from_csv('data/rain_data_small.csv', 'Rainfall (mm)')
+    for site in expected.columns:
+        npt.assert_array_equal(catchment.sites[site].measurements['Rainfall (mm)'].series,
+                               expected[site].dropna())
+
+
+def test_failed_flush():
+    """Test a batch that cannot be appended is counted as failed without stopping the service."""
+    catchment = models.Catchment('Test')
+
+    async def run():
+        async with ingest.IngestService(catchment, flush_interval=0.01) as service:
+            await service.submit('FP35', 'Rainfall (mm)', 0, 'heavy')
+            await service.submit('FP35', 'River Level (mm)', 0, 1.0)
+        return service.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics['failed'] == 1
+    assert metrics['flushed'] == 1
+    assert list(catchment.sites['FP35'].measurements) == ['River Level (mm)']
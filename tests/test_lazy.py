@@ -0,0 +1,24 @@
+"""Tests for deferred imports"""
+
+import sys
+
+from catchment.lazy import LazyModule, lazy_import
+
+
+def test_lazy_import(monkeypatch):
+    """Test a module is only imported when one of its attributes is used."""
+    monkeypatch.delitem(sys.modules, 'wave', raising=False)
+    wave = lazy_import('wave')
+    assert isinstance(wave, LazyModule)
+    assert 'wave' not in sys.modules
+    assert wave.Error.__module__ == 'wave'
+    assert 'wave' in sys.modules
+    assert lazy_import('wave') is sys.modules['wave']
+
+
+def test_lazy_module_attributes_copied(monkeypatch):
+    """Test the module's attributes are copied into the stand-in once it is imported."""
+    monkeypatch.delitem(sys.modules, 'wave', raising=False)
+    wave = lazy_import('wave')
+    assert wave.open is sys.modules['wave'].open
+    assert vars(wave)['Error'] is sys.modules['wave'].Error
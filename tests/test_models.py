@@ -17,13 +17,11 @@ using decorators for scaling up unit testing'''
     [
         (
             [ [0.0, 0.0], [0.0, 0.0], [0.0, 0.0] ],
-            [ [0.0, 0.0], [0.0, 0.0], [0.0, 0.0] ], #2x2
             [ pd.to_datetime('2000-01-01 01:00'),
                 pd.to_datetime('2000-01-01 02:00'),
                 pd.to_datetime('2000-01-01 03:00') ],
             [ 'A', 'B' ],
             [ [0.0, 0.0] ],
-            [ [0.0, 0.0] ],#2x1
             [ datetime.date(2000, 1, 1) ],
             [ 'A', 'B' ]
         ),
@@ -153,12 +151,22 @@ def test_daily_min(test_data, test_index, test_columns, expected_data,
         ),
         (
             [[1, 2, 3], [4, 5, 6], [7, 8, 9]],
-            [[0.33, 0.67, 1], [0.67, 0.83, 1], [0.78, 0.89, 1]],
+            [[0.14, 0.25, 0.33], [0.57, 0.63, 0.67], [1, 1, 1]],
             None,
+        ),
+        (
+            [[1, np.nan, 0], [2, np.nan, 0]],
+            [[0.5, 0, 0], [1, 0, 0]],
+            None,
+        ),
+        (
+            [[1, 2, 3], [4, -5, 6]],
+            None,
+            ValueError,
         )
     ])
 def test_data_normalise(test, expected, expect_raises):
-    """Test normalisation works for arrays of one and positive integers."""
+    """Test each site is normalised by its maximum, and NaNs become zero."""
     from catchment.models import data_normalise
     if isinstance(test, list):
         test = np.array(test)
@@ -166,4 +174,467 @@ def test_data_normalise(test, expected, expect_raises):
         with pytest.raises(expect_raises):
             npt.assert_almost_equal(data_normalise(test), np.array(expected), decimal=2)
     else:
-        npt.assert_almost_equal(data_normalise(test), np.array(expected), decimal=2)
\ No newline at end of file
+        npt.assert_almost_equal(data_normalise(test), np.array(expected), decimal=2)
+
+@pytest.mark.parametrize(
+    "test_dates, expected",
+    [
+        (['01/12/2005 00:00', '01/12/2005 00:15'], '%d/%m/%Y %H:%M'),
+        (['2005-12-01 00:00:00', '2005-12-01 00:15:00'], '%Y-%m-%d %H:%M:%S'),
+        ([None, '2005-12-01 00:15'], '%Y-%m-%d %H:%M'),
+        (['1st December 2005'], None),
+    ])
+def test_detect_date_format(test_dates, expected):
+    """Test the rain and river date formats are recognised."""
+    from catchment.models import detect_date_format
+    assert detect_date_format(pd.Series(test_dates)) == expected
+
+
+@pytest.mark.parametrize(
+    "test_dates",
+    [
+        ['01/12/2005 00:00', '01/12/2005 00:15', '02/12/2005 00:00'],
+        ['2005-12-01 00:00:00', '2005-12-01 00:15:00', '2005-12-02 00:00:00'],
+    ])
+def test_read_variable_from_csv(tmp_path, test_dates):
+    """Test sites are pivoted into columns in order of first appearance."""
+    from catchment.models import read_variable_from_csv
+    csv = tmp_path / 'data.csv'
+    pd.DataFrame({
+        'Site': ['PL16', 'FP35', 'FP35', 'PL16', 'FP35'],
+        'Date': [test_dates[1], test_dates[0], test_dates[1], test_dates[2], test_dates[2]],
+        'Rainfall (mm)': [0.4, 0.0, 0.2, 0.6, 0.8],
+    }).to_csv(csv, index=False)
+
+    pdt.assert_frame_equal(read_variable_from_csv(csv, 'Rainfall (mm)'),
+                           pd.DataFrame(data=[[np.nan, 0.0], [0.4, 0.2], [0.6, 0.8]],
+                                        index=pd.to_datetime(['2005-12-01 00:00',
+                                                              '2005-12-01 00:15',
+                                                              '2005-12-02 00:00']),
+                                        columns=['PL16', 'FP35']))
+
+
+def test_read_variable_from_csv_matches_legacy():
+    """Test the pivot engine gives the same frame as the original reader."""
+    from catchment.models import read_variable_from_csv
+    pdt.assert_frame_equal(read_variable_from_csv('data/rain_data_small.csv', 'Rainfall (mm)'),
+                           read_variable_from_csv('data/rain_data_small.csv', 'Rainfall (mm)',
+                                                  engine='legacy'))
+
+
+def test_read_variables_from_csv():
+    """Test every measurement read in one pass matches reading it alone."""
+    from catchment.models import read_variable_from_csv, read_variables_from_csv
+    filename = 'data/river_data_2015-12.csv'
+    measurements = ['Battery (V)', 'pH continuous', 'Water level continuous (mm)']
+    variables = read_variables_from_csv(filename, measurements)
+    assert list(variables) == measurements
+    for measurement in measurements:
+        pdt.assert_frame_equal(variables[measurement],
+                               read_variable_from_csv(filename, measurement))
+
+
+def test_read_variables_from_csv_combined():
+    """Test the combined frame has (Measurement, Site) columns."""
+    from catchment.models import read_variables_from_csv
+    combined = read_variables_from_csv('data/river_data_2015-12.csv',
+                                       ['Battery (V)', 'pH continuous'], combine=True)
+    assert combined.columns.names == ['Measurement', 'Site']
+    assert list(combined.columns) == [('Battery (V)', 'FP15'), ('Battery (V)', 'TE20'),
+                                      ('Battery (V)', 'PL17'), ('pH continuous', 'FP15'),
+                                      ('pH continuous', 'TE20'), ('pH continuous', 'PL17')]
+
+
+def test_daily_stats():
+    """Test the fused daily statistics match grouping by date separately."""
+    from catchment.models import daily_stats
+    test_input = pd.DataFrame(data=[[1.0, 2.0], [3.0, np.nan], [5.0, 6.0], [7.0, 8.0]],
+                              index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00',
+                                                    '2000-01-02 01:00', '2000-01-02 02:00']),
+                              columns=['A', 'B'])
+    statistics = ['sum', 'mean', 'max', 'min', 'count', 'std', 0.5]
+    results = daily_stats(test_input, statistics)
+    assert list(results) == statistics
+
+    grouped = test_input.groupby(test_input.index.date)
+    for statistic in statistics:
+        if isinstance(statistic, float):
+            expected = grouped.quantile(statistic)
+        else:
+            expected = grouped.agg(statistic)
+        pdt.assert_frame_equal(results[statistic], expected)
+
+
+def test_daily_stats_unknown_statistic():
+    """Test an unsupported statistic name is rejected."""
+    from catchment.models import daily_stats
+    test_input = pd.DataFrame(data=[[1.0]], index=pd.to_datetime(['2000-01-01 01:00']))
+    with pytest.raises(ValueError):
+        daily_stats(test_input, ['median'])
+
+
+@pytest.mark.parametrize(
+    "period, expected_index",
+    [
+        ('6H', pd.to_datetime(['2000-09-30 18:00', '2000-10-01 00:00', '2000-10-02 00:00'])),
+        ('D', pd.to_datetime(['2000-09-30', '2000-10-01', '2000-10-02'])),
+        ('M', pd.to_datetime(['2000-09-01', '2000-10-01'])),
+        ('MS', pd.to_datetime(['2000-09-01', '2000-10-01'])),
+        ('2M', pd.to_datetime(['2000-09-01'])),
+        ('QS', pd.to_datetime(['2000-07-01', '2000-10-01'])),
+        ('HY', pd.to_datetime(['1999-10-01', '2000-10-01'])),
+    ])
+def test_resample(period, expected_index):
+    """Test periods are labelled by their start and hold the right rows."""
+    from catchment.models import resample
+    test_input = pd.DataFrame(data=[[1.0], [2.0], [3.0], [4.0]],
+                              index=pd.to_datetime(['2000-09-30 23:00', '2000-10-01 01:00',
+                                                    '2000-10-01 05:00', '2000-10-02 00:00']),
+                              columns=['A'])
+    result = resample(test_input, period, ['sum'])['sum']
+    pdt.assert_index_equal(result.index, expected_index)
+    assert result['A'].sum() == 10.0
+
+
+def test_resample_missing_times():
+    """Test rows with no time are left out of every period."""
+    from catchment.models import resample
+    test_input = pd.DataFrame(data=[[1.0], [100.0], [2.0]],
+                              index=pd.DatetimeIndex(['2000-01-01 01:00', None, '2000-01-02']),
+                              columns=['A'])
+    result = resample(test_input, 'D', ['sum', 'count'])
+    pdt.assert_index_equal(result['sum'].index, pd.to_datetime(['2000-01-01', '2000-01-02']))
+    assert result['sum']['A'].tolist() == [1.0, 2.0]
+    assert result['count']['A'].tolist() == [1, 1]
+
+
+def test_resample_unsupported_period():
+    """Test offsets that are not calendar periods are rejected."""
+    from catchment.models import resample
+    test_input = pd.DataFrame(data=[[1.0]], index=pd.to_datetime(['2000-01-01 01:00']))
+    with pytest.raises(ValueError):
+        resample(test_input, 'SM', ['sum'])
+
+
+def test_resample_dst():
+    """Test the day the clocks go back has 25 hourly bins and one daily bin."""
+    from catchment.models import resample
+    index = pd.date_range('2020-10-25 00:00', '2020-10-26 00:00', freq='15min',
+                          tz='Europe/London', inclusive='left')
+    test_input = pd.DataFrame(data=np.ones((len(index), 1)), index=index, columns=['A'])
+    assert len(resample(test_input, 'H', ['count'], tz='Europe/London')['count']) == 25
+    daily = resample(test_input.tz_convert('UTC'), 'D', ['count'], tz='Europe/London')['count']
+    assert daily['A'].tolist() == [100]
+
+
+def test_resample_bins_cached():
+    """Test the bins of an index are reused for repeated resampling."""
+    from catchment.models import resample_bins
+    index = pd.date_range('2000-01-01', periods=10, freq='H')
+    assert resample_bins(index, 'D') is resample_bins(index, 'D')
+    assert resample_bins(index, 'D') is not resample_bins(index.copy(), 'D')
+
+
+def test_data_normalise_dataframe():
+    """Test a DataFrame is normalised in blocks of columns, globally and in place."""
+    from catchment.models import data_normalise
+    test_input = pd.DataFrame(data=[[1.0, 2.0, 3.0], [2.0, 8.0, 6.0]],
+                              index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00']),
+                              columns=['A', 'B', 'C'])
+    pdt.assert_frame_equal(data_normalise(test_input, chunk_columns=2),
+                           pd.DataFrame(data=[[0.5, 0.25, 0.5], [1.0, 1.0, 1.0]],
+                                        index=test_input.index, columns=test_input.columns))
+
+    expected = test_input / 8.0
+    assert data_normalise(test_input, scale='global', out=test_input) is test_input
+    pdt.assert_frame_equal(test_input, expected)
+
+
+def test_data_normalise_mixed_dtypes(monkeypatch):
+    """Test a frame with several dtypes is converted a block of columns at a time."""
+    from catchment.models import data_normalise
+    test_input = pd.DataFrame({'A': np.array([1.0, 2.0], dtype=np.float32),
+                               'B': [4, 2], 'C': [3.0, 6.0]})
+    shapes = []
+    to_numpy = pd.DataFrame.to_numpy
+    monkeypatch.setattr(pd.DataFrame, 'to_numpy',
+                        lambda frame, *args, **kwargs: shapes.append(frame.shape)
+                        or to_numpy(frame, *args, **kwargs))
+    result = data_normalise(test_input, chunk_columns=1)
+    assert set(shapes) == {(2, 1)}
+    monkeypatch.undo()
+    pdt.assert_frame_equal(result, pd.DataFrame({'A': [0.5, 1.0], 'B': [1.0, 0.5],
+                                                 'C': [0.5, 1.0]}))
+
+
+def test_data_normalise_in_place():
+    """Test an ndarray normalised in place is not copied."""
+    from catchment.models import data_normalise
+    test_input = np.array([[1.0, 4.0], [2.0, 2.0]])
+    assert data_normalise(test_input, out=test_input, chunk_columns=1) is test_input
+    npt.assert_almost_equal(test_input, [[0.5, 1.0], [1.0, 0.5]])
+
+
+def test_combine_frames():
+    """Test overlapping frames with different sites are merged in date order."""
+    from catchment.models import combine_frames
+    later = pd.DataFrame(data=[[5.0, 6.0], [7.0, 8.0]],
+                         index=pd.to_datetime(['2000-01-01 02:00', '2000-01-01 03:00']),
+                         columns=['A', 'C'])
+    earlier = pd.DataFrame(data=[[1.0, 2.0], [3.0, 4.0]],
+                           index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00']),
+                           columns=['A', 'B'])
+    pdt.assert_frame_equal(combine_frames([later, earlier]),
+                           pd.DataFrame(data=[[1.0, np.nan, 2.0],
+                                              [3.0, 6.0, 4.0],
+                                              [7.0, 8.0, np.nan]],
+                                        index=pd.to_datetime(['2000-01-01 01:00',
+                                                              '2000-01-01 02:00',
+                                                              '2000-01-01 03:00']),
+                                        columns=['A', 'C', 'B']))
+
+
+def test_read_variables_from_csv_compact():
+    """Test compact frames hold the same values in float32 with plain site columns."""
+    from catchment.models import read_variables_from_csv
+    filename = 'data/river_data_2015-12.csv'
+    measurements = ['Battery (V)', 'pH continuous']
+    default = read_variables_from_csv(filename, measurements)
+    compact = read_variables_from_csv(filename, measurements, compact=True)
+    for measurement in measurements:
+        assert (compact[measurement].dtypes == np.float32).all()
+        pdt.assert_index_equal(compact[measurement].columns, default[measurement].columns)
+        pdt.assert_frame_equal(compact[measurement].astype(str), default[measurement].astype(str))
+
+
+def test_compact_dtypes():
+    """Test text becomes categorical and floats only narrow when no precision is lost."""
+    from catchment.models import compact_dtypes
+    data = pd.DataFrame({'Site': ['FP35', 'FP35', 'PL16'],
+                         'Rainfall (mm)': [0.2, 0.4, np.nan],
+                         'Level': [1.0, 1.0 + 1e-12, 2.0]})
+    compact = compact_dtypes(data)
+    assert isinstance(compact['Site'].dtype, pd.CategoricalDtype)
+    assert compact['Rainfall (mm)'].dtype == np.float32
+    assert compact['Level'].dtype == np.float64
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([7.96, 1234.56, np.nan, 0.0, -0.001], True),
+        ([73726060.0], True),
+        ([572731456.0], False),
+        ([1.0 + 1e-12], False),
+        ([1e39], False),
+        ([1e40], False),
+        ([1e-45], False),
+        ([3e38, 1.5e-38], True),
+    ])
+def test_fits_float32(values, expected):
+    """Test floats fit float32 only if every value is written out unchanged."""
+    from catchment.models import fits_float32
+    assert fits_float32(np.array(values), chunk=2) is expected
+
+
+def test_daily_stats_float32():
+    """Test float32 data is aggregated without being upcast."""
+    from catchment.models import daily_stats
+    data = pd.DataFrame(data=np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], dtype=np.float32),
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00',
+                                              '2000-01-02 01:00']),
+                        columns=['A', 'B'])
+    stats = daily_stats(data)
+    for statistic in ['sum', 'mean', 'max', 'min']:
+        assert (stats[statistic].dtypes == np.float32).all()
+    npt.assert_array_equal(stats['mean'], [[2.0, 3.0], [5.0, 6.0]])
+
+
+def test_quality_flags():
+    """Test each quality check flags the faulty readings of every site."""
+    from catchment.models import (quality_flags, QC_MISSING, QC_GAP, QC_FLATLINE,
+                                  QC_RANGE, QC_SPIKE, QC_BATTERY)
+    index = pd.date_range('2000-01-01', periods=7, freq='15min').delete(4)
+    data = pd.DataFrame({'A': [1.0, 1.0, 1.0, 1.2, 1.3, 9.0],
+                         'B': [2.0, np.nan, 2.5, 2.6, -3.0, 2.4]}, index=index)
+    battery = pd.DataFrame({'B': [12.0, 12.0, 12.0, 10.0, 12.0, 12.0]}, index=index)
+    flags = quality_flags(data, valid_range=(0, None), max_step=2.0, flatline=3,
+                          battery=battery)
+    assert (flags.dtypes == np.uint8).all()
+    npt.assert_array_equal(flags['A'], [QC_FLATLINE, QC_FLATLINE, QC_FLATLINE, 0,
+                                        QC_GAP, QC_SPIKE])
+    npt.assert_array_equal(flags['B'], [0, QC_MISSING, QC_GAP, QC_BATTERY,
+                                        QC_GAP | QC_RANGE | QC_SPIKE, QC_SPIKE])
+
+
+def test_quality_summary_and_gaps():
+    """Test the per-site summary counts and the list of gaps."""
+    from catchment.models import quality_flags, quality_summary, find_gaps
+    index = pd.date_range('2000-01-01', periods=4, freq='15min')
+    data = pd.DataFrame({'A': [1.0, np.nan, np.nan, 5.0], 'B': [1.0, 2.0, 3.0, 4.0]},
+                        index=index)
+    summary = quality_summary(quality_flags(data, valid_range=(None, 4.5)))
+    assert summary.loc['A', 'readings'] == 2
+    assert summary.loc['A', 'missing'] == 2
+    assert summary.loc['A', 'gap'] == 1
+    assert summary.loc['A', 'bad'] == 1
+    assert summary.loc['A', 'good_fraction'] == 0.5
+    assert summary.loc['B', 'good_fraction'] == 1.0
+
+    gaps = find_gaps(data)
+    assert gaps['Site'].tolist() == ['A']
+    assert gaps['Start'].tolist() == [index[0]]
+    assert gaps['End'].tolist() == [index[3]]
+    assert gaps['Missing'].tolist() == [2]
+
+
+def test_daily_stats_masked():
+    """Test masked readings are left out of the daily statistics."""
+    from catchment.models import daily_stats, daily_mean, quality_flags, quality_mask
+    data = pd.DataFrame({'A': [1.0, 100.0, 3.0], 'B': [4.0, 5.0, 6.0]},
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00',
+                                              '2000-01-02 01:00']))
+    flags = quality_flags(data, valid_range=(0, 50))
+    expected = pd.DataFrame({'A': [1.0, 3.0], 'B': [4.5, 6.0]},
+                            index=[datetime.date(2000, 1, 1), datetime.date(2000, 1, 2)])
+    pdt.assert_frame_equal(daily_mean(data, mask=flags), expected)
+    stats = daily_stats(data, ['mean', 'count'], mask=quality_mask(flags), chunk_columns=1)
+    pdt.assert_frame_equal(stats['mean'], expected)
+    npt.assert_array_equal(stats['count'], [[1, 2], [1, 1]])
+    # The data itself is left unchanged
+    assert data.loc['2000-01-01 02:00', 'A'] == 100.0
+
+
+def _hierarchy_data():
+    index = pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00', '2000-01-02 01:00'])
+    columns = pd.MultiIndex.from_tuples([('A', 'S1', 'Rain'), ('A', 'S2', 'Rain'),
+                                         ('B', 'S3', 'Rain'), ('B', 'S3', 'Level')],
+                                        names=['Catchment', 'Site', 'Measurement'])
+    return pd.DataFrame([[1.0, 3.0, 5.0, 10.0],
+                         [1.0, 1.0, 1.0, 20.0],
+                         [2.0, np.nan, 6.0, 30.0]], index=index, columns=columns)
+
+
+def test_rollup():
+    """Test site, catchment and network means of daily totals."""
+    from catchment.models import rollup
+    results = rollup(_hierarchy_data(), 'sum')
+    days = [datetime.date(2000, 1, 1), datetime.date(2000, 1, 2)]
+    # S2 has no readings on the second day, so is left out of its means
+    npt.assert_array_equal(results['site'], [[2.0, 4.0, 6.0, 30.0], [2.0, np.nan, 6.0, 30.0]])
+    assert results['catchment'].columns.tolist() == [('A', 'Rain'), ('B', 'Rain'),
+                                                     ('B', 'Level')]
+    npt.assert_array_equal(results['catchment'], [[3.0, 6.0, 30.0], [2.0, 6.0, 30.0]])
+    pdt.assert_frame_equal(results['network'],
+                           pd.DataFrame({'Level': [30.0, 30.0], 'Rain': [4.0, 4.0]},
+                                        index=days).rename_axis(columns='Measurement'))
+
+    weighted = rollup(_hierarchy_data(), 'max', weights={'S1': 3, 'S2': 1, 'S3': 1})
+    npt.assert_array_equal(weighted['catchment'][('A', 'Rain')], [1.5, 2.0])
+
+
+def test_rollup_empty():
+    """Test a roll-up of no sites gives empty frames."""
+    from catchment.models import Rollup, hierarchy_frame, rollup
+    for results in [rollup(hierarchy_frame([]), 'sum'), Rollup().results()]:
+        assert all(frame.empty for frame in results.values())
+
+
+def test_rollup_incremental():
+    """Test adding a site only recomputes its own catchment."""
+    from catchment.models import Rollup, rollup
+    data = _hierarchy_data()
+    rollups = Rollup('sum').add(data.drop(columns=[('A', 'S2', 'Rain')]))
+    catchment_b = rollups._sums['B']
+    rollups.add(data[[('A', 'S2', 'Rain')]] * 2)
+    rollups.add(data[[('A', 'S2', 'Rain')]])
+    assert rollups._sums['B'] is catchment_b
+
+    expected = rollup(data, 'sum')
+    pdt.assert_frame_equal(rollups.catchment(), expected['catchment'])
+    pdt.assert_frame_equal(rollups.network(), expected['network'])
+
+
+def test_hierarchy_frame():
+    """Test catchments are combined into (Catchment, Site, Measurement) columns."""
+    from catchment.models import Catchment, hierarchy_frame
+    data = _hierarchy_data()
+    catchments = [Catchment.from_frame(name, 'Rain', data[name].xs('Rain', axis=1, level=1))
+                  for name in ['A', 'B']]
+    combined = hierarchy_frame(catchments)
+    assert combined.columns.tolist() == [('A', 'S1', 'Rain'), ('A', 'S2', 'Rain'),
+                                         ('B', 'S3', 'Rain')]
+    npt.assert_array_equal(combined, data.iloc[:, :3])
+
+
+def _daily_frame():
+    return pd.DataFrame({'A': [1.0, 2.0, 3.0], 'B': [4.0, 5.0, 6.0]},
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00',
+                                              '2000-01-02 01:00']))
+
+
+def test_aggregation_cache_hits():
+    """Test repeated aggregations of the same frame and sites are reused."""
+    from catchment.models import AggregationCache, daily_mean, daily_total, invalidate_cached
+    cache = AggregationCache()
+    data = _daily_frame()
+    first = daily_total(data, sites=['B'], cache=cache)
+    first.iloc[0, 0] = -1
+    pdt.assert_frame_equal(daily_total(data, sites=['B'], cache=cache), daily_total(data[['B']]))
+    daily_mean(data, cache=cache)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+    assert stats['bytes'] > 0
+
+    # Changing a frame in place is found by its checksum
+    data['B'] *= 2
+    npt.assert_array_equal(daily_total(data, sites=['B'], cache=cache), [[18.0], [12.0]])
+    assert cache.stats()['invalidations'] == 2
+    data.iloc[0, 1] += 1
+    npt.assert_array_equal(daily_total(data, sites=['B'], cache=cache), [[19.0], [12.0]])
+
+    invalidated = cache.stats()['invalidations']
+    invalidate_cached(data)
+    assert cache.stats()['invalidations'] == invalidated + 1
+
+
+def test_aggregation_cache_evicts_by_bytes():
+    """Test the least recently used results are evicted to keep within max_bytes."""
+    from catchment.models import AggregationCache, daily_max, daily_min, daily_total
+    data = _daily_frame()
+    entry_bytes = int(daily_total(data).memory_usage(deep=True).sum())
+    cache = AggregationCache(max_bytes=2 * entry_bytes)
+    daily_total(data, cache=cache)
+    daily_max(data, cache=cache)
+    daily_total(data, cache=cache)
+    daily_min(data, cache=cache)
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= 2 * entry_bytes
+    daily_total(data, cache=cache)
+    daily_max(data, cache=cache)
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 4)
+
+
+def test_aggregation_cache_measurement_series():
+    """Test results for a MeasurementSeries are invalidated when it receives readings."""
+    from catchment.models import AggregationCache, MeasurementSeries, daily_total
+    cache = AggregationCache()
+    data = _daily_frame()
+    series = MeasurementSeries(data['A'], 'A', 'mm')
+    npt.assert_array_equal(daily_total(series, cache=cache), [[3.0], [3.0]])
+    series.append(np.array(['2000-01-02 02:00'], dtype='datetime64[ns]'), [10.0])
+    assert cache.stats()['entries'] == 0
+    npt.assert_array_equal(daily_total(series, cache=cache), [[3.0], [13.0]])
+    assert cache.stats()['hits'] == 0
+
+
+def test_aggregation_cache_hash_contents():
+    """Test equal frames share results when fingerprinted by content."""
+    from catchment.models import AggregationCache, daily_mean
+    cache = AggregationCache(hash_contents=True)
+    daily_mean(_daily_frame(), cache=cache)
+    daily_mean(_daily_frame(), cache=cache)
+    changed = _daily_frame()
+    changed.iloc[0, 0] = 0.0
+    daily_mean(changed, cache=cache)
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 2)
@@ -0,0 +1,86 @@
+"""Tests for the stage profiler"""
+
+import json
+import pstats
+
+import pandas as pd
+
+from catchment import models, profiling
+
+
+def test_stages_nested():
+    """Test stages of model functions are recorded under the stage that ran them."""
+    with profiling.Profiler() as profiler:
+        with profiling.stage('load'):
+            data = models.read_variable_from_csv('data/rain_data_small.csv', 'Rainfall (mm)')
+        models.daily_stats(data)
+
+    report = {entry['stage']: entry for entry in profiler.report()}
+    assert list(report) == ['load', 'load/read_variable_from_csv',
+                            'load/read_variable_from_csv/read_csv',
+                            'load/read_variable_from_csv/parse_dates',
+                            'load/read_variable_from_csv/pivot', 'daily_stats']
+    assert report['load/read_variable_from_csv/read_csv']['rows'] == 16
+    assert report['load/read_variable_from_csv']['rows'] == len(data)
+    assert report['daily_stats']['rows'] == len(data)
+    assert report['load']['wall'] >= report['load/read_variable_from_csv']['wall']
+    assert report['load']['peak_bytes'] >= report['load/read_variable_from_csv/pivot']['peak_bytes'] > 0
+
+
+def test_repeated_stages_combined():
+    """Test repeated runs of a stage are summed into one report entry."""
+    data = pd.DataFrame({'A': [1.0, 2.0]}, index=pd.to_datetime(['2000-01-01', '2000-01-02']))
+    with profiling.Profiler(memory=False) as profiler:
+        models.daily_total(data)
+        models.daily_total(data)
+
+    report = profiler.report()
+    assert [entry['stage'] for entry in report] == ['daily_total', 'daily_total/daily_stats']
+    assert report[0]['calls'] == 2
+    assert report[0]['rows'] == 4
+    assert report[0]['peak_bytes'] is None
+
+
+def test_not_profiling():
+    """Test stages do nothing when no profiler is running."""
+    with profiling.stage('unrecorded') as stage:
+        stage.rows = 10
+    assert profiling._active is None
+
+
+def test_reports(tmp_path):
+    """Test the JSON, table and cProfile outputs."""
+    json_filename = tmp_path / 'profile.json'
+    cprofile_filename = tmp_path / 'profile.pstats'
+    with profiling.Profiler(cprofile_filename=str(cprofile_filename)) as profiler:
+        models.read_variable_from_csv('data/rain_data_small.csv', 'Rainfall (mm)')
+    profiler.write_json(json_filename)
+
+    with open(json_filename) as report_file:
+        assert json.load(report_file)['stages'][0]['stage'] == 'read_variable_from_csv'
+    assert '  read_csv' in profiler.table()
+    stats = pstats.Stats(str(cprofile_filename))
+    assert any(function[2] == 'read_variable_from_csv' for function in stats.stats)
+
+
+def test_no_per_stage_peaks(monkeypatch):
+    """Test peaks are left out where tracemalloc cannot reset its peak."""
+    monkeypatch.setattr(profiling, 'PER_STAGE_PEAKS', False)
+    data = pd.DataFrame({'A': [1.0, 2.0]}, index=pd.to_datetime(['2000-01-01', '2000-01-02']))
+    with profiling.Profiler() as profiler:
+        models.daily_total(data)
+    assert not profiler.memory
+    assert profiler.report()[0]['peak_bytes'] is None
+
+
+def test_rollup_rows():
+    """Test the rollup stage counts the rows of the data added."""
+    data = pd.DataFrame([[1.0, 2.0], [3.0, 4.0]],
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00']),
+                        columns=pd.MultiIndex.from_tuples([('A', 'S1', 'Rain'), ('A', 'S2', 'Rain')],
+                                                          names=['Catchment', 'Site', 'Measurement']))
+    with profiling.Profiler(memory=False) as profiler:
+        models.Rollup('sum').add(data)
+
+    report = {entry['stage']: entry for entry in profiler.report()}
+    assert report['rollup']['rows'] == 2
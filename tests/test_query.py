@@ -0,0 +1,77 @@
+"""Tests for lazy queries of measurement files"""
+
+import os
+
+import pandas as pd
+import pandas.testing as pdt
+
+from catchment import models, query
+
+
+RIVER_DATA = 'data/river_data_2015-12.csv'
+
+
+def test_query_site():
+    """Test a single site read through the row index matches the full pivot."""
+    measurements = ['pH continuous', 'Battery (V)']
+    result = query.scan_csv(RIVER_DATA, index_dir=None).select(*measurements) \
+        .where(sites='TE20').collect()
+    full = models.read_variables_from_csv(RIVER_DATA, measurements)
+    assert list(result) == measurements
+    for measurement in measurements:
+        pdt.assert_frame_equal(result[measurement],
+                               full[measurement][['TE20']].dropna(how='all'))
+
+
+def test_query_missing_site():
+    """Test a site that is not in the file gives empty frames."""
+    result = query.scan_csv(RIVER_DATA, index_dir=None).select('pH continuous') \
+        .where(sites='XX99').collect()
+    assert list(result) == ['pH continuous']
+    assert result['pH continuous'].empty
+    combined = query.scan_csv(RIVER_DATA, index_dir=None).where(sites='XX99').collect(combine=True)
+    assert combined.empty
+    assert combined.columns.names == ['Measurement', 'Site']
+
+
+def test_query_dates(tmp_path):
+    """Test date filters are applied exactly although ranges are sampled."""
+    index = query.RowIndex(RIVER_DATA, stride=16)
+    start, end = pd.Timestamp('2005-12-10 03:10'), pd.Timestamp('2005-12-12 06:00')
+    ranges = index.ranges(['FP15', 'PL17'], start, end)
+    assert len(ranges) == 2
+    assert sum(last - first for first, last in ranges) < os.path.getsize(RIVER_DATA) / 10
+
+    result = query.scan_csv(RIVER_DATA, index_dir=tmp_path).where(
+        sites=['FP15', 'PL17'], start=start, end=end).collect(combine=True)
+    full = models.read_variables_from_csv(RIVER_DATA, index.columns[3:], combine=True)
+    assert set(result.columns.get_level_values('Site')) == {'FP15', 'PL17'}
+    pdt.assert_frame_equal(result, full.loc[start:end, result.columns].dropna(how='all'))
+
+
+def test_query_narrows():
+    """Test repeated where calls narrow the query rather than replacing it."""
+    narrowed = query.scan_csv(RIVER_DATA).where(sites=['FP15', 'TE20'], start='2005-12-02') \
+        .where(sites=['TE20', 'PL17'], start='2005-12-01', end='2005-12-05')
+    assert narrowed.sites == ['TE20']
+    assert narrowed.start == pd.Timestamp('2005-12-02')
+    assert narrowed.end == '2005-12-05'
+
+
+def test_index_saved(tmp_path):
+    """Test the index is saved, reused and rebuilt when the file changes."""
+    filename = tmp_path / 'rain.csv'
+    with open('data/rain_data_2015-12.csv') as source:
+        lines = source.readlines()
+    filename.write_text(''.join(lines[:100]))
+
+    index = query.get_index(filename, tmp_path / 'index')
+    assert query.get_index(filename, tmp_path / 'index').file_id == index.file_id
+    assert index.sites == ['FP35']
+
+    filename.write_text(''.join(lines))
+    assert query.get_index(filename, tmp_path / 'index').sites == ['FP35', 'PL16']
+    result = query.scan_csv(filename, tmp_path / 'index').collect()
+    pdt.assert_frame_equal(result['Rainfall (mm)'],
+                           models.read_variable_from_csv('data/rain_data_2015-12.csv',
+                                                         'Rainfall (mm)'))
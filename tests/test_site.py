@@ -1,13 +1,17 @@
 """Tests for the Site model."""
 
+import pandas as pd
+import pytest
+
+
 def test_create_site():
- """Check a site is created correctly given a name."""
+    """Check a site is created correctly given a name."""
     from catchment.models import Site
     name = 'PL23'
     p = Site(name=name)
     assert p.name == name
  
- def test_create_catchment():
+def test_create_catchment():
     """Check a catchment is created correctly given a name."""
     from catchment.models import Catchment
     name = 'Spain'
@@ -21,10 +25,10 @@ def test_catchment_is_location():
     assert isinstance(catchment, Location)
 
 def test_site_is_location():
-     """Check if a site is a location."""
-     from catchment.models import Site, Location
-     PL23 = Site("PL23")
-     assert isinstance(PL23, Location)
+    """Check if a site is a location."""
+    from catchment.models import Site, Location
+    PL23 = Site("PL23")
+    assert isinstance(PL23, Location)
 
 def test_sites_added_correctly():
     """Check sites are being added correctly by a catchment. """
@@ -42,4 +46,189 @@ def test_no_duplicate_sites():
     PL23 = Site("PL23")
     catchment.add_site(PL23)
     catchment.add_site(PL23)
-    assert len(catchment.sites) == 1  
\ No newline at end of file
+    assert len(catchment.sites) == 1  
+
+def test_measurement_series_append():
+    """Check readings appended in batches are kept in order."""
+    import pandas as pd
+    import pandas.testing as pdt
+    from catchment.models import MeasurementSeries
+    index = pd.date_range('2005-12-01', periods=100, freq='15min')
+    readings = pd.Series(range(100), index=index, dtype=float)
+    series = MeasurementSeries(readings[:3], 'River Level', 'mm')
+    for start in range(3, 100, 7):
+        series.add_measurement(readings[start:start + 7])
+    assert len(series) == 100
+    pdt.assert_series_equal(series.series, readings.rename("River Level"), check_freq=False)
+
+
+def test_measurement_series_invalidated_on_append():
+    """Check the materialised series is rebuilt after new readings arrive."""
+    import numpy as np
+    import pandas as pd
+    from catchment.models import MeasurementSeries
+    series = MeasurementSeries(pd.Series([1, 2], index=pd.to_datetime(['2000-01-01', '2000-01-02'])),
+                               'River Level', 'mm')
+    first = series.series
+    assert series.series is first
+    series.append(np.array(['2000-01-03'], dtype='datetime64[ns]'), [3.5])
+    assert series.series is not first
+    assert series.series.tolist() == [1.0, 2.0, 3.5]
+    assert first.tolist() == [1, 2]
+
+
+def test_sites_have_no_instance_dict():
+    """Check the model classes use slots rather than per-instance dicts."""
+    from catchment.models import Catchment, Site
+    assert not hasattr(Site('PL23'), '__dict__')
+    assert not hasattr(Catchment('Spain'), '__dict__')
+
+
+def test_duplicate_site_keeps_first():
+    """Check a second site with an existing code does not replace the first."""
+    from catchment.models import Catchment, Site
+    catchment = Catchment("Pang")
+    PL23 = Site("PL23")
+    catchment.add_site(PL23)
+    catchment.add_site(Site("PL23"))
+    assert catchment.sites["PL23"] is PL23
+
+
+def test_catchment_from_frame():
+    """Check a catchment built from a wide frame has a series per site."""
+    import pandas as pd
+    from catchment.models import Catchment
+    data = pd.DataFrame(data=[[1.0, 2.0], [3.0, 4.0]],
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00']),
+                        columns=['FP35', 'PL16'])
+    catchment = Catchment.from_frame('LOCAR', 'Rainfall', data, 'mm')
+    assert list(catchment.sites) == ['FP35', 'PL16']
+    assert catchment.sites['PL16'].measurements['Rainfall'].series.tolist() == [2.0, 4.0]
+    assert str(catchment.sites['PL16'].measurements['Rainfall']) == 'Rainfall (mm)'
+
+    catchment.add_measurements('Rainfall', data.iloc[:1])
+    assert catchment.sites['FP35'].measurements['Rainfall'].series.tolist() == [1.0, 3.0, 1.0]
+
+
+def test_read_sites_from_csv():
+    """Check site locations are grouped into catchments by code prefix."""
+    from catchment.models import read_sites_from_csv
+    catchments = read_sites_from_csv('data/LOCAR_Site_Information.csv')
+    assert list(catchments) == ['FP', 'PL', 'TE']
+    site = catchments['FP'].sites['FP01']
+    assert site.long_name == 'Bere Stream at Snatford Bridge'
+    assert (site.easting, site.northing) == (385575, 92975)
+
+
+def test_last_reading_out_of_order():
+    """Check the latest reading tracks the latest time, not the last append."""
+    import numpy as np
+    import pandas as pd
+    from catchment.models import MeasurementSeries
+    series = MeasurementSeries(pd.Series([1.0, np.nan], index=pd.to_datetime(['2000-01-02', '2000-01-03'])),
+                               'River Level', 'mm')
+    assert series.last_reading == (pd.Timestamp('2000-01-02'), 1.0)
+    series.add_measurement(pd.Series([2.0, 3.0], index=pd.to_datetime(['2000-01-04', '2000-01-01'])))
+    assert series.last_reading == (pd.Timestamp('2000-01-04'), 2.0)
+
+
+@pytest.mark.parametrize(
+    "as_of, expected",
+    [
+        ('1999-12-31', None),
+        ('2000-01-01 12:00', (pd.Timestamp('2000-01-01'), 3.0)),
+        ('2000-01-03', (pd.Timestamp('2000-01-02'), 1.0)),
+        ('2000-01-05', (pd.Timestamp('2000-01-04'), 2.0)),
+    ])
+def test_as_of(as_of, expected):
+    """Check readings are looked up by time, skipping missing values."""
+    import numpy as np
+    from catchment.models import MeasurementSeries
+    series = MeasurementSeries(pd.Series([1.0, np.nan], index=pd.to_datetime(['2000-01-02', '2000-01-03'])),
+                               'River Level', 'mm')
+    series.add_measurement(pd.Series([2.0, 3.0], index=pd.to_datetime(['2000-01-04', '2000-01-01'])))
+    assert series.as_of(as_of) == expected
+
+
+def test_catchment_latest_measurements():
+    """Check the catchment snapshot has the latest reading of every series."""
+    from catchment.models import Catchment
+    data = pd.DataFrame(data=[[1.0, 2.0], [3.0, None]],
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-01 02:00']),
+                        columns=['FP35', 'PL16'])
+    catchment = Catchment.from_frame('LOCAR', 'Rainfall', data, 'mm')
+    latest = catchment.latest_measurements()
+    assert latest.loc[('FP35', 'Rainfall'), 'Value'] == 3.0
+    assert latest.loc[('PL16', 'Rainfall'), 'Date'] == pd.Timestamp('2000-01-01 01:00')
+    earlier = catchment.latest_measurements(as_of='2000-01-01 01:30')
+    assert earlier['Value'].tolist() == [1.0, 2.0]
+
+
+@pytest.mark.parametrize(
+    "as_of, expected",
+    [
+        ('1999-12-31', None),
+        ('2000-01-02', (pd.Timestamp('2000-01-02'), 1.0)),
+        ('2000-01-03 12:00', (pd.Timestamp('2000-01-02'), 1.0)),
+        ('2000-01-05', (pd.Timestamp('2000-01-04'), 2.0)),
+    ])
+def test_as_of_in_order(as_of, expected):
+    """Check readings appended in time order are searched in place."""
+    import numpy as np
+    from catchment.models import MeasurementSeries
+    series = MeasurementSeries(pd.Series([1.0, np.nan], index=pd.to_datetime(['2000-01-02', '2000-01-03'])),
+                               'River Level', 'mm')
+    series.add_measurement(pd.Series([2.0, np.nan], index=pd.to_datetime(['2000-01-04', '2000-01-05'])))
+    assert series.as_of(as_of) == expected
+
+
+def test_catchment_latest_measurements_updated():
+    """Check the catchment snapshot follows appends, new series and replaced sites."""
+    from catchment.models import Catchment, Site
+    data = pd.DataFrame(data=[[1.0, 2.0]], index=pd.to_datetime(['2000-01-01 01:00']),
+                        columns=['FP35', 'PL16'])
+    catchment = Catchment.from_frame('LOCAR', 'Rainfall', data, 'mm')
+    catchment.sites['FP35'].measurements['Rainfall'].append(
+        pd.to_datetime(['2000-01-01 02:00']).values, [5.0])
+    catchment.sites['PL16'].add_measurement(
+        'River Level', pd.Series([0.5], index=pd.to_datetime(['2000-01-01 03:00'])))
+    latest = catchment.latest_measurements()
+    assert latest['Value'].to_dict() == {('FP35', 'Rainfall'): 5.0, ('PL16', 'Rainfall'): 2.0,
+                                         ('PL16', 'River Level'): 0.5}
+
+    catchment.sites['FP35'] = Site('FP35')
+    del catchment.sites['PL16']
+    assert catchment.latest_measurements().empty
+
+
+def test_series_read_only():
+    """Check the Series view cannot change the buffers of readings."""
+    from catchment.models import MeasurementSeries
+    series = MeasurementSeries(pd.Series([1.0, 2.0], index=pd.to_datetime(['2000-01-01', '2000-01-02'])),
+                               'River Level', 'mm')
+    with pytest.raises(ValueError):
+        series.series.iloc[0] = 5.0
+    assert series.last_reading == (pd.Timestamp('2000-01-02'), 2.0)
+    assert series.series.tolist() == [1.0, 2.0]
+
+
+def test_catchment_latest_measurements_mappings():
+    """Check every change to the site and measurement mappings reaches the snapshot."""
+    from catchment.models import Catchment, Site
+    data = pd.DataFrame(data=[[1.0, 2.0]], index=pd.to_datetime(['2000-01-01 01:00']),
+                        columns=['FP35', 'PL16'])
+    catchment = Catchment.from_frame('LOCAR', 'Rainfall', data, 'mm')
+    catchment.sites.popitem()
+    assert catchment.latest_measurements().index.tolist() == [('FP35', 'Rainfall')]
+
+    site = Site('CG10')
+    site.add_measurement('Rainfall', pd.Series([4.0], index=pd.to_datetime(['2000-01-01 02:00'])))
+    catchment.sites |= {'CG10': site}
+    site.measurements |= {'Level': site.measurements.pop('Rainfall')}
+    assert catchment.latest_measurements()['Value'].to_dict() == {('FP35', 'Rainfall'): 1.0,
+                                                                  ('CG10', 'Level'): 4.0}
+
+    with pytest.raises(AttributeError):
+        catchment.sites = {}
+    with pytest.raises(AttributeError):
+        site.measurements = {}
@@ -0,0 +1,67 @@
+"""Tests for the catchment boundary and site location indexes"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from catchment import models, spatial
+
+
+def test_read_shapefile():
+    """Test the polygon and attributes of a simple square shapefile are read."""
+    polygons = spatial.read_shapefile('data/simple_shapefile/simple.shp')
+    assert len(polygons) == 1
+    assert polygons[0].bbox == (0.0, 0.0, 10.0, 10.0)
+    assert polygons[0].attributes == {'FID': 0.0}
+    npt.assert_array_equal(polygons[0].contains([5.0, 11.0, -1.0, 9.9], [5.0, 5.0, 5.0, 0.1]),
+                           [True, False, False, True])
+
+
+def test_polygon_with_hole():
+    """Test points in a hole of a polygon are outside it."""
+    outer = [(0, 0), (0, 10), (10, 10), (10, 0), (0, 0)]
+    hole = [(4, 4), (6, 4), (6, 6), (4, 6), (4, 4)]
+    polygon = spatial.Polygon([outer, hole])
+    npt.assert_array_equal(polygon.contains([2.0, 5.0, 5.0], [2.0, 5.0, 8.0]),
+                           [True, False, True])
+
+
+def test_read_catchments_from_shapefiles():
+    """Test each LOCAR site is placed in the catchment matching its site code."""
+    sites = models.read_sites_from_csv('data/LOCAR_Site_Information.csv')
+    catchments = spatial.read_catchments_from_shapefiles('data/river_catchments/*.shp', sites)
+    assert list(catchments) == ['frome_piddle', 'pang_lambourn', 'tern']
+    assert catchments['frome_piddle'].sites.keys() == sites['FP'].sites.keys()
+    assert catchments['pang_lambourn'].sites.keys() == sites['PL'].sites.keys()
+    assert catchments['tern'].sites.keys() == sites['TE'].sites.keys()
+    assert len(catchments['tern'].boundary.polygons) == 2
+
+
+def test_site_index_nearest():
+    """Test nearest sites match a brute force search, inside and outside the grid."""
+    rng = np.random.default_rng(0)
+    eastings, northings = rng.uniform(0, 1e5, (2, 1000))
+    index = spatial.SiteIndex.from_arrays([f'S{i}' for i in range(1000)], eastings, northings)
+    query_eastings, query_northings = rng.uniform(-2e4, 1.2e5, (2, 300))
+
+    names, distances = index.nearest(query_eastings, query_northings)
+    all_distances = np.hypot(eastings - query_eastings[:, np.newaxis],
+                             northings - query_northings[:, np.newaxis])
+    npt.assert_allclose(distances, all_distances.min(axis=1))
+    assert list(names) == [f'S{i}' for i in all_distances.argmin(axis=1)]
+
+
+def test_site_index_within_radius():
+    """Test the sites within a radius of a LOCAR site, nearest first."""
+    sites = models.read_sites_from_csv('data/LOCAR_Site_Information.csv')
+    index = spatial.SiteIndex(sites)
+    assert len(index) == 35
+    nearby = index.within_radius(385575, 92975, 5000)
+    assert list(nearby.index) == ['FP01', 'FP22']
+    npt.assert_allclose(nearby, [0.0, np.hypot(385575 - 382125, 92975 - 93450)])
+
+
+def test_site_index_needs_locations():
+    """Test an index cannot be built from sites without locations."""
+    with pytest.raises(ValueError):
+        spatial.SiteIndex([models.Site('FP35')])
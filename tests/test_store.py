@@ -0,0 +1,110 @@
+"""Tests for the memory mapped measurement store"""
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from catchment import models, store
+
+
+def test_append_and_open(tmp_path):
+    """Test appended readings are mapped and range queried through the sparse index."""
+    series_file = store.SeriesFile(str(tmp_path / 'level'), 'Level', 'mm', stride=4)
+    times = pd.date_range('2005-12-01', periods=10, freq='15min')
+    values = np.arange(10.0)
+    series_file.append(times[:7], values[:7])
+    series_file.append(times[7:], values[7:])
+    assert len(series_file) == 10
+    npt.assert_array_equal(series_file.sparse_index(), times[[0, 4, 8]].asi8)
+
+    measurement_series = store.SeriesFile(str(tmp_path / 'level')).open()
+    assert isinstance(measurement_series._values, np.memmap)
+    assert str(measurement_series) == 'Level (mm)'
+    assert measurement_series.last_reading == (times[9], 9.0)
+    for start, end in [(times[3], times[8]), (times[4], times[4]),
+                       ('2005-12-01 00:20', None), (None, '2005-11-30')]:
+        pdt.assert_series_equal(measurement_series.between(start, end),
+                                pd.Series(values, index=times, name='Level').loc[start:end],
+                                check_freq=False)
+
+
+def test_append_out_of_order(tmp_path):
+    """Test readings earlier than those stored are refused."""
+    series_file = store.SeriesFile(str(tmp_path / 'level'), 'Level', 'mm')
+    series_file.append(np.array([10, 20]), [1.0, 2.0])
+    with pytest.raises(ValueError):
+        series_file.append(np.array([15]), [1.5])
+    with pytest.raises(ValueError):
+        series_file.append(np.array([30, 25]), [1.5, 2.5])
+    assert len(series_file) == 2
+
+
+def test_interrupted_append(tmp_path):
+    """Test a part-written reading is ignored and then overwritten."""
+    series_file = store.SeriesFile(str(tmp_path / 'level'), 'Level', 'mm')
+    series_file.append(np.array([10, 20]), [1.0, 2.0])
+    with open(series_file._filename('values'), 'ab') as values_file:
+        values_file.write(b'\0' * 12)
+    assert len(series_file) == 2
+    series_file.append(np.array([30]), [3.0])
+    npt.assert_array_equal(series_file.values(), [1.0, 2.0, 3.0])
+
+
+def test_write_and_read_site(tmp_path):
+    """Test a site's history is written incrementally and read back mapped."""
+    river = store.Store(str(tmp_path))
+    site = models.Site('FP15')
+    times = pd.date_range('2005-12-01', periods=4, freq='15min', tz='Europe/London')
+    site.add_measurement('Water level continuous (mm)',
+                         pd.Series([1.0, 2.0, np.nan, 4.0], index=times[[0, 1, 3, 2]]), 'mm')
+    assert river.write_site(site) == 4
+    site.measurements['Water level continuous (mm)'].append(
+        np.array([times[3].value + 900 * 10**9]), [5.0])
+    assert river.write_site(site) == 1
+
+    assert river.sites() == ['FP15']
+    assert river.measurements('FP15') == ['Water level continuous (mm)']
+    stored = river.read_site('FP15').measurements['Water level continuous (mm)']
+    assert stored.units == 'mm'
+    pdt.assert_series_equal(stored.between(),
+                            site.measurements['Water level continuous (mm)'].between())
+    assert stored.as_of(times[3]) == (times[2], 4.0)
+
+
+def test_interrupted_index(tmp_path):
+    """Test readings missing from the sparse index are still found, and indexed
+    by the next append."""
+    series_file = store.SeriesFile(str(tmp_path / 'level'), 'Level', 'mm', stride=2)
+    times = pd.date_range('2005-12-01', periods=12, freq='h')
+    values = np.arange(12.0)
+    series_file.append(times[:3], values[:3])
+    # Interrupted after the readings were written but before their index entries
+    with open(series_file._filename('index'), 'r+b') as index_file:
+        index_file.truncate(8)
+    with open(series_file._filename('values'), 'ab') as values_file:
+        values_file.write(values[3:9].tobytes())
+    with open(series_file._filename('times'), 'ab') as times_file:
+        times_file.write(times[3:9].asi8.tobytes())
+
+    expected = pd.Series(values, index=times, name='Level')
+    measurement_series = series_file.open()
+    pdt.assert_series_equal(measurement_series.between(times[4], times[7]),
+                            expected[4:8], check_freq=False)
+
+    series_file.append(times[9:], values[9:])
+    npt.assert_array_equal(series_file.sparse_index(), times[::2].asi8)
+    pdt.assert_series_equal(series_file.open().between(times[5], None),
+                            expected[5:], check_freq=False)
+
+
+def test_mapped_series_read_only(tmp_path):
+    """Test a mapped series refuses appends rather than copying itself into memory."""
+    series_file = store.SeriesFile(str(tmp_path / 'level'), 'Level', 'mm')
+    series_file.append(np.array([10, 20]), [1.0, 2.0])
+    measurement_series = series_file.open()
+    with pytest.raises(ValueError):
+        measurement_series.append(np.array([30]), [3.0])
+    assert isinstance(measurement_series._values, np.memmap)
+    assert len(measurement_series) == 2
@@ -0,0 +1,56 @@
+"""Tests for chunked reading and daily accumulation of measurement files."""
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+
+@pytest.mark.parametrize(
+    "filename, measurement, chunksize",
+    [
+        ('data/rain_data_small.csv', 'Rainfall (mm)', 3),
+        ('data/rain_data_2015-12.csv', 'Rainfall (mm)', 1000),
+        ('data/river_data_2015-12.csv', 'Water level continuous (mm)', 777),
+    ])
+def test_read_daily_from_csv(filename, measurement, chunksize):
+    """Test chunked daily statistics match the in-memory aggregations."""
+    from catchment import models
+    from catchment.streaming import read_daily_from_csv
+    data = models.read_variable_from_csv(filename, measurement)
+    daily = read_daily_from_csv(filename, [measurement], chunksize=chunksize)[measurement]
+    pdt.assert_frame_equal(daily.total(), models.daily_total(data))
+    pdt.assert_frame_equal(daily.mean(), models.daily_mean(data))
+    pdt.assert_frame_equal(daily.max(), models.daily_max(data))
+    pdt.assert_frame_equal(daily.min(), models.daily_min(data))
+
+
+def test_daily_accumulator_split_days():
+    """Test days split across unordered updates with new sites are combined."""
+    from catchment import models
+    from catchment.streaming import DailyAccumulator
+    data = pd.DataFrame(data=[[1.0, None], [3.0, 2.0], [5.0, 4.0], [None, 6.0]],
+                        index=pd.to_datetime(['2000-01-01 01:00', '2000-01-02 01:00',
+                                              '2000-01-01 02:00', '2000-01-02 02:00']),
+                        columns=['A', 'B'])
+    accumulator = DailyAccumulator()
+    accumulator.update(data.iloc[[3]])
+    accumulator.update(data.iloc[[0]][['A']])
+    accumulator.update(data.iloc[[1, 2]])
+    data = data.sort_index()
+    pdt.assert_frame_equal(accumulator.total(), models.daily_total(data))
+    pdt.assert_frame_equal(accumulator.mean(), models.daily_mean(data))
+    pdt.assert_frame_equal(accumulator.max(), models.daily_max(data))
+    pdt.assert_frame_equal(accumulator.min(), models.daily_min(data))
+
+
+def test_daily_accumulator_site_order():
+    """Test sites are kept in the order they first appear across updates."""
+    from catchment.streaming import DailyAccumulator
+    data = pd.DataFrame(data=[[1.0, 2.0, 3.0]], index=pd.to_datetime(['2000-01-01 01:00']),
+                        columns=['C', 'A', 'B'])
+    accumulator = DailyAccumulator()
+    accumulator.update(data[['C']])
+    accumulator.update(data[['B', 'A']])
+    accumulator.update(data[['A', 'C']])
+    assert accumulator.total().columns.tolist() == ['C', 'B', 'A']
+    assert accumulator.min().columns.tolist() == ['C', 'B', 'A']
@@ -0,0 +1,48 @@
+"""Tests for the plotting functions within the View layer."""
+
+import os
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pytest
+
+
+def test_downsample_keeps_extremes():
+    """Test downsampling keeps each site's minimum and maximum in time order."""
+    from catchment.views import downsample
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(1001, 3)),
+                        index=pd.date_range('2005-12-01', periods=1001, freq='15min'),
+                        columns=['FP35', 'PL16', 'TE20'])
+    data.iloc[10:400, 1] = np.nan
+    times, values = downsample(data, 100)
+    assert times.shape == values.shape
+    assert len(values) <= 102
+    npt.assert_array_equal(np.nanmax(values, axis=0), data.max().to_numpy())
+    npt.assert_array_equal(np.nanmin(values, axis=0), data.min().to_numpy())
+    assert np.all(np.diff(times, axis=0) >= np.timedelta64(0))
+
+
+def test_downsample_short_series_unchanged():
+    """Test series shorter than the limit are returned whole."""
+    from catchment.views import downsample
+    data = pd.DataFrame([[1.0], [2.0]], index=pd.to_datetime(['2000-01-01', '2000-01-02']))
+    times, values = downsample(data, 100)
+    npt.assert_array_equal(values, [[1.0], [2.0]])
+
+
+@pytest.mark.parametrize("extension", ['png', 'svg'])
+def test_figure_renderer(tmp_path, extension):
+    """Test a reused renderer writes one image per render."""
+    from catchment.views import FigureRenderer
+    data = pd.DataFrame(np.arange(20.0).reshape(10, 2),
+                        index=pd.date_range('2005-12-01', periods=10, freq='D'),
+                        columns=['FP35', 'PL16'])
+    renderer = FigureRenderer(2, max_points=4)
+    renderer.render({'daily sum': data, 'daily max': data}, tmp_path / f'all.{extension}')
+    written = renderer.render_sites({'daily sum': data, 'daily max': data},
+                                    str(tmp_path / f'{{site}}.{extension}'))
+    assert (tmp_path / f'all.{extension}').stat().st_size > 0
+    assert [os.path.basename(p) for p in written] == [f'FP35.{extension}', f'PL16.{extension}']
+    assert len(renderer.figure.axes) == 2
@@ -0,0 +1,68 @@
+"""Tests for rolling-window and cumulative statistics"""
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from catchment import models, windows
+
+
+@pytest.fixture
+def irregular():
+    """Readings at two sites with a gap and a missing value."""
+    return pd.DataFrame(
+        data=[[1.0, 2.0], [2.0, np.nan], [3.0, 4.0], [4.0, 8.0], [5.0, 6.0]],
+        index=pd.to_datetime(['2000-01-01 00:00', '2000-01-01 00:30', '2000-01-01 01:00',
+                              '2000-01-01 04:00', '2000-01-01 04:15']),
+        columns=['A', 'B'])
+
+
+def test_rolling_time_based(irregular):
+    """Test windows cover a length of time rather than a number of rows."""
+    pdt.assert_frame_equal(windows.rolling(irregular, '1h'),
+                           pd.DataFrame(data=[[1.0, 2.0], [3.0, 2.0], [5.0, 4.0],
+                                              [4.0, 8.0], [9.0, 14.0]],
+                                        index=irregular.index, columns=irregular.columns))
+    npt.assert_array_equal(windows.moving_average(irregular, '24h')['B'],
+                           [2.0, 2.0, 3.0, 14 / 3, 5.0])
+
+
+def test_rolling_unknown_statistic(irregular):
+    """Test an unknown statistic is rejected."""
+    with pytest.raises(ValueError):
+        windows.rolling(irregular, '1h', 'median')
+
+
+def test_cumulative_total(irregular):
+    """Test missing readings add nothing to the running total."""
+    npt.assert_array_equal(windows.cumulative_total(irregular)['B'],
+                           [2.0, np.nan, 6.0, 14.0, 20.0])
+
+
+def test_rate_of_rise(irregular):
+    """Test rates use the actual time since the reading a window earlier."""
+    rate = windows.rate_of_rise(irregular, '1h')
+    # A: 3 - 1 over 1 hour, then 4 - 3 and 5 - 3 over 3 and 3.25 hours
+    npt.assert_allclose(rate['A'], [np.nan, np.nan, 2.0, 1 / 3, 2 / 3.25])
+    # B is missing at 00:30, so 04:00 and 04:15 compare with 01:00
+    npt.assert_allclose(rate['B'], [np.nan, np.nan, 2.0, 4 / 3, 2 / 3.25])
+    npt.assert_allclose(windows.rate_of_rise(irregular, '1h', max_gap='2h')['A'],
+                        [np.nan, np.nan, 2.0, np.nan, np.nan])
+
+
+def test_incremental_windows():
+    """Test results built up from chunks match computing them in one go."""
+    data = models.read_variable_from_csv('data/rain_data_2015-12.csv', 'Rainfall (mm)')
+    incremental = windows.IncrementalWindows()
+    for rows in np.array_split(np.arange(len(data)), 7):
+        new = incremental.update(data.iloc[rows])
+        assert len(new['24h']) == len(rows)
+
+    for window, expected in windows.rolling_totals(data).items():
+        pdt.assert_frame_equal(incremental.results(window), expected)
+    pdt.assert_frame_equal(incremental.results('cumulative'), windows.cumulative_total(data))
+
+    with pytest.raises(ValueError):
+        incremental.update(data.iloc[:1])